@@ -11,6 +11,8 @@ from reportlab.lib.pagesizes import letter, legal
 from dotenv import load_dotenv
 from pypdf import PdfReader, PdfWriter
 import json
+import numpy as np
+from spatial_index import join_findings, load_flight_path, load_map_extents
 
 load_dotenv()
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -29,7 +31,8 @@ DEFAULT_COLUMN_MAPPINGS = {
     "reference": "Reference Doc",
     "image_columns": ["Thermal_Photo", "Annotated Image", "Wide Photo Name", "Zoom Photo Name"],
     "latitude": "Latitude",
-    "longitude": "Longitude"
+    "longitude": "Longitude",
+    "flight_leg": "Flight Leg"
 }
 
 
@@ -294,7 +297,7 @@ def get_report_keys():
     """Get the list of fields to include in the report"""
     # Default keys
     default_keys = ['Incident_ID', 'Inspection Type', 'Finding', 'Location',
-                   'Inverter_ID / Area', 'Reference Doc', 'Longitude', 'Latitude']
+                   'Inverter_ID / Area', 'Reference Doc', 'Longitude', 'Latitude', 'Flight Leg']
     
     # Allow override via environment variable
     custom_keys = os.environ.get("REPORT_FIELDS", "")
@@ -496,7 +499,7 @@ def add_logo_to_pdf(pdf, logo, client_logo):
     return get_page_height() - text_height_start
 
 
-def process_spreadsheet_row(row, pdf, logo, client_logo, base_image_dir, column_mappings):
+def process_spreadsheet_row(row, pdf, logo, client_logo, base_image_dir, column_mappings, map_image=None):
     """Process a single row from the spreadsheet"""
     # Load mappings for key fields
     incident_id_col = column_mappings.get("incident_id", "Incident_ID")
@@ -548,8 +551,10 @@ def process_spreadsheet_row(row, pdf, logo, client_logo, base_image_dir, column_
     # Add data fields
     text_offset = add_data_to_pdf(pdf, row, column_mappings, image_offset)
     
-    # Add map if specified
-    if map_col in row and row[map_col]:
+    # Add the map covering this finding, or else the one named in the row
+    if map_image:
+        add_map_to_pdf(pdf, map_image, text_offset)
+    elif map_col in row and row[map_col]:
         map_name = row[map_col]
         map_image = find_map_image(map_name, base_image_dir)
         
@@ -602,16 +607,58 @@ def process_images(image_dir, image_list, pdf, row, logo_offset, location_number
         return (0, 0)
 
 
+def locate_findings(csv, column_mappings, base_image_dir):
+    """
+    Join every row to its flight leg and covering map image in one pass.
+
+    Adds the flight leg column to ``csv`` and returns the map image per row
+    (None where no georeferenced map covers the finding).
+    """
+    lat_col = column_mappings.get("latitude", "Latitude")
+    lon_col = column_mappings.get("longitude", "Longitude")
+    leg_col = column_mappings.get("flight_leg", "Flight Leg")
+    if lat_col not in csv or lon_col not in csv:
+        return [None] * len(csv)
+
+    lonlat = np.column_stack((
+        pd.to_numeric(csv[lon_col], errors="coerce").to_numpy(dtype=float),
+        pd.to_numeric(csv[lat_col], errors="coerce").to_numpy(dtype=float),
+    ))
+
+    flight_path = None
+    flight_path_file = os.environ.get("FLIGHT_PATH", "")
+    if flight_path_file:
+        if os.path.exists(flight_path_file):
+            flight_path = load_flight_path(flight_path_file)
+            print(f"Loaded flight path with {len(flight_path)} points")
+        else:
+            print(f"Flight path not found: {flight_path_file}")
+
+    map_dir = os.environ.get("MAP_FOLDER", base_image_dir)
+    map_paths, map_extents = load_map_extents(map_dir, os.environ.get("MAP_EXTENTS", ""))
+    print(f"Found {len(map_paths)} georeferenced map images")
+
+    joined = join_findings(lonlat, flight_path, map_paths, map_extents)
+    csv[leg_col] = [
+        f"Leg {leg} ({distance:.1f} m)" if leg else np.nan
+        for leg, distance in zip(joined["leg"], joined["leg_distance_m"])
+    ]
+    return joined["map_image"]
+
+
 def process_spreadsheet(csv, pdf, logo_path, client_logo_path, base_image_dir):
     """Process all rows in the spreadsheet"""
     logo = ImageReader(logo_path)
     client_logo = ImageReader(client_logo_path)
     column_mappings = load_column_mappings()
+    map_images = locate_findings(csv, column_mappings, base_image_dir)
     
     # Process each row
-    for index, row in csv.iterrows():
+    for position, (index, row) in enumerate(csv.iterrows()):
         print(f"Processing row {index+1}/{len(csv)}")
-        process_spreadsheet_row(row.to_dict(), pdf, logo, client_logo, base_image_dir, column_mappings)
+        process_spreadsheet_row(
+            row.to_dict(), pdf, logo, client_logo, base_image_dir, column_mappings, map_images[position]
+        )
         start_new_page(pdf)
 
 
@@ -12,6 +12,78 @@ import numpy as np
 from PIL import Image
 import argparse
 import glob
+import time
+
+def _stage(timings, name, started):
+    """Accumulate the elapsed time of a detection stage into ``timings``."""
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - started)
+    return time.perf_counter()
+
+def detect_bounding_box(img, timings=None):
+    """
+    Check if a decoded BGR image has red bounding boxes indicating anomalies.
+
+    Args:
+        img: Image array in BGR order, as returned by cv2.imread
+        timings: Optional dict that receives per-stage durations in seconds
+                 (hsv, mask, morphology, contours)
+    """
+    started = time.perf_counter()
+
+    # Convert to HSV space for easier color detection
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    started = _stage(timings, "hsv", started)
+
+    # Define red color range in HSV
+    # Red has two ranges in HSV, so we need to check both
+    lower_red1 = np.array([0, 120, 70])
+    upper_red1 = np.array([10, 255, 255])
+    mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
+
+    lower_red2 = np.array([170, 120, 70])
+    upper_red2 = np.array([180, 255, 255])
+    mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
+
+    # Combine masks
+    red_mask = cv2.bitwise_or(mask1, mask2)
+
+    # To consider an image as having a bounding box, we look for:
+    # - Sufficient red pixels in a pattern consistent with a bounding box
+
+    # Count red pixels
+    red_pixel_count = cv2.countNonZero(red_mask)
+    started = _stage(timings, "mask", started)
+
+    # Detect if red pixels form lines (potential bounding boxes)
+    # We'll apply morphological operations to identify line segments
+    kernel = np.ones((3, 3), np.uint8)
+    dilated = cv2.dilate(red_mask, kernel, iterations=1)
+    eroded = cv2.erode(dilated, kernel, iterations=1)
+    started = _stage(timings, "morphology", started)
+
+    # Find contours that could be rectangles
+    contours, _ = cv2.findContours(eroded, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    # Check if any contour could be a bounding box
+    found = False
+    for contour in contours:
+        # Approximate the contour to a polygon
+        perimeter = cv2.arcLength(contour, True)
+        approx = cv2.approxPolyDP(contour, 0.04 * perimeter, True)
+
+        # If it has 4 points, it could be a rectangle
+        if len(approx) == 4:
+            found = True
+            break
+    _stage(timings, "contours", started)
+
+    if found:
+        return True
+
+    # Also check if there's a reasonable number of red pixels that could be a bounding box
+    # A typical bounding box may have at least 500 red pixels
+    return red_pixel_count > 500
 
 def has_bounding_box(image_path):
     """
@@ -24,55 +96,9 @@ def has_bounding_box(image_path):
         if img is None:
             print(f"Could not read image: {image_path}")
             return False
-        
-        # Convert to HSV space for easier color detection
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        
-        # Define red color range in HSV
-        # Red has two ranges in HSV, so we need to check both
-        lower_red1 = np.array([0, 120, 70])
-        upper_red1 = np.array([10, 255, 255])
-        mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
-        
-        lower_red2 = np.array([170, 120, 70])  
-        upper_red2 = np.array([180, 255, 255])
-        mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
-        
-        # Combine masks
-        red_mask = cv2.bitwise_or(mask1, mask2)
-        
-        # To consider an image as having a bounding box, we look for:
-        # - Sufficient red pixels in a pattern consistent with a bounding box
-        
-        # Count red pixels
-        red_pixel_count = cv2.countNonZero(red_mask)
-        
-        # Detect if red pixels form lines (potential bounding boxes)
-        # We'll apply morphological operations to identify line segments
-        kernel = np.ones((3, 3), np.uint8)
-        dilated = cv2.dilate(red_mask, kernel, iterations=1)
-        eroded = cv2.erode(dilated, kernel, iterations=1)
-        
-        # Find contours that could be rectangles
-        contours, _ = cv2.findContours(eroded, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Check if any contour could be a bounding box
-        for contour in contours:
-            # Approximate the contour to a polygon
-            perimeter = cv2.arcLength(contour, True)
-            approx = cv2.approxPolyDP(contour, 0.04 * perimeter, True)
-            
-            # If it has 4 points, it could be a rectangle
-            if len(approx) == 4:
-                return True
-        
-        # Also check if there's a reasonable number of red pixels that could be a bounding box
-        # A typical bounding box may have at least 500 red pixels
-        if red_pixel_count > 500:
-            return True
-            
-        return False
-    
+
+        return detect_bounding_box(img)
+
     except Exception as e:
         print(f"Error checking for bounding boxes in {image_path}: {e}")
         return False
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+"""
+Benchmark Bounding Box Detection
+
+This script synthesizes thermal-style images with and without red bounding
+boxes, runs them through has_bounding_box's detector from Process-anomaly.py
+and reports accuracy (precision/recall) together with throughput and the time
+spent in each detection stage. Use it to check that a detector optimization
+keeps accuracy before accepting it.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+STAGES = ("hsv", "mask", "morphology", "contours")
+
+
+def load_detector():
+    """Import Process-anomaly.py (not importable by name because of the hyphen)."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Process-anomaly.py")
+    spec = importlib.util.spec_from_file_location("process_anomaly", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.detect_bounding_box
+
+
+def thermal_background(rng, width, height):
+    """
+    Build a thermal-looking frame: smooth heat gradients, a few warm blobs
+    and sensor noise, rendered through a grayscale or ironbow-like palette.
+    """
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    field = (xx / width) * rng.uniform(20, 60) + (yy / height) * rng.uniform(20, 60)
+
+    for _ in range(rng.integers(2, 6)):
+        cx, cy = rng.uniform(0, width), rng.uniform(0, height)
+        radius = rng.uniform(10, min(width, height) / 4)
+        field += rng.uniform(20, 80) * np.exp(-((xx - cx) ** 2 + (yy - cy) ** 2) / (2 * radius ** 2))
+
+    field += rng.normal(0, 3, field.shape)
+    gray = cv2.normalize(field, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+
+    if rng.random() < 0.5:
+        return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    # Keep the palette out of the pure-red hue band so that false positives come
+    # from the distractors we place on purpose, not from the colormap itself.
+    return cv2.applyColorMap(gray // 2, cv2.COLORMAP_BONE)
+
+
+def add_noise(img, rng, sigma):
+    """Add gaussian sensor noise to a BGR image."""
+    if sigma <= 0:
+        return img
+    noisy = img.astype(np.float32) + rng.normal(0, sigma, img.shape)
+    return np.clip(noisy, 0, 255).astype(np.uint8)
+
+
+def draw_red_box(img, rng):
+    """Draw a red annotation rectangle of random size and thickness."""
+    height, width = img.shape[:2]
+    box_w = int(rng.uniform(0.08, 0.6) * width)
+    box_h = int(rng.uniform(0.08, 0.6) * height)
+    x = int(rng.uniform(0, width - box_w))
+    y = int(rng.uniform(0, height - box_h))
+    thickness = int(rng.integers(1, 6))
+    color = (int(rng.integers(0, 40)), int(rng.integers(0, 40)), int(rng.integers(200, 256)))
+    cv2.rectangle(img, (x, y), (x + box_w, y + box_h), color, thickness)
+
+
+def draw_near_red_distractor(img, rng):
+    """
+    Draw shapes that are close to, but not, an annotation box: small red
+    specks, orange/magenta rectangles and desaturated red blobs.
+    """
+    height, width = img.shape[:2]
+    kind = rng.integers(0, 3)
+    if kind == 0:
+        # A handful of tiny red specks, well under a box outline's pixel count
+        for _ in range(rng.integers(1, 4)):
+            cx, cy = int(rng.uniform(0, width)), int(rng.uniform(0, height))
+            cv2.circle(img, (cx, cy), int(rng.integers(1, 4)), (0, 0, 255), -1)
+    elif kind == 1:
+        # Hue just outside the red bands (orange ~H 15-20, magenta ~H 150-160)
+        hue = int(rng.choice([int(rng.integers(15, 21)), int(rng.integers(150, 161))]))
+        hsv_color = np.uint8([[[hue, 255, 255]]])
+        color = tuple(int(c) for c in cv2.cvtColor(hsv_color, cv2.COLOR_HSV2BGR)[0, 0])
+        x, y = int(rng.uniform(0, width * 0.6)), int(rng.uniform(0, height * 0.6))
+        cv2.rectangle(img, (x, y), (x + int(width * 0.3), y + int(height * 0.3)), color, 2)
+    else:
+        # Red hue but saturation below the detector's threshold
+        hsv_color = np.uint8([[[0, int(rng.integers(40, 100)), 220]]])
+        color = tuple(int(c) for c in cv2.cvtColor(hsv_color, cv2.COLOR_HSV2BGR)[0, 0])
+        cx, cy = int(rng.uniform(0, width)), int(rng.uniform(0, height))
+        cv2.ellipse(img, (cx, cy), (int(width * 0.1), int(height * 0.07)), 0, 0, 360, color, -1)
+
+
+def synthesize_dataset(count, width, height, seed, positive_ratio=0.5, distractor_ratio=0.5):
+    """
+    Generate ``count`` labelled images as (image, has_box, kind) tuples.
+
+    Args:
+        count: Number of images to generate
+        width, height: Image size in pixels
+        seed: RNG seed so runs are comparable
+        positive_ratio: Fraction of images that get a red bounding box
+        distractor_ratio: Fraction of negatives that get near-red distractors
+    """
+    rng = np.random.default_rng(seed)
+    dataset = []
+    for _ in range(count):
+        img = thermal_background(rng, width, height)
+        has_box = rng.random() < positive_ratio
+        if has_box:
+            draw_red_box(img, rng)
+            kind = "box"
+        elif rng.random() < distractor_ratio:
+            draw_near_red_distractor(img, rng)
+            kind = "distractor"
+        else:
+            kind = "clean"
+        img = add_noise(img, rng, rng.uniform(0, 8))
+        dataset.append((img, has_box, kind))
+    return dataset
+
+
+def run_benchmark(detector, dataset, repeat=1):
+    """
+    Run the detector over the dataset and collect accuracy and timing.
+
+    Args:
+        detector: Callable taking (img, timings) and returning a bool
+        dataset: Output of synthesize_dataset
+        repeat: Number of timed passes over the dataset
+    """
+    timings = {stage: 0.0 for stage in STAGES}
+    counts = {"tp": 0, "fp": 0, "tn": 0, "fn": 0}
+    false_positives = {}
+
+    start = time.perf_counter()
+    for run in range(repeat):
+        for img, has_box, kind in dataset:
+            predicted = detector(img, timings)
+            if run:
+                continue
+            if predicted and has_box:
+                counts["tp"] += 1
+            elif predicted:
+                counts["fp"] += 1
+                false_positives[kind] = false_positives.get(kind, 0) + 1
+            elif has_box:
+                counts["fn"] += 1
+            else:
+                counts["tn"] += 1
+    elapsed = time.perf_counter() - start
+
+    images = len(dataset) * repeat
+    predicted_positive = counts["tp"] + counts["fp"]
+    actual_positive = counts["tp"] + counts["fn"]
+    return {
+        "images": images,
+        "seconds": elapsed,
+        "images_per_sec": images / elapsed if elapsed else 0.0,
+        "precision": counts["tp"] / predicted_positive if predicted_positive else 1.0,
+        "recall": counts["tp"] / actual_positive if actual_positive else 1.0,
+        "counts": counts,
+        "false_positives_by_kind": false_positives,
+        "stage_ms_per_image": {stage: 1000 * timings[stage] / images for stage in STAGES},
+    }
+
+
+def print_report(result):
+    """Print a human readable summary of a benchmark run."""
+    counts = result["counts"]
+    print(f"Images: {result['images']} in {result['seconds']:.2f}s "
+          f"({result['images_per_sec']:.1f} images/sec)")
+    print(f"Precision: {result['precision']:.3f}  Recall: {result['recall']:.3f}")
+    print(f"TP={counts['tp']} FP={counts['fp']} TN={counts['tn']} FN={counts['fn']}")
+    if result["false_positives_by_kind"]:
+        print(f"False positives by kind: {result['false_positives_by_kind']}")
+    print("Per-stage time (ms/image):")
+    for stage, ms in result["stage_ms_per_image"].items():
+        print(f"  {stage:<11} {ms:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the red bounding box detector.')
+    parser.add_argument('--count', type=int, default=400, help='Number of synthetic images')
+    parser.add_argument('--width', type=int, default=640, help='Image width in pixels')
+    parser.add_argument('--height', type=int, default=512, help='Image height in pixels')
+    parser.add_argument('--seed', type=int, default=1234, help='Random seed for the dataset')
+    parser.add_argument('--repeat', type=int, default=1, help='Timed passes over the dataset')
+    parser.add_argument('--min-precision', type=float, default=None,
+                        help='Exit non-zero if precision drops below this value')
+    parser.add_argument('--min-recall', type=float, default=None,
+                        help='Exit non-zero if recall drops below this value')
+    parser.add_argument('--json', default=None, help='Also write the results to this JSON file')
+
+    args = parser.parse_args()
+
+    detector = load_detector()
+    print(f"Synthesizing {args.count} images ({args.width}x{args.height}, seed {args.seed})...")
+    dataset = synthesize_dataset(args.count, args.width, args.height, args.seed)
+
+    result = run_benchmark(detector, dataset, repeat=args.repeat)
+    print_report(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+    failed = False
+    if args.min_precision is not None and result["precision"] < args.min_precision:
+        print(f"Precision {result['precision']:.3f} is below {args.min_precision}")
+        failed = True
+    if args.min_recall is not None and result["recall"] < args.min_recall:
+        print(f"Recall {result['recall']:.3f} is below {args.min_recall}")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
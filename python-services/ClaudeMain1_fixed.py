@@ -1,83 +1,366 @@
-"""Generate a PDF report from the processed Excel workbook."""
+"""Generate a PDF report from the processed job records."""
 
 from __future__ import annotations
 
 import json
+import os
 import sys
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, List, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
 from reportlab.lib.pagesizes import LETTER
-from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.pdfgen import canvas
 
+from report_data import read_records, read_summary
+from thumbnails import CACHE_DIR_NAME, build_thumbnails, parse_bbox
 
-def load_summary(excel_path: Path, metadata_path: Path | None = None) -> Dict[str, int]:
+PAGE_WIDTH, PAGE_HEIGHT = LETTER
+MARGIN = 0.75 * inch
+BODY_FONT = "Helvetica"
+BODY_FONT_BOLD = "Helvetica-Bold"
+BODY_FONT_SIZE = 9
+BODY_LEADING = 11
+CELL_PADDING = 3
+MAX_CELL_LINES = 3
+ROW_CHUNK = 5000
+GALLERY_ENABLED = os.getenv("REPORT_GALLERY", "true").lower() == "true"
+GALLERY_LIMIT = int(os.getenv("REPORT_GALLERY_LIMIT", "1000"))
+GALLERY_COLUMNS = 4
+# Lower bound on Helvetica glyph widths (in ems), used to cap text before wrapping
+MIN_GLYPH_EM = 0.2
+
+# (record key, header, share of the usable page width)
+DETAIL_COLUMNS = (
+    ("file_name", "File", 0.32),
+    ("file_type", "Type", 0.08),
+    ("size", "Size", 0.12),
+    ("anomaly", "Anomaly", 0.10),
+    ("notes", "Notes", 0.38),
+)
+BREAKDOWN_COLUMNS = (
+    ("file_type", "File Type", 0.30),
+    ("files", "Files", 0.20),
+    ("anomalies", "Anomalies", 0.20),
+    ("total_size", "Total Size", 0.30),
+)
+
+_GLYPH_WIDTHS: Dict[str, Dict[str, float]] = {}
+
+
+def load_summary(records_path: Path, metadata_path: Path | None = None) -> Dict[str, int]:
     if metadata_path and metadata_path.exists():
         try:
             return json.loads(metadata_path.read_text())
         except Exception:
             pass
 
+    return read_summary(records_path)
+
+
+def build_report(
+    records_path: Path, pdf_path: Path, metadata_path: Path | None = None, gallery_dir: Path | None = None
+) -> None:
+    summary = load_summary(records_path, metadata_path)
+    anomalies_df = read_records(records_path)
+    render_report(anomalies_df, summary, pdf_path, gallery_dir)
+
+
+def _format_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Pre-format a slice of records into display strings, column by column."""
+    def column(name: str, default: object = "") -> pd.Series:
+        if name in chunk:
+            return chunk[name]
+        return pd.Series(default, index=chunk.index)
+
+    sizes = pd.to_numeric(column("size_bytes", 0), errors="coerce").fillna(0) / 1024
+    return pd.DataFrame({
+        "file_name": column("file_name").fillna("").astype(str),
+        "file_type": column("file_type").fillna("").astype(str),
+        "size": sizes.map("{:,.1f} KB".format),
+        "anomaly": np.where(column("anomaly_detected", False).fillna(False).astype(bool), "YES", "NO"),
+        "notes": column("notes").fillna("").astype(str),
+    })
+
+
+def _glyph_widths(font: str) -> Dict[str, float]:
+    widths = _GLYPH_WIDTHS.get(font)
+    if widths is None:
+        widths = _GLYPH_WIDTHS[font] = {}
+    return widths
+
+
+def _width(text: str, font: str, size: float) -> float:
+    """``stringWidth`` with per-glyph widths cached, for measuring many cells."""
+    widths = _glyph_widths(font)
     try:
-        summary_df = pd.read_excel(excel_path, sheet_name="Summary")
-        summary = summary_df.iloc[0].to_dict()
-        return {k: int(v) for k, v in summary.items() if isinstance(v, (int, float))}
-    except Exception:
-        return {"total_files": 0, "anomalies_found": 0}
+        return sum(map(widths.__getitem__, text)) * size
+    except KeyError:
+        for char in set(text) - widths.keys():
+            widths[char] = stringWidth(char, font, 1)
+        return sum(map(widths.__getitem__, text)) * size
+
+
+def _fit_text(text: str, font: str, size: float, width: float, max_lines: int) -> List[str]:
+    """Wrap ``text`` into at most ``max_lines`` lines of ``width`` points.
+
+    Words longer than a line are broken by character; anything that does not
+    fit in ``max_lines`` is cut and marked with an ellipsis.
+    """
+    if _width(text, font, size) <= width:
+        return [text]
+    # Nothing past this many characters can possibly be drawn.
+    text = text[: int(max_lines * width / (size * MIN_GLYPH_EM)) + 1]
+
+    widths = _glyph_widths(font)
+    limit = width / size
+    lines: List[str] = []
+    start = 0
+    line_width = 0.0
+    last_space = -1
+    index = 0
+    while index < len(text) and len(lines) <= max_lines:
+        char = text[index]
+        line_width += widths[char]
+        if char == " ":
+            last_space = index
+        if line_width > limit and index > start:
+            end = last_space if last_space > start else index
+            lines.append(text[start:end])
+            start = end + 1 if end == last_space else end
+            index = start
+            line_width = 0.0
+            last_space = -1
+            continue
+        index += 1
+    if start < len(text) and len(lines) <= max_lines:
+        lines.append(text[start:])
+
+    if len(lines) > max_lines:
+        lines = lines[:max_lines]
+        last = lines[-1]
+        while last and _width(last + "…", font, size) > width:
+            last = last[:-1]
+        lines[-1] = last + "…"
+    return lines
+
+
+class _TableWriter:
+    """Draws table rows onto a canvas, starting new pages with a repeated header.
+
+    All cells on a page go into a single text object, which is much cheaper
+    than one ``drawString`` call per line. Call ``finish`` to flush it.
+    """
+
+    def __init__(self, c: canvas.Canvas, columns: Sequence[Tuple[str, str, float]], top: float) -> None:
+        self.c = c
+        self.columns = columns
+        self.y = top
+        self._start_text()
+
+    def _start_text(self) -> None:
+        self.text = self.c.beginText()
+        self.text.setLeading(BODY_LEADING)
+        self.text.setFont(BODY_FONT_BOLD, BODY_FONT_SIZE)
+        x = MARGIN
+        for _, title, width in self.columns:
+            self.text.setTextOrigin(x + CELL_PADDING, self.y - BODY_FONT_SIZE)
+            self.text.textLine(title)
+            x += width
+        self.y -= BODY_LEADING + CELL_PADDING
+        self.c.line(MARGIN, self.y, PAGE_WIDTH - MARGIN, self.y)
+        self.y -= CELL_PADDING
+        self.text.setFont(BODY_FONT, BODY_FONT_SIZE)
+
+    def finish(self) -> None:
+        self.c.drawText(self.text)
+
+    def new_page(self) -> None:
+        self.finish()
+        self.c.showPage()
+        self.y = PAGE_HEIGHT - MARGIN
+        self._start_text()
 
+    def row(self, values: Sequence[str]) -> None:
+        cells = [
+            _fit_text(value, BODY_FONT, BODY_FONT_SIZE, width - 2 * CELL_PADDING, MAX_CELL_LINES)
+            for value, (_, _, width) in zip(values, self.columns)
+        ]
+        row_height = max(len(lines) for lines in cells) * BODY_LEADING + CELL_PADDING
+        if self.y - row_height < MARGIN:
+            self.new_page()
 
-def build_report(excel_path: Path, pdf_path: Path, metadata_path: Path | None = None) -> None:
-    summary = load_summary(excel_path, metadata_path)
-    anomalies_df = pd.read_excel(excel_path, sheet_name="Anomalies")
+        x = MARGIN
+        for lines, (_, _, width) in zip(cells, self.columns):
+            self.text.setTextOrigin(x + CELL_PADDING, self.y - BODY_FONT_SIZE)
+            self.text.textLines(lines)
+            x += width
+        self.y -= row_height
 
+
+def _table_columns(shares: Sequence[Tuple[str, str, float]]) -> List[Tuple[str, str, float]]:
+    usable = PAGE_WIDTH - 2 * MARGIN
+    return [(key, title, usable * share) for key, title, share in shares]
+
+
+def render_report(
+    anomalies_df: pd.DataFrame,
+    summary: Dict[str, int],
+    pdf_path: Path,
+    gallery_dir: Path | None = None,
+    progress: Callable[[Dict[str, int]], None] | None = None,
+) -> None:
     c = canvas.Canvas(str(pdf_path), pagesize=LETTER)
-    width, height = LETTER
-    styles = getSampleStyleSheet()
-    textobject = c.beginText(1 * inch, height - 1 * inch)
-
-    textobject.setFont("Helvetica-Bold", 18)
-    textobject.textLine("ComplianceDrone Thermal Inspection Report")
-    textobject.setFont("Helvetica", 12)
-    textobject.textLine("")
-
-    textobject.textLine(f"Total files processed: {summary.get('total_files', len(anomalies_df))}")
-    textobject.textLine(f"Anomalies detected: {summary.get('anomalies_found', 0)}")
-    textobject.textLine("")
-
-    textobject.setFont("Helvetica-Bold", 14)
-    textobject.textLine("Detected Files")
-    textobject.setFont("Helvetica", 10)
-
-    for _, row in anomalies_df.iterrows():
-        flag = "YES" if bool(row.get("anomaly_detected")) else "NO"
-        textobject.textLine(
-            f"• {row.get('file_name')} — anomaly: {flag} — notes: {row.get('notes', '')}"
-        )
-        if textobject.getY() < 1 * inch:
-            c.drawText(textobject)
-            c.showPage()
-            textobject = c.beginText(1 * inch, height - 1 * inch)
-            textobject.setFont("Helvetica", 10)
+    if progress is not None:
+        c.setPageCallBack(lambda page: progress({"pages_rendered": page}))
+    y = PAGE_HEIGHT - MARGIN
+
+    c.setFont("Helvetica-Bold", 18)
+    c.drawString(MARGIN, y - 18, "ComplianceDrone Thermal Inspection Report")
+    y -= 18 + 24
+
+    c.setFont("Helvetica", 12)
+    lines = [
+        f"Total files processed: {summary.get('total_files', len(anomalies_df))}",
+        f"Anomalies detected: {summary.get('anomalies_found', 0)}",
+    ]
+    if summary.get("duplicates_skipped"):
+        lines.append(f"Duplicate uploads skipped: {summary['duplicates_skipped']}")
+    for line in lines:
+        c.drawString(MARGIN, y - 12, line)
+        y -= 16
+    y -= 12
+
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(MARGIN, y - 14, "Breakdown by File Type")
+    y -= 14 + 10
+    breakdown = _type_breakdown(anomalies_df)
+    table = _TableWriter(c, _table_columns(BREAKDOWN_COLUMNS), y)
+    for row in breakdown.itertuples(index=False):
+        table.row([str(value) for value in row])
+    table.finish()
+    y = table.y - 24
+
+    if y - 14 - 10 - 3 * BODY_LEADING < MARGIN:
+        c.showPage()
+        y = PAGE_HEIGHT - MARGIN
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(MARGIN, y - 14, "Detected Files")
+    y -= 14 + 10
+
+    table = _TableWriter(c, _table_columns(DETAIL_COLUMNS), y)
+    keys = [key for key, _, _ in DETAIL_COLUMNS]
+    for start in range(0, len(anomalies_df), ROW_CHUNK):
+        formatted = _format_chunk(anomalies_df.iloc[start:start + ROW_CHUNK])[keys]
+        for row in formatted.itertuples(index=False, name=None):
+            table.row(row)
+    table.finish()
+
+    if gallery_dir is not None:
+        _draw_gallery(c, anomalies_df, gallery_dir)
 
-    c.drawText(textobject)
     c.showPage()
     c.save()
 
 
+def _draw_gallery(c: canvas.Canvas, df: pd.DataFrame, gallery_dir: Path) -> None:
+    """Add a page grid of thumbnails for the anomalous images in ``gallery_dir``.
+
+    Images are ordered by hotspot strength and capped at ``GALLERY_LIMIT``.
+    """
+    if df.empty or "anomaly_detected" not in df:
+        return
+    flagged = df[df["anomaly_detected"].fillna(False).astype(bool)]
+    if "max_delta" in flagged:
+        flagged = flagged.sort_values("max_delta", ascending=False, kind="stable")
+    bboxes = flagged["hotspot_bbox"] if "hotspot_bbox" in flagged else pd.Series("", index=flagged.index)
+
+    entries = []
+    for name, bbox, delta in zip(
+        flagged["file_name"].astype(str), bboxes, flagged.get("max_delta", pd.Series(0.0, index=flagged.index))
+    ):
+        source = gallery_dir / name
+        if source.is_file():
+            entries.append((name, source, parse_bbox(bbox), delta))
+        if len(entries) >= GALLERY_LIMIT:
+            break
+    if not entries:
+        return
+
+    thumbs = build_thumbnails([(source, bbox) for _, source, bbox, _ in entries], gallery_dir / CACHE_DIR_NAME)
+
+    c.showPage()
+    y = PAGE_HEIGHT - MARGIN
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(MARGIN, y - 14, "Anomaly Gallery")
+    y -= 14 + 6
+    c.setFont(BODY_FONT, BODY_FONT_SIZE)
+    if len(flagged) > len(entries):
+        c.drawString(MARGIN, y - BODY_FONT_SIZE, f"Showing the {len(entries)} strongest of {len(flagged)} flagged images.")
+        y -= BODY_LEADING
+    y -= 8
+
+    cell_width = (PAGE_WIDTH - 2 * MARGIN) / GALLERY_COLUMNS
+    image_width = cell_width - 2 * CELL_PADDING
+    image_height = image_width * 0.8
+    row_height = image_height + 2 * BODY_LEADING + 2 * CELL_PADDING
+
+    column = 0
+    for (name, _, _, delta), thumb in zip(entries, thumbs):
+        if thumb is None:
+            continue
+        if column == 0 and y - row_height < MARGIN:
+            c.showPage()
+            c.setFont(BODY_FONT, BODY_FONT_SIZE)
+            y = PAGE_HEIGHT - MARGIN
+        x = MARGIN + column * cell_width + CELL_PADDING
+        c.drawImage(
+            str(thumb), x, y - image_height, width=image_width, height=image_height,
+            preserveAspectRatio=True, anchor="c",
+        )
+        caption = _fit_text(name, BODY_FONT, BODY_FONT_SIZE, image_width, 1)[0]
+        c.drawString(x, y - image_height - BODY_LEADING, caption)
+        if pd.notna(delta) and delta:
+            c.drawString(x, y - image_height - 2 * BODY_LEADING, f"max delta {float(delta):.1f}")
+        column += 1
+        if column == GALLERY_COLUMNS:
+            column = 0
+            y -= row_height
+
+
+def _type_breakdown(df: pd.DataFrame) -> pd.DataFrame:
+    if df.empty or "file_type" not in df:
+        return pd.DataFrame(columns=[key for key, _, _ in BREAKDOWN_COLUMNS])
+    flags = df["anomaly_detected"].fillna(False).astype(bool) if "anomaly_detected" in df else False
+    sizes = pd.to_numeric(df["size_bytes"], errors="coerce").fillna(0) if "size_bytes" in df else 0
+    grouped = (
+        pd.DataFrame({"file_type": df["file_type"].fillna("unknown").astype(str), "anomaly": flags, "size": sizes})
+        .groupby("file_type", sort=True)
+        .agg(files=("anomaly", "size"), anomalies=("anomaly", "sum"), total_bytes=("size", "sum"))
+        .reset_index()
+    )
+    grouped["total_size"] = (grouped["total_bytes"] / (1024 * 1024)).map("{:,.1f} MB".format)
+    return grouped[["file_type", "files", "anomalies", "total_size"]]
+
+
 def main() -> None:
     if len(sys.argv) < 3:
-        print("Usage: python ClaudeMain1_fixed.py <excel_path> <pdf_path> [metadata_path]", file=sys.stderr)
+        print("Usage: python ClaudeMain1_fixed.py <records_path> <pdf_path> [metadata_path]", file=sys.stderr)
         sys.exit(1)
 
-    excel_path = Path(sys.argv[1]).expanduser().resolve()
+    records_path = Path(sys.argv[1]).expanduser().resolve()
     pdf_path = Path(sys.argv[2]).expanduser().resolve()
-    metadata_path = Path(sys.argv[3]).expanduser().resolve() if len(sys.argv) > 3 else excel_path.with_suffix(".json")
+    metadata_path = Path(sys.argv[3]).expanduser().resolve() if len(sys.argv) > 3 else records_path.with_suffix(".json")
+
+    gallery_dir = records_path.parent / "annotated"
+    if not (GALLERY_ENABLED and gallery_dir.is_dir()):
+        gallery_dir = None
 
     pdf_path.parent.mkdir(parents=True, exist_ok=True)
-    build_report(excel_path, pdf_path, metadata_path)
+    build_report(records_path, pdf_path, metadata_path, gallery_dir)
     print(f"PDF report created at {pdf_path}")
 
 
@@ -1,78 +1,299 @@
-"""Utility script to process uploaded drone files and build an Excel workbook."""
+"""Utility script to process uploaded drone files and build the job records file."""
 
 from __future__ import annotations
 
 import sys
 import json
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import List, Dict
+from typing import Callable, List, Dict, Iterator, Optional, Tuple
 
 import pandas as pd
 
-IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".tif", ".tiff"}
-THERMAL_KEYWORDS = {"hot", "anomaly", "thermal", "hotspot"}
-
+from dedupe import UPLOAD_INDEX_NAME, ContentIndex, cached_analysis, load_upload_index, store_analysis
+from hotspot_detection import analyze_stream
+from report_data import export_excel, write_records
 
-def detect_anomaly(file_path: Path) -> bool:
-    """Simple heuristic to decide if an anomaly is present."""
-    stem = file_path.stem.lower()
-    if any(keyword in stem for keyword in THERMAL_KEYWORDS):
-        return True
-    # provide deterministic pseudo-random fallback
-    return hash(file_path.stem) % 5 == 0
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".tif", ".tiff"}
+ANALYSIS_COLUMNS = ("mean_intensity", "max_intensity", "max_delta", "hotspot_count", "hotspot_bbox")
+MANIFEST_NAME = "manifest.json"
+COPY_CHUNK_BYTES = 8 * 1024 * 1024
+# ioctl request number for FICLONE (reflink) on Linux: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+WALK_WORKERS = int(os.getenv("WALK_WORKERS", "8"))
 
 
-def build_record(file_path: Path) -> Dict[str, object]:
-    anomaly = detect_anomaly(file_path)
+def build_record(file_path: Path, stat_result: Optional[os.stat_result] = None) -> Dict[str, object]:
+    if stat_result is None:
+        stat_result = file_path.stat()
     return {
         "file_name": file_path.name,
         "file_type": file_path.suffix.lower() or "unknown",
-        "size_bytes": file_path.stat().st_size,
-        "anomaly_detected": anomaly,
-        "notes": "Flagged as potential issue" if anomaly else "No anomaly detected",
+        "size_bytes": stat_result.st_size,
+        "anomaly_detected": False,
+        "notes": "No anomaly detected",
+        "mean_intensity": None,
+        "max_intensity": None,
+        "max_delta": 0.0,
+        "hotspot_count": 0,
+        "hotspot_bbox": "",
     }
 
 
-def process_directory(input_dir: Path) -> Dict[str, object]:
-    records: List[Dict[str, object]] = []
+def apply_detection(record: Dict[str, object], result: Dict[str, object]) -> Dict[str, object]:
+    """Copy hotspot analysis results onto a record and set its anomaly flag."""
+    for column in ANALYSIS_COLUMNS:
+        record[column] = result[column]
+    anomaly = result["hotspot_count"] > 0
+    record["anomaly_detected"] = anomaly
+    if anomaly:
+        record["notes"] = f"{result['hotspot_count']} hotspot(s), max delta {result['max_delta']:.1f}"
+    elif not result["decoded"]:
+        record["notes"] = "Image could not be decoded"
+    return record
+
+
+def _scan_dir(path: str) -> Tuple[List[Tuple[Path, os.stat_result]], List[str]]:
+    files: List[Tuple[Path, os.stat_result]] = []
+    subdirs: List[str] = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    files.append((Path(entry.path), entry.stat()))
+            except OSError:
+                continue
+    return files, subdirs
+
+
+def iter_files(
+    input_dir: Path, skip: Tuple[str, ...] = ("annotated",), max_workers: Optional[int] = None
+) -> Iterator[Tuple[Path, os.stat_result]]:
+    """Yield ``(path, stat)`` for every file below ``input_dir``.
+
+    Directories are listed with ``os.scandir`` so each file costs one stat at
+    most, and subdirectories are fanned out across a thread pool, which hides
+    per-directory latency on network storage. Top-level directories named in
+    ``skip`` are not descended into. Files are yielded as soon as their
+    directory has been listed; the order is not deterministic.
+    """
+    files, subdirs = _scan_dir(str(input_dir))
+    yield from files
+
+    subdirs = [path for path in subdirs if os.path.basename(path) not in skip]
+    if not subdirs:
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers or WALK_WORKERS) as pool:
+        pending = {pool.submit(_scan_dir, path) for path in subdirs}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    files, nested = future.result()
+                except OSError:
+                    continue
+                pending.update(pool.submit(_scan_dir, path) for path in nested)
+                yield from files
+
+
+def iter_records(
+    input_dir: Path,
+    annotated_dir: Path,
+    staged: Optional[List[Dict[str, object]]] = None,
+    duplicates: Optional[List[Dict[str, str]]] = None,
+    progress: Optional[Callable[[Dict[str, int]], None]] = None,
+) -> Iterator[Dict[str, object]]:
+    """Stream one record per uploaded file, staging images as they are found.
+
+    Files whose content matches an earlier file are skipped (and listed in
+    ``duplicates``). Images are analyzed for hotspots in batches on a process
+    pool while the walk continues, reusing cached results for content that
+    was analyzed by an earlier job; other files are yielded as soon as they
+    are seen. ``progress`` receives running counts after every record.
+    """
+    index = ContentIndex(load_upload_index(input_dir))
+    counts = {"files_processed": 0, "files_staged": 0, "images_analyzed": 0}
+
+    def report(analyzed: bool) -> None:
+        counts["files_processed"] += 1
+        counts["images_analyzed"] += analyzed
+        counts["files_staged"] = len(staged) if staged is not None else 0
+        if progress is not None:
+            progress(counts)
+
+    def scanned() -> Iterator[Tuple[Optional[Path], Tuple[Dict[str, object], Optional[str], bool]]]:
+        for file_path, stat_result in iter_files(input_dir, skip=(annotated_dir.name,)):
+            key = file_path.relative_to(input_dir).as_posix()
+            if key == UPLOAD_INDEX_NAME:
+                continue
+            original = index.register(file_path, stat_result.st_size, key)
+            if original is not None:
+                if duplicates is not None:
+                    duplicates.append({"file": key, "duplicate_of": original.relative_to(input_dir).as_posix()})
+                continue
+
+            is_image = file_path.suffix.lower() in IMAGE_EXTENSIONS
+            digest = index.known_digest(file_path)
+            cached = cached_analysis(digest) if is_image and digest else None
+            for record in _handle_file(file_path, annotated_dir, staged, stat_result):
+                if cached is not None:
+                    yield None, (apply_detection(record, cached), None, True)
+                else:
+                    yield (file_path if is_image else None), (record, digest, False)
+
+    for (record, digest, from_cache), result in analyze_stream(scanned()):
+        report(from_cache or result is not None)
+        if result is None:
+            yield record
+            continue
+        if digest:
+            store_analysis(digest, result)
+        yield apply_detection(record, result)
+
+
+def process_directory(
+    input_dir: Path, progress: Optional[Callable[[Dict[str, int]], None]] = None
+) -> Dict[str, object]:
+    staged: List[Dict[str, object]] = []
+    duplicates: List[Dict[str, str]] = []
     annotated_dir = input_dir / "annotated"
     annotated_dir.mkdir(exist_ok=True)
 
-    for item in input_dir.iterdir():
-        if item.is_dir():
-            if item.name != "annotated":
-                for nested in item.rglob("*"):
-                    if nested.is_file():
-                        records.extend(_handle_file(nested, annotated_dir))
-            continue
-        records.extend(_handle_file(item, annotated_dir))
+    records = list(iter_records(input_dir, annotated_dir, staged, duplicates, progress))
+
+    write_manifest(annotated_dir, staged, duplicates)
 
     df = pd.DataFrame(records)
     summary = {
         "total_files": int(len(df)),
         "anomalies_found": int(df[df["anomaly_detected"]].shape[0]) if not df.empty else 0,
+        "duplicates_skipped": len(duplicates),
     }
     return {"records": df, "summary": summary, "annotated_dir": annotated_dir}
 
 
-def _handle_file(file_path: Path, annotated_dir: Path) -> List[Dict[str, object]]:
-    if not file_path.is_file():
+def _handle_file(
+    file_path: Path,
+    annotated_dir: Path,
+    staged: Optional[List[Dict[str, object]]] = None,
+    stat_result: Optional[os.stat_result] = None,
+) -> List[Dict[str, object]]:
+    if stat_result is None and not file_path.is_file():
         return []
     records: List[Dict[str, object]] = []
-    record = build_record(file_path)
+    record = build_record(file_path, stat_result)
     records.append(record)
 
     if file_path.suffix.lower() in IMAGE_EXTENSIONS:
         target = annotated_dir / file_path.name
         try:
-            target.write_bytes(file_path.read_bytes())
+            method = stage_file(file_path, target)
         except Exception:
             target.write_text("Annotated version unavailable")
+            method = "failed"
+        if staged is not None:
+            staged.append({
+                "source": str(file_path),
+                "target": str(target),
+                "method": method,
+                "size_bytes": record["size_bytes"],
+            })
     return records
 
 
-def write_outputs(input_dir: Path, excel_path: Path, metadata_path: Path) -> None:
-    results = process_directory(input_dir)
+def stage_file(source: Path, target: Path) -> str:
+    """Place ``source`` at ``target`` with the cheapest mechanism available.
+
+    Tries a hardlink, then a reflink (copy-on-write clone), then a kernel-side
+    copy, and only falls back to a userspace streaming copy when none of those
+    are supported. Returns the name of the mechanism that was used.
+
+    Staged files may share storage with the upload, so anything that annotates
+    them must write a new file rather than modify the staged one in place.
+    """
+    if target.exists() or target.is_symlink():
+        target.unlink()
+
+    try:
+        os.link(source, target)
+        return "hardlink"
+    except OSError:
+        pass
+
+    with source.open("rb") as src, target.open("wb") as dst:
+        if _reflink(src.fileno(), dst.fileno()):
+            return "reflink"
+        size = os.fstat(src.fileno()).st_size
+        for method, copy in (("copy_file_range", _copy_file_range), ("sendfile", _sendfile)):
+            try:
+                copy(src.fileno(), dst.fileno(), size)
+                return method
+            except (AttributeError, OSError):
+                # Start the next method from scratch, without the partial copy's bytes
+                src.seek(0)
+                dst.seek(0)
+                dst.truncate(0)
+        shutil.copyfileobj(src, dst, COPY_CHUNK_BYTES)
+        return "stream"
+
+
+def _reflink(src_fd: int, dst_fd: int) -> bool:
+    try:
+        import fcntl
+
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except (ImportError, OSError):
+        return False
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, size: int) -> None:
+    remaining = size
+    while remaining > 0:
+        copied = os.copy_file_range(src_fd, dst_fd, min(remaining, COPY_CHUNK_BYTES))
+        if copied == 0:
+            break
+        remaining -= copied
+    if remaining > 0:
+        # Let stage_file fall back to the next method instead of keeping a short copy
+        raise OSError(f"copy_file_range stopped {remaining} bytes short")
+
+
+def _sendfile(src_fd: int, dst_fd: int, size: int) -> None:
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dst_fd, src_fd, offset, min(size - offset, COPY_CHUNK_BYTES))
+        if sent == 0:
+            break
+        offset += sent
+    if offset < size:
+        raise OSError(f"sendfile stopped {size - offset} bytes short")
+
+
+def write_manifest(
+    annotated_dir: Path, staged: List[Dict[str, object]], duplicates: Optional[List[Dict[str, str]]] = None
+) -> Path:
+    """Record which files were staged into ``annotated_dir`` and how."""
+    manifest_path = annotated_dir / MANIFEST_NAME
+    methods: Dict[str, int] = {}
+    for entry in staged:
+        methods[entry["method"]] = methods.get(entry["method"], 0) + 1
+    manifest_path.write_text(json.dumps(
+        {"files": staged, "methods": methods, "duplicates": duplicates or []}, indent=2
+    ))
+    return manifest_path
+
+
+def build_outputs(
+    input_dir: Path, progress: Optional[Callable[[Dict[str, int]], None]] = None
+) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """Process ``input_dir`` and return the records table and job summary."""
+    results = process_directory(input_dir, progress)
     df: pd.DataFrame = results["records"]
     summary = results["summary"]
 
@@ -84,29 +305,44 @@ def write_outputs(input_dir: Path, excel_path: Path, metadata_path: Path) -> Non
             "anomaly_detected": False,
             "notes": "Upload files to generate a report",
         }])
+    return df, summary
+
+
+def save_outputs(df: pd.DataFrame, summary: Dict[str, int], output_path: Path, metadata_path: Path) -> None:
+    """Write the records artifact and the JSON summary.
 
-    with pd.ExcelWriter(excel_path) as writer:
-        df.to_excel(writer, index=False, sheet_name="Anomalies")
-        summary_df = pd.DataFrame([summary])
-        summary_df.to_excel(writer, index=False, sheet_name="Summary")
+    ``output_path`` is normally a ``.parquet`` file. Passing an ``.xlsx`` path
+    still works for manual runs: the Parquet file is written next to it and
+    exported to Excel.
+    """
+    if output_path.suffix.lower() == ".xlsx":
+        records_path = write_records(df, summary, output_path.with_suffix(".parquet"))
+        export_excel(records_path, output_path)
+    else:
+        write_records(df, summary, output_path)
 
     metadata_path.write_text(json.dumps(summary, indent=2))
 
 
+def write_outputs(input_dir: Path, output_path: Path, metadata_path: Path) -> None:
+    df, summary = build_outputs(input_dir)
+    save_outputs(df, summary, output_path, metadata_path)
+
+
 def main() -> None:
     if len(sys.argv) < 3:
-        print("Usage: python Drone_Data_Process.py <input_dir> <excel_path> [metadata_path]", file=sys.stderr)
+        print("Usage: python Drone_Data_Process.py <input_dir> <output_path> [metadata_path]", file=sys.stderr)
         sys.exit(1)
 
     input_dir = Path(sys.argv[1]).expanduser().resolve()
-    excel_path = Path(sys.argv[2]).expanduser().resolve()
-    metadata_path = Path(sys.argv[3]).expanduser().resolve() if len(sys.argv) > 3 else excel_path.with_suffix(".json")
+    output_path = Path(sys.argv[2]).expanduser().resolve()
+    metadata_path = Path(sys.argv[3]).expanduser().resolve() if len(sys.argv) > 3 else output_path.with_suffix(".json")
 
-    excel_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
     metadata_path.parent.mkdir(parents=True, exist_ok=True)
 
-    write_outputs(input_dir, excel_path, metadata_path)
-    print(f"Excel report generated at {excel_path}")
+    write_outputs(input_dir, output_path, metadata_path)
+    print(f"Records written to {output_path}")
     print(f"Metadata summary saved at {metadata_path}")
 
 
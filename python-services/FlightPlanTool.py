@@ -1,75 +1,105 @@
-"""Simplified flight path generator.
+"""Flight path generator.
 
-This placeholder reads an uploaded KMZ/KML file and emits a deterministic KML and
-GeoJSON path so the frontend has downloadable artefacts.
+Reads an uploaded KMZ/KML site file and emits a KML and GeoJSON path so the
+frontend has downloadable artefacts. Site polygons are covered with a
+boustrophedon sweep sized from the camera footprint (see
+``coverage_planner``); uploads without polygons follow the first line drawn in
+the file. With ``--targets`` the path instead visits the locations listed in a
+findings spreadsheet, ordered by ``route_optimizer``.
 """
 
 from __future__ import annotations
 
-import json
 import sys
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from coverage_planner import PlanSettings, plan_coverage
+from kml_io import Geometry, load_geometries
+from path_writers import COORD_PRECISION, GZIP_PATHS, prepare_path, write_geojson, write_kml
+from route_optimizer import load_targets, order_targets
 
 EXAMPLE_COORDS = [
     (-97.7431, 30.2672),
     (-97.7425, 30.2675),
     (-97.7419, 30.2678),
 ]
+PATH_NAME = "Generated Flight Path"
+
+
+def select_path(geometries: Sequence[Geometry]) -> np.ndarray:
+    """Pick the ``(N, 2)`` lon/lat coordinates to fly from the parsed site geometries."""
+    for kind in ("LineString", "Polygon"):
+        for geometry in geometries:
+            if geometry.kind == kind and len(geometry.coords) > 1:
+                return geometry.coords
+    return np.array(EXAMPLE_COORDS)
+
+
+def plan_site(geometries: Sequence[Geometry], settings: PlanSettings = PlanSettings()) -> np.ndarray:
+    """Plan coverage of the site polygons, falling back to ``select_path``."""
+    path = plan_coverage(geometries, settings)
+    if len(path) > 1:
+        return path
+    return select_path(geometries)
+
 
+def plan_targets(targets_path: Path, start: Optional[Tuple[float, float]] = None) -> np.ndarray:
+    """Order the re-inspection targets in ``targets_path`` into a short route."""
+    targets = load_targets(targets_path)
+    return targets[order_targets(targets, start)]
 
-def generate_paths(output_dir: Path) -> Dict[str, Path]:
+
+def generate_paths(
+    output_dir: Path,
+    coords: Optional[np.ndarray] = None,
+    tolerance_m: Optional[float] = None,
+    precision: int = COORD_PRECISION,
+    compress: bool = GZIP_PATHS,
+) -> Dict[str, Path]:
+    """Write the ``(N, 2)`` lon/lat path as ``flight_path.kml`` and ``flight_path.geojson``.
+
+    With ``compress`` the result also carries ``kml_gz``/``geojson_gz``.
+    """
     output_dir.mkdir(parents=True, exist_ok=True)
-    kml_path = output_dir / "flight_path.kml"
-    geojson_path = output_dir / "flight_path.geojson"
-
-    kml_content = """<?xml version="1.0" encoding="UTF-8"?>
-<kml xmlns="http://www.opengis.net/kml/2.2">
-  <Document>
-    <name>Generated Flight Path</name>
-    <Placemark>
-      <LineString>
-        <coordinates>
-{coords}
-        </coordinates>
-      </LineString>
-    </Placemark>
-  </Document>
-</kml>
-""".format(
-        coords="
-".join([f"        {lon},{lat},0" for lon, lat in EXAMPLE_COORDS])
-    )
-    kml_path.write_text(kml_content)
-
-    geojson_payload = {
-        "type": "FeatureCollection",
-        "features": [
-            {
-                "type": "Feature",
-                "properties": {"name": "Generated Flight Path"},
-                "geometry": {
-                    "type": "LineString",
-                    "coordinates": [[lon, lat, 0] for lon, lat in EXAMPLE_COORDS],
-                },
-            }
-        ],
-    }
-    geojson_path.write_text(json.dumps(geojson_payload, indent=2))
-
-    return {"kml": kml_path, "geojson": geojson_path}
+    path = prepare_path(EXAMPLE_COORDS if coords is None else coords, tolerance_m)
+    kml = write_kml(output_dir / "flight_path.kml", path, PATH_NAME, precision, compress)
+    geojson = write_geojson(output_dir / "flight_path.geojson", path, PATH_NAME, precision, compress)
+
+    artifacts = {"kml": kml["plain"], "geojson": geojson["plain"]}
+    if compress:
+        artifacts.update(kml_gz=kml["gzip"], geojson_gz=geojson["gzip"])
+    return artifacts
 
 
 def main() -> None:
-    if len(sys.argv) < 3:
+    args = sys.argv[1:]
+    targets_mode = bool(args) and args[0] == "--targets"
+    if targets_mode:
+        args = args[1:]
+    if len(args) < 2:
         print("Usage: python FlightPlanTool.py <kmz_path> <output_dir>", file=sys.stderr)
+        print("       python FlightPlanTool.py --targets <findings.csv|xlsx|parquet> <output_dir> [lon,lat]", file=sys.stderr)
         sys.exit(1)
 
-    _ = Path(sys.argv[1]).expanduser().resolve()
-    output_dir = Path(sys.argv[2]).expanduser().resolve()
-
+    input_path = Path(args[0]).expanduser().resolve()
+    output_dir = Path(args[1]).expanduser().resolve()
     output_dir.mkdir(parents=True, exist_ok=True)
-    artifacts = generate_paths(output_dir)
+
+    if targets_mode:
+        start = tuple(float(part) for part in args[2].split(",")) if len(args) > 2 else None
+        coords = plan_targets(input_path, start)
+        print(f"Ordered {len(coords)} re-inspection targets from {input_path}")
+    else:
+        geometries = load_geometries(input_path)
+        print(f"Parsed {len(geometries)} geometries from {input_path}")
+        settings = PlanSettings()
+        print(f"Sweep line spacing {settings.line_spacing_m:.1f} m at {settings.altitude_m:g} m altitude")
+        coords = plan_site(geometries, settings)
+
+    artifacts = generate_paths(output_dir, coords)
     print(f"Flight path KML created at {artifacts['kml']}")
     print(f"Flight path GeoJSON created at {artifacts['geojson']}")
 
@@ -0,0 +1,88 @@
+"""File responses for job artifacts under ``OUTPUT_ROOT``.
+
+Artifacts are served with Starlette's ``FileResponse``, which handles
+``Range``/``If-Range`` and hands whole files to the server via the ASGI
+``pathsend`` extension where the server supports it (large chunks otherwise).
+ETags are strong and derived from the file's inode, mtime and size, so they
+change whenever an artifact is rewritten. KML and GeoJSON are served from the
+``.gz`` copy written by ``path_writers`` when the client accepts gzip.
+"""
+
+from __future__ import annotations
+
+import mimetypes
+import os
+from pathlib import Path
+from typing import Dict
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+from status_cache import etag_matches
+
+MEDIA_TYPES = {
+    ".geojson": "application/geo+json",
+    ".kml": "application/vnd.google-earth.kml+xml",
+    ".kmz": "application/vnd.google-earth.kmz",
+    ".parquet": "application/vnd.apache.parquet",
+}
+PRECOMPRESSED_SUFFIXES = (".geojson", ".kml")
+
+
+class _ArtifactResponse(FileResponse):
+    chunk_size = 1024 * 1024
+
+
+def resolve_artifact(job_dir: Path, relative: str) -> Path:
+    """Map a URL path inside a job to a file, refusing hidden or escaping paths."""
+    parts = relative.split("/")
+    if any(not part or part.startswith(".") for part in parts):
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    path = job_dir.joinpath(*parts).resolve()
+    if job_dir not in path.parents or not path.is_file():
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return path
+
+
+def strong_etag(stat: os.stat_result) -> str:
+    return f'"{stat.st_ino:x}-{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    qualities: Dict[str, float] = {}
+    for coding in accept_encoding.split(","):
+        name, *params = coding.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+def artifact_response(path: Path, request: Request) -> Response:
+    headers: Dict[str, str] = {"Cache-Control": "private, no-cache"}
+    media_type = MEDIA_TYPES.get(path.suffix.lower()) or mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    served = path
+    stat = path.stat()
+    if path.suffix.lower() in PRECOMPRESSED_SUFFIXES:
+        headers["Vary"] = "Accept-Encoding"
+        if accepts_gzip(request.headers.get("accept-encoding", "")):
+            compressed = path.with_name(path.name + ".gz")
+            try:
+                compressed_stat = compressed.stat()
+            except OSError:
+                compressed_stat = None
+            # The writers replace the plain file first, so an older .gz is stale
+            if compressed_stat is not None and compressed_stat.st_mtime_ns >= stat.st_mtime_ns:
+                served, stat = compressed, compressed_stat
+                headers["Content-Encoding"] = "gzip"
+
+    headers["ETag"] = strong_etag(stat)
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return _ArtifactResponse(served, media_type=media_type, headers=headers, stat_result=stat)
@@ -0,0 +1,154 @@
+"""Boustrophedon (lawnmower) coverage planning for site polygons.
+
+Polygons are projected to a local metric plane around their centroid and
+rotated so that sweep lines run along the x axis. Every polygon edge (exterior
+and holes) is expanded into the sweep lines it crosses with ``np.repeat``, so
+the clipping cost is linear in vertices plus intersections rather than lines
+times edges, and there are no per-point Python loops.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from kml_io import Geometry
+
+EARTH_RADIUS_M = 6371008.8
+
+
+class PlanSettings(NamedTuple):
+    altitude_m: float = float(os.getenv("FLIGHT_ALTITUDE_M", "40"))
+    hfov_deg: float = float(os.getenv("CAMERA_HFOV_DEG", "45"))
+    side_overlap: float = float(os.getenv("SIDE_OVERLAP", "0.3"))
+    # Sweep direction in degrees counter-clockwise from east; None follows the longest boundary edge
+    sweep_angle_deg: Optional[float] = None
+
+    @property
+    def line_spacing_m(self) -> float:
+        footprint = 2 * self.altitude_m * math.tan(math.radians(self.hfov_deg) / 2)
+        return footprint * (1 - self.side_overlap)
+
+
+class LocalFrame:
+    """Equirectangular projection around a reference point, in metres."""
+
+    def __init__(self, lon0: float, lat0: float) -> None:
+        self.lon0 = lon0
+        self.lat0 = lat0
+        self.kx = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(lat0))
+        self.ky = math.radians(1) * EARTH_RADIUS_M
+
+    def to_xy(self, lonlat: np.ndarray) -> np.ndarray:
+        return np.column_stack(((lonlat[:, 0] - self.lon0) * self.kx, (lonlat[:, 1] - self.lat0) * self.ky))
+
+    def to_lonlat(self, xy: np.ndarray) -> np.ndarray:
+        return np.column_stack((xy[:, 0] / self.kx + self.lon0, xy[:, 1] / self.ky + self.lat0))
+
+
+def _rotation(angle_rad: float) -> np.ndarray:
+    c, s = math.cos(angle_rad), math.sin(angle_rad)
+    return np.array([[c, -s], [s, c]])
+
+
+def _longest_edge_angle(ring: np.ndarray) -> float:
+    deltas = np.diff(ring, axis=0)
+    longest = np.argmax(np.hypot(deltas[:, 0], deltas[:, 1]))
+    return math.atan2(deltas[longest, 1], deltas[longest, 0])
+
+
+def _ring_edges(rings: Sequence[np.ndarray]) -> np.ndarray:
+    """Stack the edges of closed rings as an ``(E, 4)`` array of x1, y1, x2, y2."""
+    edges = []
+    for ring in rings:
+        if len(ring) < 3:
+            continue
+        closed = ring if np.array_equal(ring[0], ring[-1]) else np.vstack((ring, ring[:1]))
+        edges.append(np.hstack((closed[:-1], closed[1:])))
+    return np.vstack(edges) if edges else np.empty((0, 4))
+
+
+def sweep_segments(rings: Sequence[np.ndarray], spacing: float) -> np.ndarray:
+    """Clip horizontal sweep lines against rings (even-odd rule).
+
+    Returns an ``(S, 3)`` array of ``(y, x_start, x_end)`` sorted by line then x.
+    """
+    edges = _ring_edges(rings)
+    if not len(edges) or spacing <= 0:
+        return np.empty((0, 3))
+    x1, y1, x2, y2 = edges.T
+    y_lo = np.minimum(y1, y2)
+    y_hi = np.maximum(y1, y2)
+    origin = y_lo.min() + spacing / 2
+
+    # Half-open [y_lo, y_hi) so a vertex shared by two edges is counted once
+    first = np.ceil((y_lo - origin) / spacing).astype(np.int64)
+    stop = np.ceil((y_hi - origin) / spacing).astype(np.int64)
+    counts = np.maximum(stop - first, 0)
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty((0, 3))
+
+    edge_index = np.repeat(np.arange(len(edges)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    line = first[edge_index] + offsets
+    y = origin + line * spacing
+    ex1, ey1, ex2, ey2 = x1[edge_index], y1[edge_index], x2[edge_index], y2[edge_index]
+    x = ex1 + (y - ey1) * (ex2 - ex1) / (ey2 - ey1)
+
+    order = np.lexsort((x, line))
+    line, x = line[order], x[order]
+    # Each line crosses the boundary an even number of times; pair them up
+    return np.column_stack((origin + line[0::2] * spacing, x[0::2], x[1::2]))
+
+
+def boustrophedon(segments: np.ndarray) -> np.ndarray:
+    """Order sweep segments into a lawnmower path, alternating direction per line."""
+    if not len(segments):
+        return np.empty((0, 2))
+    y = segments[:, 0]
+    lines, line_number = np.unique(y, return_inverse=True)
+    reverse = (line_number % 2) == 1
+    # Within a reversed line, visit segments right to left and swap their ends
+    order = np.lexsort((np.where(reverse, -segments[:, 1], segments[:, 1]), line_number))
+    seg = segments[order]
+    rev = reverse[order]
+    start_x = np.where(rev, seg[:, 2], seg[:, 1])
+    end_x = np.where(rev, seg[:, 1], seg[:, 2])
+    points = np.empty((len(seg) * 2, 2))
+    points[0::2, 0] = start_x
+    points[1::2, 0] = end_x
+    points[0::2, 1] = seg[:, 0]
+    points[1::2, 1] = seg[:, 0]
+    return points
+
+
+def plan_polygon(polygon: Geometry, settings: PlanSettings = PlanSettings()) -> np.ndarray:
+    """Plan a coverage path for one polygon; returns ``(N, 2)`` lon/lat waypoints."""
+    exterior = polygon.coords
+    frame = LocalFrame(float(exterior[:, 0].mean()), float(exterior[:, 1].mean()))
+    rings = [frame.to_xy(exterior)] + [frame.to_xy(hole) for hole in polygon.holes]
+
+    if settings.sweep_angle_deg is None:
+        angle = _longest_edge_angle(rings[0])
+    else:
+        angle = math.radians(settings.sweep_angle_deg)
+    to_sweep = _rotation(-angle)
+    rotated = [ring @ to_sweep.T for ring in rings]
+
+    path = boustrophedon(sweep_segments(rotated, settings.line_spacing_m))
+    if not len(path):
+        return np.empty((0, 2))
+    return frame.to_lonlat(path @ _rotation(angle).T)
+
+
+def plan_coverage(geometries: Sequence[Geometry], settings: PlanSettings = PlanSettings()) -> np.ndarray:
+    """Plan every polygon in ``geometries`` and join the paths in document order."""
+    paths: List[np.ndarray] = [
+        plan_polygon(geometry, settings) for geometry in geometries if geometry.kind == "Polygon"
+    ]
+    paths = [path for path in paths if len(path)]
+    return np.vstack(paths) if paths else np.empty((0, 2))
@@ -0,0 +1,318 @@
+"""Postgres access for the Python service.
+
+The tables are owned by the web app (see ``shared/schema.ts``); this module
+only holds the queries the processing service needs. Connections come from a
+thread-safe pool sized by ``DB_POOL_MIN``/``DB_POOL_MAX``; callers wait up to
+``DB_POOL_TIMEOUT`` seconds for a free connection instead of failing, and a
+connection that has sat idle longer than ``DB_HEALTHCHECK_SECONDS`` is probed
+before it is handed out. Each ``transaction()`` block runs on one connection
+and commits (or rolls back) once.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import os
+import select
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    raise RuntimeError("DATABASE_URL environment variable must be set for the Python service")
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_HEALTHCHECK_SECONDS = float(os.getenv("DB_HEALTHCHECK_SECONDS", "30"))
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """``ThreadedConnectionPool`` that blocks when exhausted and drops dead connections."""
+
+    def __init__(self, dsn: str, minconn: int, maxconn: int) -> None:
+        self._pool = ThreadedConnectionPool(minconn, maxconn, dsn, cursor_factory=RealDictCursor)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self.maxconn = maxconn
+        self.in_use = 0
+
+    def getconn(self, timeout: float = DB_POOL_TIMEOUT):
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolError(f"No database connection available within {timeout:g}s")
+        try:
+            conn = self._pool.getconn()
+            # Every idle connection may have gone stale together (e.g. a DB restart)
+            for _ in range(self.maxconn):
+                if self._healthy(conn):
+                    break
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+        return conn
+
+    def putconn(self, conn, broken: bool = False) -> None:
+        self._last_used[id(conn)] = time.monotonic()
+        try:
+            self._pool.putconn(conn, close=broken or bool(conn.closed))
+        finally:
+            if broken or conn.closed:
+                self._last_used.pop(id(conn), None)
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def _healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        idle_since = self._last_used.get(id(conn))
+        if idle_since is not None and time.monotonic() - idle_since < DB_HEALTHCHECK_SECONDS:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def close(self) -> None:
+        self._pool.closeall()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DATABASE_URL, DB_POOL_MIN, DB_POOL_MAX)
+    return _pool
+
+
+def pool_usage() -> Tuple[int, int]:
+    """Connections checked out and the pool size, without opening the pool."""
+    pool = _pool
+    if pool is None:
+        return 0, DB_POOL_MAX
+    return pool.in_use, pool.maxconn
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+@contextlib.contextmanager
+def transaction() -> Iterator[RealDictCursor]:
+    """Yield a cursor on a pooled connection; commit on success, roll back on error."""
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        with conn, conn.cursor() as cur:
+            yield cur
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        pool.putconn(conn, broken=broken)
+
+
+def create_job(job_id: str, pilot_id: str, location: str, status: str = "queued") -> None:
+    with transaction() as cur:
+        cur.execute(
+            "INSERT INTO jobs (job_id, pilot_id, location, status) VALUES (%s, %s, %s, %s)",
+            (job_id, pilot_id, location, status),
+        )
+
+
+def set_job_status(job_id: str, status: str) -> None:
+    with transaction() as cur:
+        cur.execute("UPDATE jobs SET status = %s WHERE job_id = %s", (status, job_id))
+
+
+def complete_job(job_id: str, anomalies_found: int, excel_url: str, pdf_url: str) -> None:
+    """Store the job's results and mark it completed in one transaction."""
+    with transaction() as cur:
+        cur.execute("UPDATE jobs SET status = %s WHERE job_id = %s", ("completed", job_id))
+        cur.execute(
+            "INSERT INTO results (job_id, anomalies_found, excel_url, pdf_url) VALUES (%s, %s, %s, %s) "
+            "ON CONFLICT (job_id) DO UPDATE SET anomalies_found = EXCLUDED.anomalies_found, "
+            "excel_url = EXCLUDED.excel_url, pdf_url = EXCLUDED.pdf_url",
+            (job_id, anomalies_found, excel_url, pdf_url),
+        )
+
+
+def unfinished_jobs() -> List[Dict[str, str]]:
+    """Jobs left queued or mid-processing, oldest first (e.g. after a restart)."""
+    with transaction() as cur:
+        cur.execute(
+            "SELECT job_id, pilot_id FROM jobs WHERE status IN ('queued', 'processing') ORDER BY created_at"
+        )
+        return cur.fetchall()
+
+
+def job_exists(job_id: str) -> bool:
+    with transaction() as cur:
+        cur.execute("SELECT 1 FROM jobs WHERE job_id = %s", (job_id,))
+        return cur.fetchone() is not None
+
+
+def fetch_job(job_id: str) -> Optional[Dict[str, object]]:
+    """Return ``{"job": ..., "result": ...}`` for a job, or None if it does not exist."""
+    with transaction() as cur:
+        cur.execute(
+            "SELECT j.job_id, j.pilot_id, j.location, j.status, j.created_at, "
+            "r.job_id AS result_job_id, r.anomalies_found, r.excel_url, r.pdf_url "
+            "FROM jobs j LEFT JOIN results r ON r.job_id = j.job_id WHERE j.job_id = %s",
+            (job_id,),
+        )
+        row = cur.fetchone()
+    if not row:
+        return None
+    job = {key: row[key] for key in ("job_id", "pilot_id", "location", "status", "created_at")}
+    result = None
+    if row["result_job_id"] is not None:
+        result = {key: row[key] for key in ("anomalies_found", "excel_url", "pdf_url")}
+    return {"job": job, "result": result}
+
+
+def save_flight_path(job_id: str, kmz_url: str, kml_url: str, geojson_url: str) -> None:
+    with transaction() as cur:
+        cur.execute(
+            "INSERT INTO flight_paths (job_id, kmz_file_url, generated_path_url, geojson_url) VALUES (%s, %s, %s, %s)",
+            (job_id, kmz_url, kml_url, geojson_url),
+        )
+
+
+def record_storage(
+    job_id: str, upload_bytes: int, intermediate_bytes: int, final_bytes: int, retention: Optional[str] = None
+) -> None:
+    """Upsert a job's row in the disk-usage index; ``retention`` is kept unless given."""
+    with transaction() as cur:
+        cur.execute(
+            "INSERT INTO job_storage (job_id, upload_bytes, intermediate_bytes, final_bytes, retention, updated_at) "
+            "SELECT job_id, %s, %s, %s, COALESCE(%s, 'full'), now() FROM jobs WHERE job_id = %s "
+            "ON CONFLICT (job_id) DO UPDATE SET upload_bytes = EXCLUDED.upload_bytes, "
+            "intermediate_bytes = EXCLUDED.intermediate_bytes, final_bytes = EXCLUDED.final_bytes, "
+            "retention = COALESCE(%s, job_storage.retention), updated_at = now()",
+            (upload_bytes, intermediate_bytes, final_bytes, retention, job_id, retention),
+        )
+
+
+def unindexed_jobs() -> List[str]:
+    """Jobs that have no row in the disk-usage index yet."""
+    with transaction() as cur:
+        cur.execute(
+            "SELECT j.job_id FROM jobs j LEFT JOIN job_storage s ON s.job_id = j.job_id "
+            "WHERE s.job_id IS NULL ORDER BY j.created_at"
+        )
+        return [row["job_id"] for row in cur.fetchall()]
+
+
+def retention_candidates() -> List[Dict[str, object]]:
+    """Index rows of finished jobs whose files still exist, oldest first."""
+    with transaction() as cur:
+        cur.execute(
+            "SELECT s.job_id, s.upload_bytes, s.intermediate_bytes, s.final_bytes, s.retention, "
+            "EXTRACT(EPOCH FROM now() - j.created_at) AS age_seconds "
+            "FROM job_storage s JOIN jobs j ON j.job_id = s.job_id "
+            "WHERE j.status IN ('completed', 'failed') AND s.retention <> 'deleted' ORDER BY j.created_at"
+        )
+        return cur.fetchall()
+
+
+def storage_usage(pilot_id: Optional[str] = None) -> Dict[str, int]:
+    """Indexed bytes per category over all jobs, or one pilot's jobs."""
+    query = (
+        "SELECT count(*) AS jobs, COALESCE(sum(s.upload_bytes), 0) AS upload_bytes, "
+        "COALESCE(sum(s.intermediate_bytes), 0) AS intermediate_bytes, "
+        "COALESCE(sum(s.final_bytes), 0) AS final_bytes "
+        "FROM job_storage s JOIN jobs j ON j.job_id = s.job_id WHERE s.retention <> 'deleted'"
+    )
+    params: Tuple[str, ...] = ()
+    if pilot_id is not None:
+        query += " AND j.pilot_id = %s"
+        params = (pilot_id,)
+    with transaction() as cur:
+        cur.execute(query, params)
+        row = cur.fetchone()
+    return {key: int(value) for key, value in row.items()}
+
+
+def job_storage(job_id: str) -> Optional[Dict[str, object]]:
+    with transaction() as cur:
+        cur.execute(
+            "SELECT job_id, upload_bytes, intermediate_bytes, final_bytes, retention, updated_at "
+            "FROM job_storage WHERE job_id = %s",
+            (job_id,),
+        )
+        return cur.fetchone()
+
+
+@contextlib.contextmanager
+def advisory_lock(key: int) -> Iterator[bool]:
+    """Try to take a Postgres advisory lock for the duration of the block.
+
+    Yields whether it was acquired; the lock is held by an open transaction
+    on a pooled connection, so it is released even if the process dies.
+    """
+    with transaction() as cur:
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s) AS acquired", (key,))
+        yield cur.fetchone()["acquired"]
+
+
+def notify(channel: str, payload: str) -> None:
+    with transaction() as cur:
+        cur.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+
+
+def listen(channel: str, handle: Callable[[str], None], stop: threading.Event, retry_seconds: float = 5.0) -> None:
+    """Pass each NOTIFY payload on ``channel`` to ``handle`` until ``stop`` is set.
+
+    Uses a dedicated connection outside the pool (it is held for as long as
+    the listener runs) and reconnects after errors. A payload ``handle``
+    fails on is logged and skipped.
+    """
+    while not stop.is_set():
+        conn = None
+        try:
+            conn = psycopg2.connect(DATABASE_URL)
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+            while not stop.is_set():
+                if select.select([conn], [], [], 1.0)[0]:
+                    conn.poll()
+                    while conn.notifies:
+                        payload = conn.notifies.pop(0).payload
+                        try:
+                            handle(payload)
+                        except Exception:
+                            logger.exception("Handler for %s failed on %.200r", channel, payload)
+        except psycopg2.Error:
+            stop.wait(retry_seconds)
+        finally:
+            if conn is not None:
+                conn.close()
@@ -0,0 +1,177 @@
+"""Content-hash deduplication for uploaded drone files.
+
+Uploads are hashed while they are streamed to disk and the digests are written
+to ``uploads.json`` in the job directory, so processing can recognise repeated
+images without reading them again. When ``DEDUPE_STORE`` points at a directory
+on the same volume as the job outputs, identical files are also shared across
+jobs (hardlinked from a content-addressed store) and their hotspot analysis is
+cached next to them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Set, Tuple
+
+from shared_usage import adjust_shared, unlinked_size
+
+CHUNK_BYTES = 1024 * 1024
+UPLOAD_INDEX_NAME = "uploads.json"
+STORE_DIR = Path(os.environ["DEDUPE_STORE"]) if os.getenv("DEDUPE_STORE") else None
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_and_hash(source: BinaryIO, destination: Path) -> Tuple[str, int]:
+    """Stream ``source`` into ``destination``, returning its sha256 and size."""
+    digest = hashlib.sha256()
+    size = 0
+    with destination.open("wb") as buffer:
+        for chunk in iter(lambda: source.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+            buffer.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def _object_path(store: Path, digest: str) -> Path:
+    return store / digest[:2] / digest
+
+
+def share_with_store(path: Path, digest: str, store: Optional[Path] = STORE_DIR) -> bool:
+    """Make ``path`` share storage with the store's copy of ``digest``.
+
+    Returns True when the content was already in the store (``path`` is then
+    replaced by a hardlink to it) and False when ``path`` became the stored
+    copy. Does nothing and returns False when no store is configured or the
+    store is on another filesystem.
+    """
+    if store is None:
+        return False
+    obj = _object_path(store, digest)
+    try:
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        if obj.exists():
+            # A copy no job linked to any more was counted as shared until now
+            orphaned = unlinked_size(obj)
+            tmp = path.with_name(f".{path.name}.link")
+            os.link(obj, tmp)
+            os.replace(tmp, path)
+            adjust_shared(-orphaned)
+            return True
+        os.link(path, obj)
+    except FileExistsError:
+        return share_with_store(path, digest, store)
+    except OSError:
+        pass
+    return False
+
+
+def release_from_store(digest: str, store: Optional[Path] = STORE_DIR) -> bool:
+    """Delete the store's copy of ``digest`` once no job links to it.
+
+    Returns True when the file was removed. The cached analysis is kept, so a
+    later upload of the same image still skips hotspot detection.
+    """
+    if store is None:
+        return False
+    obj = _object_path(store, digest)
+    try:
+        if obj.stat().st_nlink > 1:
+            return False
+        # The job that just let go was counting it, so shared usage is unchanged
+        obj.unlink()
+    except OSError:
+        return False
+    return True
+
+
+def cached_analysis(digest: str, store: Optional[Path] = STORE_DIR) -> Optional[Dict[str, object]]:
+    if store is None:
+        return None
+    try:
+        return json.loads(_object_path(store, digest).with_suffix(".analysis.json").read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def store_analysis(digest: str, result: Dict[str, object], store: Optional[Path] = STORE_DIR) -> None:
+    if store is None:
+        return
+    target = _object_path(store, digest).with_suffix(".analysis.json")
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{os.getpid()}")
+        tmp.write_text(json.dumps(result))
+        replaced = unlinked_size(target)
+        os.replace(tmp, target)
+        adjust_shared(target.stat().st_size - replaced)
+    except OSError:
+        pass
+
+
+def write_upload_index(job_dir: Path, digests: Dict[str, str]) -> Path:
+    path = job_dir / UPLOAD_INDEX_NAME
+    path.write_text(json.dumps(digests, indent=2))
+    return path
+
+
+def load_upload_index(job_dir: Path) -> Dict[str, str]:
+    try:
+        return json.loads((job_dir / UPLOAD_INDEX_NAME).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+class ContentIndex:
+    """Detects files whose content has already been seen.
+
+    Digests are taken from the upload index when available. Other files are
+    only hashed once a second file of the same size turns up, so a walk over
+    unique images costs no extra reads.
+    """
+
+    def __init__(self, known: Optional[Dict[str, str]] = None) -> None:
+        self._known = known or {}
+        self._by_digest: Dict[str, Path] = {}
+        self._digests: Dict[Path, str] = {}
+        self._sizes: Set[int] = set()
+        self._deferred: Dict[int, Path] = {}
+
+    def digest(self, path: Path) -> str:
+        if path not in self._digests:
+            self._digests[path] = hash_file(path)
+        return self._digests[path]
+
+    def known_digest(self, path: Path) -> Optional[str]:
+        return self._digests.get(path)
+
+    def register(self, path: Path, size: int, key: Optional[str] = None) -> Optional[Path]:
+        """Record ``path`` and return the earlier file with the same content, if any."""
+        if key in self._known:
+            self._digests[path] = self._known[key]
+        if size not in self._sizes:
+            self._sizes.add(size)
+            if path not in self._digests:
+                self._deferred[size] = path
+                return None
+
+        earlier = self._deferred.pop(size, None)
+        if earlier is not None:
+            self._by_digest.setdefault(self.digest(earlier), earlier)
+
+        digest = self.digest(path)
+        original = self._by_digest.get(digest)
+        if original is not None:
+            return original
+        self._by_digest[digest] = path
+        return None
@@ -0,0 +1,131 @@
+"""In-process job engine for the API service.
+
+Runs the processing stages as library calls on a shared worker pool instead of
+spawning ``Drone_Data_Process.py`` / ``ClaudeMain1_fixed.py`` /
+``FlightPlanTool.py`` per job, so interpreter start-up and the pandas/reportlab
+imports are paid once and the records DataFrame is handed to the report stage
+in memory. The CLI scripts remain available as thin wrappers over the same
+functions.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional, TypeVar
+
+from ClaudeMain1_fixed import GALLERY_ENABLED, render_report
+from Drone_Data_Process import build_outputs, save_outputs
+import flight_cache
+from coverage_planner import PlanSettings
+from dedupe import hash_file
+from FlightPlanTool import generate_paths, plan_site
+from kml_io import load_geometries
+from metrics import BYTES_WRITTEN, STAGE_SECONDS
+from path_writers import COORD_PRECISION, GZIP_PATHS, SIMPLIFY_TOLERANCE_M
+
+RECORDS_NAME = "Report_Input.parquet"
+EXCEL_NAME = "Report_Input.xlsx"
+METADATA_NAME = "Report_Input.json"
+PDF_NAME = "Final_Report.pdf"
+
+ENGINE_WORKERS = int(os.getenv("ENGINE_WORKERS", "2"))
+
+T = TypeVar("T")
+
+_executor = ThreadPoolExecutor(max_workers=ENGINE_WORKERS, thread_name_prefix="engine")
+_busy = 0
+
+
+def busy_workers() -> int:
+    return _busy
+
+
+def _record_written(kind: str, path: Path) -> None:
+    try:
+        BYTES_WRITTEN.inc(path.stat().st_size, kind)
+    except OSError:
+        pass
+
+
+def _stage_progress(
+    report: Optional[Callable[[str, Dict[str, int]], None]], stage: str
+) -> Optional[Callable[[Dict[str, int]], None]]:
+    if report is None:
+        return None
+    report(stage, {})
+    return functools.partial(report, stage)
+
+
+def run_job(job_dir: Path, report: Optional[Callable[[str, Dict[str, int]], None]] = None) -> Dict[str, object]:
+    """Process the uploads in ``job_dir`` and build its report.
+
+    Writes the records artifact, the JSON summary and the PDF into
+    ``job_dir`` and returns the summary alongside the artifact paths.
+    ``report(stage, counters)`` is called as each stage starts and makes
+    progress.
+    """
+    records_path = job_dir / RECORDS_NAME
+    metadata_path = job_dir / METADATA_NAME
+    pdf_path = job_dir / PDF_NAME
+
+    with STAGE_SECONDS.time("processing"):
+        df, summary = build_outputs(job_dir, _stage_progress(report, "processing"))
+    with STAGE_SECONDS.time("report"):
+        progress = _stage_progress(report, "report")
+        save_outputs(df, summary, records_path, metadata_path)
+        gallery_dir = job_dir / "annotated" if GALLERY_ENABLED else None
+        render_report(df, summary, pdf_path, gallery_dir, progress)
+    _record_written("records", records_path)
+    _record_written("metadata", metadata_path)
+    _record_written("report", pdf_path)
+
+    return {
+        "summary": summary,
+        "records_path": records_path,
+        "metadata_path": metadata_path,
+        "pdf_path": pdf_path,
+    }
+
+
+def generate_flight_paths(
+    kmz_path: Path, output_dir: Path, settings: PlanSettings = PlanSettings(), digest: Optional[str] = None
+) -> Dict[str, Path]:
+    """Build the flight path artifacts for an uploaded KMZ into ``output_dir``.
+
+    Repeat uploads of the same site with the same settings are served from
+    ``flight_cache``; ``digest`` is the KMZ's sha256 when the caller already
+    has it.
+    """
+    with STAGE_SECONDS.time("flight_path"):
+        options = {
+            **settings._asdict(),
+            "precision": COORD_PRECISION,
+            "tolerance_m": SIMPLIFY_TOLERANCE_M,
+            "gzip": GZIP_PATHS,
+        }
+        key = flight_cache.cache_key(digest or hash_file(kmz_path), options)
+        cached = flight_cache.lookup(key, output_dir)
+        if cached is not None:
+            return cached
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        artifacts = generate_paths(output_dir, plan_site(load_geometries(kmz_path), settings))
+        flight_cache.store(key, artifacts)
+    for path in artifacts.values():
+        _record_written("flight_path", path)
+    return artifacts
+
+
+async def run_in_engine(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking engine call on the worker pool without blocking the event loop."""
+    global _busy
+    loop = asyncio.get_running_loop()
+    _busy += 1
+    try:
+        return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+    finally:
+        _busy -= 1
@@ -0,0 +1,127 @@
+"""Content-addressed cache for generated flight path artifacts.
+
+Entries are keyed on the site file's sha256 plus everything that shapes the
+output (planning settings and writer options). A hit hardlinks the stored
+KML/GeoJSON into the job's ``flight_paths/`` directory without reading the
+KMZ at all. Entries are touched on use and the least recently used ones are
+evicted once the cache grows past ``FLIGHT_CACHE_MAX_BYTES``. Every change to
+what the cache alone holds is reported to ``shared_usage``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+from shared_usage import adjust_shared, unlinked_size
+
+CACHE_DIR = Path(os.getenv("FLIGHT_CACHE_DIR", str(Path(os.getenv("OUTPUT_ROOT", "/app/outputs")) / ".flight_cache")))
+CACHE_MAX_BYTES = int(os.getenv("FLIGHT_CACHE_MAX_BYTES", str(1024 ** 3)))
+CACHE_ENABLED = os.getenv("FLIGHT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ENTRY_MANIFEST = "artifacts.json"
+# Bump when the planner or writers change what a given input produces
+CACHE_VERSION = 1
+
+_evict_lock = threading.Lock()
+
+
+def cache_key(digest: str, options: Dict[str, object]) -> str:
+    payload = json.dumps({"version": CACHE_VERSION, "digest": digest, "options": options}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _link(source: Path, target: Path) -> None:
+    tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+    try:
+        os.link(source, tmp)
+    except OSError:
+        # Cache on another filesystem: fall back to a copy
+        shutil.copyfile(source, tmp)
+    os.replace(tmp, target)
+
+
+def lookup(key: str, output_dir: Path, cache_dir: Path = CACHE_DIR) -> Optional[Dict[str, Path]]:
+    """Link a cached entry's artifacts into ``output_dir``; None on a miss."""
+    if not CACHE_ENABLED:
+        return None
+    entry = cache_dir / key
+    claimed = 0
+    try:
+        names: Dict[str, str] = json.loads((entry / ENTRY_MANIFEST).read_text())
+        output_dir.mkdir(parents=True, exist_ok=True)
+        artifacts = {}
+        for kind, name in names.items():
+            held = unlinked_size(entry / name)
+            _link(entry / name, output_dir / name)
+            # Now linked into a job, which counts it from here on
+            claimed += held - unlinked_size(entry / name)
+            artifacts[kind] = output_dir / name
+        os.utime(entry)
+    except (OSError, ValueError):
+        return None
+    finally:
+        adjust_shared(-claimed)
+    return artifacts
+
+
+def store(key: str, artifacts: Dict[str, Path], cache_dir: Path = CACHE_DIR) -> None:
+    """Add freshly generated artifacts to the cache and evict old entries."""
+    if not CACHE_ENABLED:
+        return
+    entry = cache_dir / key
+    staging = cache_dir / f".{key}.{uuid.uuid4().hex}"
+    try:
+        staging.mkdir(parents=True)
+        for path in artifacts.values():
+            _link(path, staging / path.name)
+        (staging / ENTRY_MANIFEST).write_text(json.dumps({kind: path.name for kind, path in artifacts.items()}))
+        os.rename(staging, entry)
+    except OSError:
+        # Another worker stored the same entry first, or the cache is unwritable
+        shutil.rmtree(staging, ignore_errors=True)
+        return
+    adjust_shared(_held_size(entry))
+    evict(cache_dir)
+
+
+def _entry_size(entry: Path) -> int:
+    return sum(child.stat().st_size for child in entry.iterdir())
+
+
+def _held_size(entry: Path) -> int:
+    """Bytes of an entry that no job links to."""
+    try:
+        return sum(unlinked_size(child) for child in entry.iterdir())
+    except OSError:
+        return 0
+
+
+def evict(cache_dir: Path = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES) -> None:
+    """Remove least recently used entries until the cache fits in ``max_bytes``."""
+    with _evict_lock:
+        entries = []
+        total = 0
+        with os.scandir(cache_dir) as scan:
+            for item in scan:
+                if item.name.startswith(".") or not item.is_dir():
+                    continue
+                try:
+                    size = _entry_size(Path(item.path))
+                    entries.append((item.stat().st_mtime, size, Path(item.path)))
+                except OSError:
+                    continue
+                total += size
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= max_bytes:
+                break
+            held = _held_size(entry)
+            shutil.rmtree(entry, ignore_errors=True)
+            adjust_shared(-held)
+            total -= size
@@ -0,0 +1,185 @@
+"""Pixel-based hotspot detection for thermal frames.
+
+Frames are decoded to single-channel intensity (the uploaded JPEG/TIFF palette
+images carry no radiometric data, so intensity stands in for temperature),
+resized to a common analysis grid and stacked so that statistics and the
+neighbourhood-relative threshold are computed for a whole batch at once.
+"""
+
+from __future__ import annotations
+
+import os
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import process_pool
+
+ANALYSIS_SIZE = (320, 256)  # (width, height) every frame is resampled to
+NEIGHBORHOOD = int(os.getenv("HOTSPOT_NEIGHBORHOOD", "31"))
+RELATIVE_DELTA = float(os.getenv("HOTSPOT_RELATIVE_DELTA", "0.25"))
+MIN_DELTA = float(os.getenv("HOTSPOT_MIN_DELTA", "20"))
+MIN_AREA = int(os.getenv("HOTSPOT_MIN_AREA", "4"))
+BATCH_SIZE = int(os.getenv("HOTSPOT_BATCH_SIZE", "32"))
+
+T = TypeVar("T")
+
+EMPTY_RESULT = {
+    "decoded": False,
+    "mean_intensity": None,
+    "max_intensity": None,
+    "max_delta": 0.0,
+    "hotspot_count": 0,
+    "hotspot_bbox": "",
+}
+
+
+def load_frame(path: Path) -> Optional[Tuple[np.ndarray, Tuple[int, int]]]:
+    """Decode ``path`` to an analysis-sized uint8 frame plus its original size."""
+    try:
+        with Image.open(path) as img:
+            original_size = img.size
+            # Let the JPEG decoder downscale by a power of two instead of
+            # decoding full resolution and throwing most of it away.
+            img.draft("L", ANALYSIS_SIZE)
+            frame = img.convert("L").resize(ANALYSIS_SIZE, Image.BILINEAR)
+            return np.asarray(frame, dtype=np.uint8), original_size
+    except Exception:
+        return None
+
+
+def neighborhood_mean(frames: np.ndarray, size: int = NEIGHBORHOOD) -> np.ndarray:
+    """Box-filter mean of each frame in an ``(N, H, W)`` stack via integral images."""
+    radius = size // 2
+    padded = np.pad(frames.astype(np.float64), ((0, 0), (radius + 1, radius), (radius + 1, radius)), mode="edge")
+    padded[:, 0, :] = 0
+    padded[:, :, 0] = 0
+    integral = padded.cumsum(axis=1).cumsum(axis=2)
+    window = 2 * radius + 1
+    total = (
+        integral[:, window:, window:]
+        - integral[:, :-window, window:]
+        - integral[:, window:, :-window]
+        + integral[:, :-window, :-window]
+    )
+    return total / (window * window)
+
+
+def analyze_frames(frames: np.ndarray) -> List[Dict[str, object]]:
+    """Compute statistics and hotspots for an ``(N, H, W)`` uint8 stack.
+
+    A pixel is hot when it exceeds its neighbourhood mean by at least
+    ``RELATIVE_DELTA`` of that mean and by ``MIN_DELTA`` intensity levels.
+    Hot pixels are grouped into blobs; blobs smaller than ``MIN_AREA`` are
+    treated as noise. The reported bbox is that of the blob with the largest
+    delta, in analysis-grid coordinates.
+    """
+    data = frames.astype(np.float32)
+    means = data.mean(axis=(1, 2))
+    maxima = data.max(axis=(1, 2))
+
+    local = neighborhood_mean(frames).astype(np.float32)
+    delta = data - local
+    hot = (delta >= np.maximum(RELATIVE_DELTA * local, MIN_DELTA)).astype(np.uint8)
+    has_hot = hot.any(axis=(1, 2))
+
+    results: List[Dict[str, object]] = []
+    for index in range(frames.shape[0]):
+        count = 0
+        best_delta = 0.0
+        bbox = ""
+        if has_hot[index]:
+            n_labels, labels, stats, _ = cv2.connectedComponentsWithStats(hot[index], connectivity=8)
+            keep = [label for label in range(1, n_labels) if stats[label, cv2.CC_STAT_AREA] >= MIN_AREA]
+            count = len(keep)
+            if keep:
+                mask = hot[index].astype(bool)
+                label_delta = np.zeros(n_labels, dtype=np.float32)
+                np.maximum.at(label_delta, labels[mask], delta[index][mask])
+                best = max(keep, key=lambda label: label_delta[label])
+                best_delta = float(label_delta[best])
+                x, y, w, h = (int(v) for v in stats[best, :4])
+                bbox = (x, y, x + w, y + h)
+        results.append({
+            "decoded": True,
+            "mean_intensity": round(float(means[index]), 2),
+            "max_intensity": int(maxima[index]),
+            "max_delta": round(best_delta, 2),
+            "hotspot_count": count,
+            "hotspot_bbox": bbox,
+        })
+    return results
+
+
+def analyze_batch(paths: Sequence[Path]) -> List[Dict[str, object]]:
+    """Decode and analyze a batch of image files; undecodable files get EMPTY_RESULT."""
+    loaded = [load_frame(path) for path in paths]
+    valid = [item for item in loaded if item is not None]
+    analyzed = iter(analyze_frames(np.stack([frame for frame, _ in valid]))) if valid else iter(())
+
+    results: List[Dict[str, object]] = []
+    for item in loaded:
+        if item is None:
+            results.append(dict(EMPTY_RESULT))
+            continue
+        result = next(analyzed)
+        if result["hotspot_bbox"]:
+            _, (width, height) = item
+            sx, sy = width / ANALYSIS_SIZE[0], height / ANALYSIS_SIZE[1]
+            x0, y0, x1, y1 = result["hotspot_bbox"]
+            result["hotspot_bbox"] = f"{int(x0 * sx)},{int(y0 * sy)},{int(x1 * sx)},{int(y1 * sy)}"
+        results.append(result)
+    return results
+
+
+def analyze_stream(
+    items: Iterable[Tuple[Optional[Path], T]],
+    batch_size: int = BATCH_SIZE,
+) -> Iterator[Tuple[T, Optional[Dict[str, object]]]]:
+    """Analyze a stream of ``(path, payload)`` pairs on the shared process pool.
+
+    Paths are grouped into batches of ``batch_size`` and submitted while the
+    input is still being produced, so decoding overlaps with whatever yields
+    the items (e.g. a directory walk). Items whose path is ``None`` are passed
+    straight through with a ``None`` result. Batches come back in submission
+    order; pass-through items may overtake them.
+    """
+    parallel = process_pool.parallel()
+    pending: Deque[Tuple[List[Tuple[Path, T]], Optional[Future]]] = deque()
+    batch: List[Tuple[Path, T]] = []
+
+    def submit() -> None:
+        future = process_pool.submit(analyze_batch, [path for path, _ in batch]) if parallel else None
+        pending.append((list(batch), future))
+        batch.clear()
+
+    def drain() -> Iterator[Tuple[T, Dict[str, object]]]:
+        items_in_batch, future = pending.popleft()
+        results = future.result() if future else analyze_batch([path for path, _ in items_in_batch])
+        for (_, payload), result in zip(items_in_batch, results):
+            yield payload, result
+
+    try:
+        for path, payload in items:
+            if path is None:
+                yield payload, None
+                continue
+            batch.append((path, payload))
+            if len(batch) >= batch_size:
+                submit()
+            while pending and (pending[0][1] is None or pending[0][1].done()):
+                yield from drain()
+        if batch:
+            submit()
+        while pending:
+            yield from drain()
+    finally:
+        # The pool outlives this job; drop only our own unfinished batches
+        for _, future in pending:
+            if future:
+                future.cancel()
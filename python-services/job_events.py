@@ -0,0 +1,155 @@
+"""In-process pub/sub of job progress for the ``/jobs/{job_id}/events`` stream.
+
+The job runner and the processing stages publish into ``JobEvents`` from any
+thread; each job keeps one merged snapshot (status, stage, progress counters)
+and subscribers are woken on the event loop to send the latest snapshot, so a
+burst of per-file updates coalesces into a handful of messages. Counter-only
+updates are additionally throttled to one every ``JOB_EVENTS_INTERVAL``
+seconds. With ``JOB_EVENTS_NOTIFY`` enabled, snapshots are also relayed
+through Postgres ``NOTIFY`` so that a client connected to one replica sees
+jobs processed by another.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Set
+
+JOB_EVENTS_INTERVAL = float(os.getenv("JOB_EVENTS_INTERVAL", "0.25"))
+JOB_EVENTS_NOTIFY = os.getenv("JOB_EVENTS_NOTIFY", "false").lower() in ("1", "true", "yes")
+NOTIFY_CHANNEL = "job_events"
+FINISHED_STATUSES = ("completed", "failed")
+
+Snapshot = Dict[str, object]
+
+
+class Subscription:
+    """Latest snapshot for one job, as seen by one client."""
+
+    def __init__(self, events: "JobEvents", job_id: str) -> None:
+        self._events = events
+        self.job_id = job_id
+        self.ready = asyncio.Event()
+        self.message: Optional[Snapshot] = None
+
+    async def next(self, timeout: float) -> Optional[Snapshot]:
+        """Wait for the next snapshot; None if ``timeout`` seconds pass first."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.ready.clear()
+        return self.message
+
+    def close(self) -> None:
+        self._events._unsubscribe(self)
+
+
+class JobEvents:
+    def __init__(self, notify: Optional[Callable[[str, str], None]] = None) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._snapshots: Dict[str, Snapshot] = {}
+        self._last_sent: Dict[str, float] = {}
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._notify = notify
+        # NOTIFY goes out on its own thread so publishing never waits on Postgres
+        self._notifier = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-events") if notify else None
+        self._origin = uuid.uuid4().hex
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def snapshot(self, job_id: str) -> Optional[Snapshot]:
+        with self._lock:
+            snapshot = self._snapshots.get(job_id)
+            return dict(snapshot) if snapshot is not None else None
+
+    def publish(
+        self,
+        job_id: str,
+        status: Optional[str] = None,
+        stage: Optional[str] = None,
+        progress: Optional[Dict[str, int]] = None,
+        **fields: object,
+    ) -> None:
+        """Merge an update into the job's snapshot and wake its subscribers."""
+        now = time.monotonic()
+        with self._lock:
+            snapshot = self._snapshots.setdefault(job_id, {"job_id": job_id, "seq": 0, "progress": {}})
+            transition = status is not None or stage is not None or bool(fields)
+            if status is not None:
+                snapshot["status"] = status
+            if stage is not None:
+                snapshot["stage"] = stage
+            if progress:
+                snapshot["progress"] = {**snapshot["progress"], **progress}
+            snapshot.update(fields)
+            snapshot["seq"] += 1
+            if not transition and now - self._last_sent.get(job_id, 0.0) < JOB_EVENTS_INTERVAL:
+                return
+            self._last_sent[job_id] = now
+            message = dict(snapshot)
+            if status in FINISHED_STATUSES:
+                # Later subscribers read the final state from the database
+                self._snapshots.pop(job_id, None)
+                self._last_sent.pop(job_id, None)
+        self._dispatch(job_id, message)
+        if self._notifier is not None:
+            payload = json.dumps({"origin": self._origin, "snapshot": message}, default=str)
+            self._notifier.submit(self._notify, NOTIFY_CHANNEL, payload)
+
+    def reporter(self, job_id: str) -> Callable[[str, Dict[str, int]], None]:
+        """Progress callback for the engine: ``report(stage, counters)``."""
+        def report(stage: str, counters: Dict[str, int]) -> None:
+            current = self.snapshot(job_id) or {}
+            self.publish(job_id, stage=stage if current.get("stage") != stage else None, progress=counters)
+        return report
+
+    def receive_notification(self, payload: str) -> None:
+        """Apply a snapshot relayed from another replica."""
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if not isinstance(message, dict) or message.get("origin") == self._origin:
+            return
+        snapshot = message.get("snapshot")
+        if not isinstance(snapshot, dict) or not isinstance(snapshot.get("job_id"), str):
+            return
+        job_id = snapshot["job_id"]
+        with self._lock:
+            if snapshot.get("status") in FINISHED_STATUSES:
+                self._snapshots.pop(job_id, None)
+            else:
+                self._snapshots[job_id] = dict(snapshot)
+        self._dispatch(job_id, snapshot)
+
+    def _dispatch(self, job_id: str, message: Snapshot) -> None:
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._wake, job_id, message)
+
+    def _wake(self, job_id: str, message: Snapshot) -> None:
+        for subscriber in self._subscribers.get(job_id, ()):
+            subscriber.message = message
+            subscriber.ready.set()
+
+    def subscribe(self, job_id: str) -> Subscription:
+        """Start receiving snapshots for ``job_id``; call ``close`` when done."""
+        subscription = Subscription(self, job_id)
+        self._subscribers.setdefault(job_id, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscribers.get(subscription.job_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.job_id]
@@ -0,0 +1,160 @@
+"""Bounded in-process job queue for the API service.
+
+``/process-job`` only persists the upload and enqueues the job id; a fixed
+number of worker tasks on the event loop take jobs off the queue and hand the
+blocking work to the engine pool, so request handling never waits on
+processing. Job state lives in Postgres (``jobs.status``), which is what lets
+unfinished jobs be re-queued after a restart.
+
+At most ``JOB_WORKERS`` jobs run at once. Jobs are queued per pilot and
+workers pick pilots round-robin, running at most ``JOB_PILOT_CONCURRENCY``
+jobs for any one pilot, so a pilot who submits ten surveys at once cannot
+starve everyone else. Admission is checked before an
+upload is accepted: once ``JOB_QUEUE_MAX`` jobs (or ``JOB_PILOT_QUEUE_MAX``
+for one pilot) are waiting, ``reserve`` raises ``QueueFull`` with a
+``Retry-After`` estimate.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", os.getenv("ENGINE_WORKERS", "2")))
+# By default one worker is always left for other pilots' jobs
+JOB_PILOT_CONCURRENCY = int(os.getenv("JOB_PILOT_CONCURRENCY", str(max(1, JOB_WORKERS - 1))))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))
+JOB_PILOT_QUEUE_MAX = int(os.getenv("JOB_PILOT_QUEUE_MAX", "10"))
+# Starting point for Retry-After until real job durations have been seen
+DEFAULT_JOB_SECONDS = 60.0
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[str], Awaitable[None]]
+
+
+class QueueFull(Exception):
+    def __init__(self, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    def __init__(
+        self,
+        handler: Handler,
+        workers: int = JOB_WORKERS,
+        pilot_concurrency: int = JOB_PILOT_CONCURRENCY,
+        max_depth: int = JOB_QUEUE_MAX,
+        max_pilot_depth: int = JOB_PILOT_QUEUE_MAX,
+    ) -> None:
+        self._handler = handler
+        self._workers = max(1, workers)
+        self._pilot_concurrency = max(1, pilot_concurrency)
+        self._max_depth = max_depth
+        self._max_pilot_depth = max_pilot_depth
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        # Pilots with waiting jobs, in the order they will next be served
+        self._rotation: Deque[str] = deque()
+        self._pending: Dict[str, Deque[str]] = {}
+        self._reserved: Dict[str, int] = {}
+        self._running: Dict[str, int] = {}
+        self._job_seconds = DEFAULT_JOB_SECONDS
+
+    @property
+    def depth(self) -> int:
+        return sum(map(len, self._pending.values())) + sum(self._reserved.values())
+
+    @property
+    def in_flight(self) -> int:
+        return sum(self._running.values())
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work(), name=f"job-worker-{n}") for n in range(self._workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely to free up (the next job finishing)."""
+        return max(1, min(3600, math.ceil(self._job_seconds / self._workers)))
+
+    def _waiting(self, pilot_id: str) -> int:
+        return len(self._pending.get(pilot_id, ())) + self._reserved.get(pilot_id, 0)
+
+    def reserve(self, pilot_id: str) -> None:
+        """Claim a queue slot for a job about to be uploaded, or raise ``QueueFull``."""
+        if self.depth >= self._max_depth:
+            raise QueueFull("The processing queue is full", self.retry_after())
+        if self._waiting(pilot_id) >= self._max_pilot_depth:
+            raise QueueFull(f"Pilot already has {self._max_pilot_depth} jobs waiting", self.retry_after())
+        self._reserved[pilot_id] = self._reserved.get(pilot_id, 0) + 1
+
+    def release(self, pilot_id: str) -> None:
+        """Give back a reservation once its job is submitted or its upload failed."""
+        remaining = self._reserved.get(pilot_id, 0) - 1
+        if remaining > 0:
+            self._reserved[pilot_id] = remaining
+        else:
+            self._reserved.pop(pilot_id, None)
+
+    def submit(self, job_id: str, pilot_id: str) -> None:
+        """Queue ``job_id`` behind ``pilot_id``'s other jobs (admission is not checked)."""
+        if self._wakeup is None:
+            raise RuntimeError("Job queue has not been started")
+        if pilot_id not in self._pending:
+            self._pending[pilot_id] = deque()
+            self._rotation.append(pilot_id)
+        self._pending[pilot_id].append(job_id)
+        self._wakeup.set()
+
+    def _next(self) -> Optional[Tuple[str, str]]:
+        for _ in range(len(self._rotation)):
+            pilot_id = self._rotation.popleft()
+            if self._running.get(pilot_id, 0) >= self._pilot_concurrency:
+                self._rotation.append(pilot_id)
+                continue
+            jobs = self._pending[pilot_id]
+            job_id = jobs.popleft()
+            if jobs:
+                self._rotation.append(pilot_id)
+            else:
+                del self._pending[pilot_id]
+            return job_id, pilot_id
+        return None
+
+    async def _work(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            picked = self._next()
+            if picked is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            job_id, pilot_id = picked
+            self._running[pilot_id] = self._running.get(pilot_id, 0) + 1
+            started = time.monotonic()
+            try:
+                await self._handler(job_id)
+            except Exception:
+                # The handler records failures itself; never let one job stop the worker
+                logger.exception("Job %s failed", job_id)
+            finally:
+                self._job_seconds = 0.8 * self._job_seconds + 0.2 * (time.monotonic() - started)
+                self._running[pilot_id] -= 1
+                if not self._running[pilot_id]:
+                    del self._running[pilot_id]
+                # A pilot at its cap may have become runnable again
+                self._wakeup.set()
@@ -0,0 +1,126 @@
+"""Streaming KMZ/KML reader for site boundary uploads.
+
+KMZ archives are read in place with ``zipfile`` (no extraction to disk) and the
+KML is walked with ``iterparse``, clearing elements as soon as they have been
+consumed, so memory stays proportional to the largest single geometry rather
+than the whole document. Coordinates come back as NumPy ``(N, 2)`` arrays of
+``(lon, lat)``.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional
+from xml.etree import ElementTree as ET
+
+import numpy as np
+
+
+class Geometry(NamedTuple):
+    kind: str  # "Polygon", "LineString" or "Point"
+    name: Optional[str]
+    coords: np.ndarray  # (N, 2) lon/lat; the exterior ring for polygons
+    holes: List[np.ndarray]  # interior rings, polygons only
+
+
+GEOMETRY_TAGS = {"Polygon", "LineString", "LinearRing", "Point"}
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+@contextlib.contextmanager
+def open_kml(path: Path) -> Iterator[BinaryIO]:
+    """Open the KML document inside a KMZ (or a bare KML file) as a byte stream."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            members = [name for name in archive.namelist() if name.lower().endswith(".kml")]
+            if not members:
+                raise ValueError(f"No KML document found in {path}")
+            # KMZ convention: the main document is doc.kml, otherwise the first .kml at the root
+            members.sort(key=lambda name: (Path(name).name.lower() != "doc.kml", name.count("/"), name))
+            with archive.open(members[0]) as stream:
+                yield stream
+    else:
+        with path.open("rb") as stream:
+            yield stream
+
+
+def parse_coordinates(text: Optional[str]) -> np.ndarray:
+    """Parse a KML ``<coordinates>`` body into an ``(N, 2)`` lon/lat array."""
+    text = (text or "").strip()
+    if not text:
+        return np.empty((0, 2))
+    first = text.split(None, 1)[0]
+    dims = first.count(",") + 1
+    # Parse in C without building a Python list of tokens
+    values = np.fromstring(text.replace(",", " "), dtype=np.float64, sep=" ")
+    if dims >= 2 and values.size % dims == 0 and text.count(",") == values.size // dims * (dims - 1):
+        return values.reshape(-1, dims)[:, :2]
+    # Mixed 2D/3D tuples: fall back to parsing each one
+    return np.array([[float(part) for part in t.split(",")[:2]] for t in text.split()], dtype=np.float64)
+
+
+def iter_geometries(path: Path) -> Iterator[Geometry]:
+    """Yield every Polygon, LineString and Point in a KMZ/KML file, in document order."""
+    with open_kml(path) as stream:
+        context = ET.iterparse(stream, events=("start", "end"))
+        _, root = next(context)
+        placemark_name: Optional[str] = None
+        in_placemark = False
+        ring_role: Optional[str] = None  # "outer" / "inner" while inside a polygon boundary
+        exterior: Optional[np.ndarray] = None
+        holes: List[np.ndarray] = []
+        coords: Optional[np.ndarray] = None
+
+        for event, elem in context:
+            tag = _local(elem.tag)
+            if event == "start":
+                if tag == "Placemark":
+                    in_placemark = True
+                    placemark_name = None
+                elif tag == "Polygon":
+                    exterior, holes = None, []
+                elif tag == "outerBoundaryIs":
+                    ring_role = "outer"
+                elif tag == "innerBoundaryIs":
+                    ring_role = "inner"
+                continue
+
+            if tag == "name" and in_placemark and placemark_name is None:
+                placemark_name = (elem.text or "").strip() or None
+            elif tag == "coordinates":
+                coords = parse_coordinates(elem.text)
+            elif tag == "LinearRing":
+                if ring_role == "outer":
+                    exterior = coords
+                elif ring_role == "inner" and coords is not None:
+                    holes.append(coords)
+                elif coords is not None:
+                    # A bare LinearRing outside a polygon is a closed line
+                    yield Geometry("LineString", placemark_name, coords, [])
+                coords = None
+            elif tag in ("outerBoundaryIs", "innerBoundaryIs"):
+                ring_role = None
+            elif tag == "Polygon":
+                if exterior is not None and len(exterior):
+                    yield Geometry("Polygon", placemark_name, exterior, holes)
+                exterior, holes = None, []
+            elif tag in ("LineString", "Point"):
+                if coords is not None and len(coords):
+                    yield Geometry(tag, placemark_name, coords, [])
+                coords = None
+            elif tag == "Placemark":
+                in_placemark = False
+
+            if tag in GEOMETRY_TAGS or tag in ("Placemark", "Folder", "Document", "coordinates"):
+                elem.clear()
+                if tag in ("Placemark", "Folder"):
+                    root.clear()
+
+
+def load_geometries(path: Path) -> List[Geometry]:
+    return list(iter_geometries(path))
@@ -1,29 +1,117 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
+import re
 import shutil
-import subprocess
+import threading
 import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional
 
-import pandas as pd
-import psycopg2
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from psycopg2.extras import RealDictCursor
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+from artifacts import artifact_response, resolve_artifact
+from coverage_planner import PlanSettings
+import metrics
+import process_pool
+from db import (
+    close_pool,
+    complete_job,
+    create_job,
+    fetch_job,
+    job_exists,
+    job_storage,
+    listen,
+    notify,
+    pool_usage,
+    save_flight_path,
+    set_job_status,
+    storage_usage,
+    unfinished_jobs,
+)
+from dedupe import UPLOAD_INDEX_NAME, share_with_store, write_upload_index
+from engine import (
+    EXCEL_NAME,
+    METADATA_NAME,
+    PDF_NAME,
+    RECORDS_NAME,
+    busy_workers,
+    generate_flight_paths,
+    run_in_engine,
+    run_job,
+)
+from job_events import FINISHED_STATUSES, JOB_EVENTS_NOTIFY, NOTIFY_CHANNEL, JobEvents
+from job_queue import JobQueue, QueueFull
+from report_data import excel_is_current, export_excel
+from retention import (
+    INCOMING_DIR,
+    RETENTION_FINAL_ONLY_HOURS,
+    RETENTION_INTERVAL_SECONDS,
+    RETENTION_MAX_AGE_DAYS,
+    STORAGE_MAX_BYTES,
+    account,
+    run_janitor,
+    shared_bytes,
+)
+from status_cache import StatusCache, StatusPayload, build_payload, etag_matches
+from upload_sessions import (
+    UploadSessionRequest,
+    begin_finalize,
+    create_session,
+    delete_session,
+    release,
+    session_pilot,
+    session_status,
+    write_chunk,
+)
+from uploads import StagedUpload, receive_multipart, unique_name
 
 OUTPUT_DIR = Path(os.getenv("OUTPUT_ROOT", "/app/outputs"))
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL environment variable must be set for the Python service")
+# Names the service writes into a job directory; uploads never take them
+RESERVED_NAMES = {UPLOAD_INDEX_NAME, RECORDS_NAME, EXCEL_NAME, METADATA_NAME, PDF_NAME, "annotated", "flight_paths"}
+# Job directories sit beside .sessions, .incoming and caches; only job ids name them
+_JOB_ID = re.compile(r"^job_[0-9a-f]{10}$")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    job_events.bind(asyncio.get_running_loop())
+    if JOB_EVENTS_NOTIFY:
+        threading.Thread(
+            target=listen,
+            args=(NOTIFY_CHANNEL, job_events.receive_notification, _listener_stop),
+            name="job-events-listener",
+            daemon=True,
+        ).start()
+    if RETENTION_INTERVAL_SECONDS > 0:
+        threading.Thread(
+            target=run_janitor, args=(_janitor_stop,), name="storage-janitor", daemon=True
+        ).start()
+    process_pool.start()
+    job_queue.start()
+    # Pick up jobs that were queued or interrupted when the service last stopped
+    for job in await run_in_threadpool(unfinished_jobs):
+        if (OUTPUT_DIR / job["job_id"]).is_dir():
+            job_queue.submit(job["job_id"], job["pilot_id"] or "")
+    try:
+        yield
+    finally:
+        _listener_stop.set()
+        _janitor_stop.set()
+        await job_queue.stop()
+        await run_in_threadpool(process_pool.shutdown)
+        close_pool()
 
 
-app = FastAPI(title="ComplianceDrone Python Services")
+app = FastAPI(title="ComplianceDrone Python Services", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -31,189 +119,325 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+def _job_dir(job_id: str) -> Path:
+    if not _JOB_ID.match(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    job_dir = (OUTPUT_DIR / job_id).resolve()
+    if job_dir.parent != OUTPUT_DIR.resolve() or not job_dir.is_dir():
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_dir
+
+
+def _store_uploads(uploads: List[StagedUpload], job_dir: Path) -> Dict[str, str]:
+    digests: Dict[str, str] = {}
+    seen_digests = set()
+    taken = set(RESERVED_NAMES)
+    for staged in uploads:
+        if staged.field != "files" or staged.digest in seen_digests:
+            # Same content already uploaded in this job (or a stray file field): keep one copy only.
+            staged.path.unlink()
+            continue
+        seen_digests.add(staged.digest)
+        name = unique_name(staged.name, taken)
+        destination = job_dir / name
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(staged.path, destination)
+        digests[name] = staged.digest
+        share_with_store(destination, staged.digest)
+    write_upload_index(job_dir, digests)
+    return digests
+
+
+def _form_field(fields: Dict[str, str], name: str) -> str:
+    value = fields.get(name, "").strip()
+    if not value:
+        raise HTTPException(status_code=422, detail=f"Missing form field '{name}'")
+    return value
+
+
+def _optional_float(fields: Dict[str, str], name: str) -> Optional[float]:
+    value = fields.get(name, "").strip()
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"Form field '{name}' must be a number")
+
 
+async def _run_queued_job(job_id: str) -> None:
+    status_cache.discard(job_id)
+    await run_in_threadpool(set_job_status, job_id, "processing")
+    job_events.publish(job_id, status="processing")
+    try:
+        outputs = await run_in_engine(run_job, OUTPUT_DIR / job_id, job_events.reporter(job_id))
+        anomalies_found = int(outputs["summary"].get("anomalies_found", 0))
+        excel_url = f"/outputs/{job_id}/{EXCEL_NAME}"
+        pdf_url = f"/outputs/{job_id}/{PDF_NAME}"
+        await run_in_threadpool(complete_job, job_id, anomalies_found, excel_url, pdf_url)
+    except Exception:
+        await run_in_threadpool(set_job_status, job_id, "failed")
+        job_events.publish(job_id, status="failed")
+        await run_in_threadpool(account, job_id)
+        raise
+    job_events.publish(
+        job_id,
+        status="completed",
+        result={"anomalies_found": anomalies_found, "excel_url": excel_url, "pdf_url": pdf_url},
+    )
+    await run_in_threadpool(account, job_id)
 
-def get_db_conn():
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
 
+job_queue = JobQueue(_run_queued_job)
+status_cache = StatusCache()
+job_events = JobEvents(notify if JOB_EVENTS_NOTIFY else None)
+_listener_stop = threading.Event()
+_janitor_stop = threading.Event()
+SSE_KEEPALIVE_SECONDS = 15.0
 
-def _save_upload(file: UploadFile, destination: Path) -> None:
-    destination.parent.mkdir(parents=True, exist_ok=True)
-    with destination.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+metrics.gauge("compliancedrone_job_queue_depth", "Jobs waiting for a worker.", lambda: job_queue.depth)
+metrics.gauge("compliancedrone_jobs_in_flight", "Jobs currently being processed.", lambda: job_queue.in_flight)
+metrics.gauge(
+    "compliancedrone_engine_tasks", "Engine calls running or waiting for an engine worker.", busy_workers
+)
+metrics.gauge("compliancedrone_db_pool_in_use", "Postgres connections checked out.", lambda: pool_usage()[0])
+metrics.gauge("compliancedrone_db_pool_size", "Maximum Postgres connections in the pool.", lambda: pool_usage()[1])
 
 
-def _run_subprocess(command: List[str], cwd: Optional[Path] = None) -> None:
+def _admit(pilot_id: str) -> None:
     try:
-        subprocess.run(command, cwd=cwd, check=True)
-    except subprocess.CalledProcessError as exc:
-        raise RuntimeError(f"Command failed: {' '.join(command)}") from exc
+        job_queue.reserve(pilot_id)
+    except QueueFull as exc:
+        raise HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": str(exc.retry_after)})
 
 
-def _load_summary(metadata_path: Path, excel_path: Path) -> Dict[str, int]:
-    if metadata_path.exists():
-        try:
-            return json.loads(metadata_path.read_text())
-        except Exception:
-            pass
+@app.post("/process-job", status_code=202)
+async def process_job(request: Request):
+    job_id = f"job_{uuid.uuid4().hex[:10]}"
+    job_dir = OUTPUT_DIR / job_id
+    job_dir.mkdir(parents=True, exist_ok=True)
+    reservation: List[str] = []
+
+    def admit(fields: Dict[str, str]) -> None:
+        # Refuse before any file data is read; clients send pilot_id ahead of the files
+        pilot = _form_field(fields, "pilot_id")
+        _admit(pilot)
+        reservation.append(pilot)
 
     try:
-        df = pd.read_excel(excel_path, sheet_name="Summary")
-        summary = df.iloc[0].to_dict()
-        return {k: int(v) for k, v in summary.items() if isinstance(v, (int, float))}
-    except Exception:
-        return {"total_files": 0, "anomalies_found": 0}
+        with metrics.STAGE_SECONDS.time("upload"):
+            fields, uploads = await receive_multipart(request, job_dir, on_first_file=admit)
+            if not any(staged.field == "files" for staged in uploads):
+                raise HTTPException(status_code=400, detail="At least one file must be provided")
+            # Queue the job under the pilot its slot was reserved for
+            pilot_id = reservation[0]
+            location = _form_field(fields, "location")
+            await run_in_threadpool(_store_uploads, uploads, job_dir)
+        await run_in_threadpool(create_job, job_id, pilot_id, location, "queued")
+    except BaseException:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        for pilot in reservation:
+            job_queue.release(pilot)
+        raise
+
+    # Submit before giving the slot back so admission never sees it free in between
+    job_queue.submit(job_id, pilot_id)
+    for pilot in reservation:
+        job_queue.release(pilot)
+    await run_in_threadpool(account, job_id)
 
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/jobs/{job_id}",
+        },
+    )
 
-@app.post("/process-job")
-async def process_job(
-    pilot_id: str = Form(...),
-    location: str = Form(...),
-    files: List[UploadFile] = File(...),
-):
-    if not files:
-        raise HTTPException(status_code=400, detail="At least one file must be provided")
 
-    job_id = f"job_{uuid.uuid4().hex[:10]}"
-    job_dir = OUTPUT_DIR / job_id
-    job_dir.mkdir(parents=True, exist_ok=True)
+@app.post("/uploads", status_code=201)
+async def create_upload(spec: UploadSessionRequest):
+    return await run_in_threadpool(create_session, spec)
 
-    for uploaded in files:
-        destination = job_dir / uploaded.filename
-        _save_upload(uploaded, destination)
-        uploaded.file.close()
 
-    excel_path = job_dir / "Report_Input.xlsx"
-    metadata_path = job_dir / "Report_Input.json"
-    pdf_path = job_dir / "Final_Report.pdf"
+@app.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    return await run_in_threadpool(session_status, upload_id)
 
-    with get_db_conn() as conn, conn.cursor() as cur:
-        cur.execute(
-            "INSERT INTO jobs (job_id, pilot_id, location, status) VALUES (%s, %s, %s, %s)",
-            (job_id, pilot_id, location, "processing"),
-        )
-        conn.commit()
 
-    try:
-        _run_subprocess([
-            "python",
-            "Drone_Data_Process.py",
-            str(job_dir),
-            str(excel_path),
-            str(metadata_path),
-        ], cwd=Path(__file__).parent)
-
-        _run_subprocess([
-            "python",
-            "ClaudeMain1_fixed.py",
-            str(excel_path),
-            str(pdf_path),
-            str(metadata_path),
-        ], cwd=Path(__file__).parent)
-
-        summary = _load_summary(metadata_path, excel_path)
-        anomalies_found = int(summary.get("anomalies_found", 0))
-
-        excel_url = f"/outputs/{job_id}/Report_Input.xlsx"
-        pdf_url = f"/outputs/{job_id}/Final_Report.pdf"
-
-        with get_db_conn() as conn, conn.cursor() as cur:
-            cur.execute(
-                "UPDATE jobs SET status = %s WHERE job_id = %s",
-                ("completed", job_id),
-            )
-            cur.execute(
-                "INSERT INTO results (job_id, anomalies_found, excel_url, pdf_url) VALUES (%s, %s, %s, %s)",
-                (job_id, anomalies_found, excel_url, pdf_url),
-            )
-            conn.commit()
-
-        return JSONResponse(
-            content={
-                "job_id": job_id,
-                "anomalies_found": anomalies_found,
-                "excel_url": excel_url,
-                "pdf_url": pdf_url,
-            }
-        )
+@app.put("/uploads/{upload_id}/files/{index}")
+async def put_upload_chunk(upload_id: str, index: int, offset: int, request: Request):
+    return await write_chunk(request, upload_id, index, offset, request.headers.get("x-chunk-sha256"))
 
-    except Exception as exc:
-        with get_db_conn() as conn, conn.cursor() as cur:
-            cur.execute(
-                "UPDATE jobs SET status = %s WHERE job_id = %s",
-                ("failed", job_id),
-            )
-            conn.commit()
-        raise HTTPException(status_code=500, detail=str(exc))
 
+@app.delete("/uploads/{upload_id}", status_code=204)
+async def delete_upload(upload_id: str):
+    await run_in_threadpool(delete_session, upload_id)
+    return Response(status_code=204)
 
-@app.get("/jobs/{job_id}")
-async def get_job_status(job_id: str):
-    with get_db_conn() as conn, conn.cursor() as cur:
-        cur.execute(
-            "SELECT job_id, pilot_id, location, status, created_at FROM jobs WHERE job_id = %s",
-            (job_id,),
-        )
-        job = cur.fetchone()
-        if not job:
-            raise HTTPException(status_code=404, detail="Job not found")
 
-        cur.execute(
-            "SELECT anomalies_found, excel_url, pdf_url FROM results WHERE job_id = %s",
-            (job_id,),
-        )
-        result = cur.fetchone()
+@app.post("/uploads/{upload_id}/finalize", status_code=202)
+async def finalize_upload(upload_id: str):
+    pilot_id = await run_in_threadpool(session_pilot, upload_id)
+    _admit(pilot_id)
+    try:
+        manifest, uploads = await run_in_threadpool(begin_finalize, upload_id)
+    except BaseException:
+        job_queue.release(pilot_id)
+        raise
+    job_id = f"job_{uuid.uuid4().hex[:10]}"
+    job_dir = OUTPUT_DIR / job_id
+    try:
+        job_dir.mkdir(parents=True, exist_ok=True)
+        await run_in_threadpool(create_job, job_id, manifest["pilot_id"], manifest["location"], "queued")
+    except BaseException:
+        # Nothing has moved yet: the session stays intact and finalize can be retried
+        shutil.rmtree(job_dir, ignore_errors=True)
+        release(upload_id)
+        job_queue.release(pilot_id)
+        raise
+
+    try:
+        await run_in_threadpool(_store_uploads, uploads, job_dir)
+    except BaseException:
+        job_queue.release(pilot_id)
+        # Some files may already have moved out of the session; the job cannot run
+        await run_in_threadpool(set_job_status, job_id, "failed")
+        raise
+
+    job_queue.submit(job_id, pilot_id)
+    job_queue.release(pilot_id)
+    await run_in_threadpool(delete_session, upload_id)
+    await run_in_threadpool(account, job_id)
 
     return JSONResponse(
+        status_code=202,
         content={
-            "job": job,
-            "result": result,
-        }
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/jobs/{job_id}",
+        },
+    )
+
+
+async def _job_status(job_id: str) -> StatusPayload:
+    payload = status_cache.get(job_id)
+    if payload is None:
+        status = await run_in_threadpool(fetch_job, job_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        payload = build_payload(status)
+        status_cache.put(job_id, payload)
+    return payload
+
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, request: Request):
+    payload = await _job_status(job_id)
+
+    # Finished jobs never change; running ones must be revalidated on every poll
+    headers = {
+        "ETag": payload.etag,
+        "Cache-Control": "private, max-age=86400, immutable" if payload.finished else "private, no-cache",
+    }
+    if etag_matches(request.headers.get("if-none-match"), payload.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
+
+
+def _server_sent_event(message: Dict[str, object]) -> str:
+    return f"id: {message.get('seq', 0)}\ndata: {json.dumps(message, default=str)}\n\n"
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    # Subscribe before reading the current state so no transition is missed
+    subscription = job_events.subscribe(job_id)
+    try:
+        message = job_events.snapshot(job_id)
+        if message is None:
+            status = json.loads((await _job_status(job_id)).body)
+            message = {"job_id": job_id, "status": status["job"]["status"], "result": status["result"]}
+    except BaseException:
+        subscription.close()
+        raise
+
+    async def stream():
+        current = message
+        try:
+            while True:
+                if current is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield _server_sent_event(current)
+                    if current.get("status") in FINISHED_STATUSES:
+                        return
+                current = await subscription.next(SSE_KEEPALIVE_SECONDS)
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
 @app.post("/generate-flight-path")
-async def generate_flight_path(
-    job_id: str = Form(...),
-    kmz: UploadFile = File(...),
-):
-    with get_db_conn() as conn, conn.cursor() as cur:
-        cur.execute("SELECT 1 FROM jobs WHERE job_id = %s", (job_id,))
-        if cur.fetchone() is None:
+async def generate_flight_path(request: Request):
+    fields, uploads = await receive_multipart(request, INCOMING_DIR, max_files=1)
+    try:
+        job_id = _form_field(fields, "job_id")
+        kmz = next((staged for staged in uploads if staged.field == "kmz"), None)
+        if kmz is None:
+            raise HTTPException(status_code=422, detail="Missing form field 'kmz'")
+
+        defaults = PlanSettings()
+        altitude_m = _optional_float(fields, "altitude_m")
+        hfov_deg = _optional_float(fields, "hfov_deg")
+        side_overlap = _optional_float(fields, "side_overlap")
+        settings = PlanSettings(
+            altitude_m=altitude_m if altitude_m is not None else defaults.altitude_m,
+            hfov_deg=hfov_deg if hfov_deg is not None else defaults.hfov_deg,
+            side_overlap=side_overlap if side_overlap is not None else defaults.side_overlap,
+            sweep_angle_deg=_optional_float(fields, "sweep_angle_deg"),
+        )
+        if settings.altitude_m <= 0 or not 0 < settings.hfov_deg < 180 or not 0 <= settings.side_overlap < 1:
+            raise HTTPException(status_code=400, detail="Invalid flight planning parameters")
+
+        if not await run_in_threadpool(job_exists, job_id):
             raise HTTPException(status_code=404, detail="Job not found")
+    except BaseException:
+        for staged in uploads:
+            staged.path.unlink(missing_ok=True)
+        raise
 
     job_dir = OUTPUT_DIR / job_id
     job_dir.mkdir(parents=True, exist_ok=True)
     flight_dir = job_dir / "flight_paths"
     flight_dir.mkdir(exist_ok=True)
 
-    kmz_path = flight_dir / kmz.filename
-    _save_upload(kmz, kmz_path)
-    kmz.file.close()
-
-    _run_subprocess(
-        [
-            "python",
-            "FlightPlanTool.py",
-            str(kmz_path),
-            str(flight_dir),
-        ],
-        cwd=Path(__file__).parent,
-    )
+    # Keep the KMZ beside the generated files but never let it replace one of them
+    kmz_name = kmz.name.replace("/", "_")
+    if kmz_name.startswith("flight_path."):
+        kmz_name = f"site_{kmz_name}"
+    kmz_path = flight_dir / kmz_name
+    os.replace(kmz.path, kmz_path)
 
-    kml_path = flight_dir / "flight_path.kml"
-    geojson_path = flight_dir / "flight_path.geojson"
+    artifacts = await run_in_engine(generate_flight_paths, kmz_path, flight_dir, settings, kmz.digest)
+    kml_path = artifacts["kml"]
+    geojson_path = artifacts["geojson"]
 
     kml_url = f"/outputs/{job_id}/flight_paths/{kml_path.name}"
     geojson_url = f"/outputs/{job_id}/flight_paths/{geojson_path.name}"
     kmz_url = f"/outputs/{job_id}/flight_paths/{kmz_path.name}"
 
-    with get_db_conn() as conn, conn.cursor() as cur:
-        cur.execute(
-            "INSERT INTO flight_paths (job_id, kmz_file_url, generated_path_url, geojson_url) VALUES (%s, %s, %s, %s)",
-            (job_id, kmz_url, kml_url, geojson_url),
-        )
-        conn.commit()
+    await run_in_threadpool(save_flight_path, job_id, kmz_url, kml_url, geojson_url)
+    await run_in_threadpool(account, job_id)
 
     return JSONResponse(
         content={
@@ -225,6 +449,64 @@ async def generate_flight_path(
     )
 
 
+@app.get(f"/outputs/{{job_id}}/{EXCEL_NAME}")
+async def download_excel(job_id: str):
+    job_dir = _job_dir(job_id)
+    records_path = job_dir / RECORDS_NAME
+    if not records_path.exists():
+        raise HTTPException(status_code=404, detail="Report not available")
+
+    excel_path = job_dir / EXCEL_NAME
+    cached = await run_in_threadpool(excel_is_current, records_path, excel_path)
+    if not cached:
+        await run_in_threadpool(export_excel, records_path, excel_path)
+    return FileResponse(
+        excel_path,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename=EXCEL_NAME,
+        # The workbook is built on first download; count it once it is sent
+        background=None if cached else BackgroundTask(account, job_id),
+    )
+
+
+@app.api_route("/outputs/{job_id}/{artifact:path}", methods=["GET", "HEAD"])
+async def download_artifact(job_id: str, artifact: str, request: Request):
+    path = resolve_artifact(_job_dir(job_id), artifact)
+    return artifact_response(path, request)
+
+
+@app.get("/storage")
+async def get_storage_usage(pilot_id: Optional[str] = None):
+    usage = await run_in_threadpool(storage_usage, pilot_id)
+    # The dedupe store and flight path cache belong to no single pilot
+    shared = await run_in_threadpool(shared_bytes) if pilot_id is None else 0
+    disk = shutil.disk_usage(OUTPUT_DIR)
+    return {
+        **usage,
+        "shared_bytes": shared,
+        "total_bytes": usage["upload_bytes"] + usage["intermediate_bytes"] + usage["final_bytes"] + shared,
+        "disk": {"total_bytes": disk.total, "used_bytes": disk.used, "free_bytes": disk.free},
+        "policy": {
+            "final_only_after_hours": RETENTION_FINAL_ONLY_HOURS or None,
+            "max_age_days": RETENTION_MAX_AGE_DAYS or None,
+            "max_bytes": STORAGE_MAX_BYTES or None,
+        },
+    }
+
+
+@app.get("/jobs/{job_id}/storage")
+async def get_job_storage(job_id: str):
+    usage = await run_in_threadpool(job_storage, job_id)
+    if usage is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return usage
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/")
 async def root():
     return {"status": "ok"}
@@ -0,0 +1,193 @@
+"""In-process metrics exported in the Prometheus text format.
+
+Counters and histograms are plain Python objects updated under a lock, so
+recording a sample costs a dict lookup and a few additions; gauges are
+callbacks evaluated only when ``/metrics`` is scraped. Route latency is
+recorded by ``MetricsMiddleware`` against the route template (``/jobs/{job_id}``)
+rather than the raw path, which keeps label cardinality bounded.
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+STAGE_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *values: str) -> None:
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.labels:
+            items = [((), 0)]
+        for values, total in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, values)} {_format_value(total)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label set: per-bucket counts (last slot is +Inf), sum of observations
+        self._series: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, *values: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((values, (list(counts), total[0])) for values, (counts, total) in self._series.items())
+        for values, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """A value read from ``callback`` at scrape time."""
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_format_value(self.callback())}",
+        ]
+
+
+_registry: Dict[str, object] = {}
+
+
+def _register(metric):
+    _registry[metric.name] = metric
+    return metric
+
+
+def gauge(name: str, documentation: str, callback: Callable[[], float]) -> Gauge:
+    return _register(Gauge(name, documentation, callback))
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = _register(Histogram(
+    "compliancedrone_http_request_duration_seconds",
+    "Time to serve an HTTP request, by route template, method and status code.",
+    ("route", "method", "status"),
+))
+STAGE_SECONDS = _register(Histogram(
+    "compliancedrone_stage_duration_seconds",
+    "Time spent in each job stage.",
+    ("stage",),
+    STAGE_BUCKETS,
+))
+BYTES_UPLOADED = _register(Counter(
+    "compliancedrone_uploaded_bytes_total",
+    "Bytes of uploaded files written to disk.",
+))
+BYTES_WRITTEN = _register(Counter(
+    "compliancedrone_artifact_bytes_total",
+    "Bytes of generated artifacts, by kind.",
+    ("kind",),
+))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording ``REQUEST_SECONDS`` for every HTTP request."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = ["500"]
+
+        async def send_with_status(message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                getattr(route, "path", "unmatched"),
+                scope["method"],
+                status[0],
+            )
@@ -0,0 +1,151 @@
+"""Streaming KML/GeoJSON writers for flight paths.
+
+Coordinates are formatted in fixed-size chunks with a single ``%`` operation
+per chunk and written straight to the output file (and, optionally, to a
+gzipped copy alongside it), so large plans never exist as one Python string or
+one list per vertex. Paths can be simplified with Douglas-Peucker first.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from coverage_planner import LocalFrame
+
+COORD_PRECISION = int(os.getenv("PATH_COORD_PRECISION", "7"))
+SIMPLIFY_TOLERANCE_M = float(os.getenv("PATH_SIMPLIFY_TOLERANCE_M", "0"))
+GZIP_PATHS = os.getenv("PATH_GZIP", "false").lower() in ("1", "true", "yes")
+CHUNK_POINTS = 16384
+
+
+def simplify(coords: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """Douglas-Peucker simplification of a lon/lat polyline, tolerance in metres."""
+    n = len(coords)
+    if tolerance_m <= 0 or n < 3:
+        return coords
+    frame = LocalFrame(float(coords[:, 0].mean()), float(coords[:, 1].mean()))
+    xy = frame.to_xy(coords)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = xy[first], xy[last]
+        inner = xy[first + 1:last]
+        dx, dy = end - start
+        length = np.hypot(dx, dy)
+        if length == 0:
+            dist = np.hypot(inner[:, 0] - start[0], inner[:, 1] - start[1])
+        else:
+            dist = np.abs(dx * (inner[:, 1] - start[1]) - dy * (inner[:, 0] - start[0])) / length
+        index = int(np.argmax(dist))
+        if dist[index] > tolerance_m:
+            split = first + 1 + index
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return coords[keep]
+
+
+def _coordinate_chunks(coords: np.ndarray, template: str, separator: str, precision: int) -> Iterator[str]:
+    point = template.format(p=precision)
+    for offset in range(0, len(coords), CHUNK_POINTS):
+        chunk = coords[offset:offset + CHUNK_POINTS]
+        text = separator.join([point] * len(chunk)) % tuple(chunk.ravel().tolist())
+        yield (separator if offset else "") + text
+
+
+def _tmp_paths(path: Path, token: str) -> Dict[str, Path]:
+    return {
+        "plain": path.with_name(f".{path.name}.{token}"),
+        "gzip": path.with_name(f".{path.name}.gz.{token}"),
+    }
+
+
+def _open_sinks(stack: ExitStack, tmps: Dict[str, Path], compress: bool) -> List[IO[str]]:
+    sinks = [stack.enter_context(tmps["plain"].open("w", encoding="utf-8"))]
+    if compress:
+        sinks.append(stack.enter_context(gzip.open(tmps["gzip"], "wt", encoding="utf-8", compresslevel=6)))
+    return sinks
+
+
+def _commit(path: Path, tmps: Dict[str, Path], compress: bool) -> Dict[str, Path]:
+    os.replace(tmps["plain"], path)
+    written = {"plain": path}
+    gz_path = path.with_name(path.name + ".gz")
+    if compress:
+        os.replace(tmps["gzip"], gz_path)
+        written["gzip"] = gz_path
+    else:
+        # Never leave a stale compressed copy next to a rewritten plain file
+        gz_path.unlink(missing_ok=True)
+    return written
+
+
+def _write(path: Path, parts: Iterator[str], compress: bool) -> Dict[str, Path]:
+    # Unique per call: requests on the engine's threads share one process
+    tmps = _tmp_paths(path, uuid.uuid4().hex)
+    try:
+        with ExitStack() as stack:
+            sinks = _open_sinks(stack, tmps, compress)
+            for part in parts:
+                for sink in sinks:
+                    sink.write(part)
+        return _commit(path, tmps, compress)
+    except BaseException:
+        for tmp in tmps.values():
+            tmp.unlink(missing_ok=True)
+        raise
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+def write_kml(
+    path: Path, coords: np.ndarray, name: str, precision: int = COORD_PRECISION, compress: bool = GZIP_PATHS
+) -> Dict[str, Path]:
+    """Write ``coords`` as a single KML LineString; returns the plain and gzip paths."""
+    def parts() -> Iterator[str]:
+        yield (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<kml xmlns="http://www.opengis.net/kml/2.2">\n'
+            f"<Document><name>{_escape(name)}</name>\n"
+            "<Placemark><LineString><coordinates>\n"
+        )
+        yield from _coordinate_chunks(coords, "%.{p}f,%.{p}f,0", "\n", precision)
+        yield "\n</coordinates></LineString></Placemark>\n</Document>\n</kml>\n"
+
+    return _write(path, parts(), compress)
+
+
+def write_geojson(
+    path: Path, coords: np.ndarray, name: str, precision: int = COORD_PRECISION, compress: bool = GZIP_PATHS
+) -> Dict[str, Path]:
+    """Write ``coords`` as a compact GeoJSON LineString feature collection."""
+    def parts() -> Iterator[str]:
+        yield (
+            '{"type":"FeatureCollection","features":[{"type":"Feature",'
+            f'"properties":{{"name":{json.dumps(name)}}},'
+            '"geometry":{"type":"LineString","coordinates":['
+        )
+        yield from _coordinate_chunks(coords, "[%.{p}f,%.{p}f,0]", ",", precision)
+        yield "]}}]}\n"
+
+    return _write(path, parts(), compress)
+
+
+def prepare_path(coords: object, tolerance_m: Optional[float] = None) -> np.ndarray:
+    """Normalise a coordinate sequence to an ``(N, 2)`` array and simplify it."""
+    array = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    return simplify(array, SIMPLIFY_TOLERANCE_M if tolerance_m is None else tolerance_m)
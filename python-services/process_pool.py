@@ -0,0 +1,68 @@
+"""Shared process pool for the CPU-bound image stages.
+
+Hotspot detection and thumbnail generation run in one long-lived pool that
+every job reuses, sized once by ``PROCESS_WORKERS``. The API service is
+multi-threaded and holds database sockets and locks, so workers are started
+with ``forkserver`` (``spawn`` where that is unavailable) instead of being
+forked from it. A pool whose worker died is replaced on the next submit.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, TypeVar
+
+PROCESS_WORKERS = int(os.getenv("PROCESS_WORKERS", os.getenv("HOTSPOT_WORKERS", str(os.cpu_count() or 1))))
+# Imported once in the fork server so each worker starts with them loaded
+PRELOAD_MODULES = ["hotspot_detection", "thumbnails"]
+
+T = TypeVar("T")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def parallel() -> bool:
+    return PROCESS_WORKERS > 1
+
+
+def _create() -> ProcessPoolExecutor:
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(PRELOAD_MODULES)
+    else:
+        context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=PROCESS_WORKERS, mp_context=context)
+
+
+def start() -> None:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = _create()
+
+
+def submit(func: Callable[..., T], *args) -> "Future[T]":
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = _create()
+        try:
+            return _pool.submit(func, *args)
+        except BrokenProcessPool:
+            # A worker was killed (e.g. out of memory); later jobs get a fresh pool
+            _pool.shutdown(wait=False)
+            _pool = _create()
+            return _pool.submit(func, *args)
+
+
+def shutdown() -> None:
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
@@ -0,0 +1,78 @@
+"""Read and write the per-job records artifact.
+
+The processing stage stores its records as a Parquet file with the job summary
+embedded in the schema metadata, so the report stage and the API can read the
+summary from the file footer without touching the rows. The Excel workbook is
+only produced on demand for users who download it.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SUMMARY_KEY = b"compliancedrone.summary"
+EMPTY_SUMMARY = {"total_files": 0, "anomalies_found": 0}
+
+
+def write_records(df: pd.DataFrame, summary: Dict[str, int], path: Path) -> Path:
+    """Write ``df`` to ``path`` as Parquet with ``summary`` in the schema metadata."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[SUMMARY_KEY] = json.dumps(summary).encode("utf-8")
+    table = table.replace_schema_metadata(metadata)
+
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_summary(path: Path) -> Dict[str, int]:
+    """Return the job summary for a records file (Parquet footer or legacy workbook)."""
+    try:
+        if path.suffix.lower() == ".xlsx":
+            summary = pd.read_excel(path, sheet_name="Summary").iloc[0].to_dict()
+            return {k: int(v) for k, v in summary.items() if isinstance(v, (int, float))}
+        metadata = pq.read_schema(path).metadata or {}
+        return json.loads(metadata[SUMMARY_KEY])
+    except Exception:
+        return dict(EMPTY_SUMMARY)
+
+
+def read_records(path: Path, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Load the records table, optionally only the given columns."""
+    if path.suffix.lower() == ".xlsx":
+        return pd.read_excel(path, sheet_name="Anomalies", usecols=columns)
+    return pd.read_parquet(path, columns=list(columns) if columns else None)
+
+
+def excel_is_current(records_path: Path, excel_path: Path) -> bool:
+    return excel_path.exists() and excel_path.stat().st_mtime >= records_path.stat().st_mtime
+
+
+def export_excel(records_path: Path, excel_path: Path) -> Path:
+    """Render the records file as an Excel workbook, reusing an up-to-date export."""
+    if excel_is_current(records_path, excel_path):
+        return excel_path
+
+    df = read_records(records_path)
+    summary = read_summary(records_path)
+    # Concurrent first downloads each render their own file; the last rename wins
+    tmp_path = excel_path.with_name(f".{excel_path.stem}.{uuid.uuid4().hex}{excel_path.suffix}")
+    try:
+        with pd.ExcelWriter(tmp_path) as writer:
+            df.to_excel(writer, index=False, sheet_name="Anomalies")
+            pd.DataFrame([summary]).to_excel(writer, index=False, sheet_name="Summary")
+        os.replace(tmp_path, excel_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return excel_path
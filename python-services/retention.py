@@ -0,0 +1,287 @@
+"""Disk-usage index and retention for job directories under ``OUTPUT_ROOT``.
+
+Each job's usage is kept in the ``job_storage`` table, split into raw uploads,
+intermediates (the ``annotated/`` staging used for the gallery) and final
+artifacts (records, summary, PDF, Excel and flight paths). A job is measured
+again only when the service writes into it (uploads stored, job finished,
+flight path or Excel generated), so the index stays current without walking
+the whole output tree; the janitor itself only measures jobs that have no row
+yet. Within a job each file counts once at its full size, however many
+hardlinks it has there (annotated copies count as uploads). Files held only
+by the dedupe store or the flight path cache are "shared" usage, a running
+total kept by ``shared_usage`` and reconciled against the disk every
+``SHARED_RECONCILE_SECONDS``. Content shared between jobs is counted in each
+of them, so totals err high rather than low.
+
+Every ``RETENTION_INTERVAL_SECONDS`` the janitor applies the retention
+policies to finished jobs, oldest first. All of them are off by default:
+
+- ``RETENTION_FINAL_ONLY_HOURS``: drop uploads and intermediates once a job
+  is this old, keeping its final artifacts.
+- ``STORAGE_MAX_BYTES``: while the indexed total is above this, drop uploads
+  and intermediates, then whole jobs. Since the total errs high, whole jobs
+  are only deleted while the volume really holds more than this too.
+- ``RETENTION_MAX_AGE_DAYS``: delete whole jobs older than this.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from db import advisory_lock, record_storage, retention_candidates, storage_usage, unindexed_jobs
+import flight_cache
+from dedupe import STORE_DIR, load_upload_index, release_from_store
+from engine import EXCEL_NAME, METADATA_NAME, PDF_NAME, RECORDS_NAME
+from shared_usage import adjust_shared, measured_at, save_shared, shared_bytes
+from upload_sessions import prune_expired
+
+OUTPUT_DIR = Path(os.getenv("OUTPUT_ROOT", "/app/outputs"))
+# Flight path uploads arrive before we know which job they belong to
+INCOMING_DIR = OUTPUT_DIR / ".incoming"
+RETENTION_INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS", "900"))
+RETENTION_FINAL_ONLY_HOURS = float(os.getenv("RETENTION_FINAL_ONLY_HOURS", "0"))
+RETENTION_MAX_AGE_DAYS = float(os.getenv("RETENTION_MAX_AGE_DAYS", "0"))
+STORAGE_MAX_BYTES = int(os.getenv("STORAGE_MAX_BYTES", "0"))
+# The running shared total is checked against a full walk this often
+SHARED_RECONCILE_SECONDS = float(os.getenv("SHARED_RECONCILE_SECONDS", str(24 * 3600)))
+# Staged flight path uploads older than this were left behind by a failed request
+INCOMING_TTL_SECONDS = 24 * 3600
+# Only one replica runs a pass at a time
+JANITOR_LOCK_KEY = 0x6A616E69746F72
+
+UPLOADS = "uploads"
+INTERMEDIATE = "intermediate"
+FINAL = "final"
+FINAL_NAMES = {RECORDS_NAME, METADATA_NAME, PDF_NAME, EXCEL_NAME, "flight_paths"}
+INTERMEDIATE_NAMES = {"annotated"}
+# Hardlinks between categories are charged to the first one measured
+MEASURE_ORDER = {UPLOADS: 0, FINAL: 1, INTERMEDIATE: 2}
+
+logger = logging.getLogger(__name__)
+
+Usage = Dict[str, int]
+
+
+def category(name: str) -> str:
+    """Category of a top-level entry in a job directory."""
+    if name in FINAL_NAMES:
+        return FINAL
+    if name in INTERMEDIATE_NAMES:
+        return INTERMEDIATE
+    return UPLOADS
+
+
+def _entry_bytes(entry: os.DirEntry, seen: Set[Tuple[int, int]]) -> int:
+    """Size of a file or tree, counting each inode not already in ``seen`` once."""
+    try:
+        if entry.is_dir(follow_symlinks=False):
+            with os.scandir(entry.path) as children:
+                return sum(_entry_bytes(child, seen) for child in children)
+        if entry.is_file(follow_symlinks=False):
+            stat = entry.stat(follow_symlinks=False)
+            inode = (stat.st_dev, stat.st_ino)
+            if inode in seen:
+                return 0
+            seen.add(inode)
+            return stat.st_size
+    except OSError:
+        pass
+    return 0
+
+
+def measure(job_dir: Path) -> Usage:
+    usage = {UPLOADS: 0, INTERMEDIATE: 0, FINAL: 0}
+    seen: Set[Tuple[int, int]] = set()
+    try:
+        with os.scandir(job_dir) as entries:
+            ordered = sorted(entries, key=lambda entry: MEASURE_ORDER[category(entry.name)])
+    except FileNotFoundError:
+        return usage
+    for entry in ordered:
+        usage[category(entry.name)] += _entry_bytes(entry, seen)
+    return usage
+
+
+def _unlinked_bytes(path: str) -> int:
+    total = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    total += _unlinked_bytes(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    # Files still linked into a job are already counted there
+                    if stat.st_nlink == 1:
+                        total += stat.st_size
+    except OSError:
+        pass
+    return total
+
+
+def measure_shared() -> int:
+    """Bytes held only by the dedupe store and the flight path cache."""
+    roots = {root for root in (STORE_DIR, flight_cache.CACHE_DIR) if root is not None}
+    return sum(_unlinked_bytes(str(root)) for root in roots)
+
+
+def _record(job_id: str, usage: Usage, retention: Optional[str] = None) -> None:
+    record_storage(job_id, usage[UPLOADS], usage[INTERMEDIATE], usage[FINAL], retention)
+
+
+def account(job_id: str) -> Optional[Usage]:
+    """Measure one job directory into the index; errors are logged, not raised."""
+    try:
+        usage = measure(OUTPUT_DIR / job_id)
+        _record(job_id, usage)
+    except Exception:
+        logger.exception("Could not update disk usage for %s", job_id)
+        return None
+    return usage
+
+
+def _release_uploads(digests) -> None:
+    # Pruned uploads only free space once the dedupe store lets go of them too
+    for digest in digests:
+        release_from_store(digest)
+
+
+def prune_to_final(job_dir: Path) -> None:
+    """Remove a job's uploads and intermediates, keeping its final artifacts."""
+    digests = set(load_upload_index(job_dir).values())
+    try:
+        entries = list(os.scandir(job_dir))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if category(entry.name) == FINAL:
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+    _release_uploads(digests)
+
+
+def _cache_linked_bytes(job_dir: Path) -> int:
+    """Flight path artifacts the cache will be left holding alone once ``job_dir`` goes."""
+    total = 0
+    try:
+        with os.scandir(job_dir / "flight_paths") as entries:
+            for entry in entries:
+                stat = entry.stat(follow_symlinks=False)
+                if entry.is_file(follow_symlinks=False) and stat.st_nlink == 2:
+                    total += stat.st_size
+    except OSError:
+        pass
+    return total
+
+
+def remove_job(job_dir: Path) -> None:
+    digests = set(load_upload_index(job_dir).values())
+    orphaned = _cache_linked_bytes(job_dir) if flight_cache.CACHE_ENABLED else 0
+    shutil.rmtree(job_dir, ignore_errors=True)
+    adjust_shared(orphaned)
+    _release_uploads(digests)
+
+
+def prune_incoming(now: Optional[float] = None) -> None:
+    now = time.time() if now is None else now
+    try:
+        entries = list(os.scandir(INCOMING_DIR))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if now - entry.stat(follow_symlinks=False).st_mtime > INCOMING_TTL_SECONDS:
+                os.unlink(entry.path)
+        except OSError:
+            continue
+
+
+def _total(usage: Dict[str, object]) -> int:
+    return int(usage["upload_bytes"]) + int(usage["intermediate_bytes"]) + int(usage["final_bytes"])
+
+
+def _shrink(row: Dict[str, object], delete: bool) -> int:
+    """Prune (or delete) one job and update its index row; returns bytes freed."""
+    job_dir = OUTPUT_DIR / row["job_id"]
+    before = _total(row)
+    if delete:
+        remove_job(job_dir)
+    else:
+        prune_to_final(job_dir)
+    usage = measure(job_dir)
+    retention = "deleted" if delete else "final"
+    _record(row["job_id"], usage, retention)
+    row.update(
+        retention=retention,
+        upload_bytes=usage[UPLOADS],
+        intermediate_bytes=usage[INTERMEDIATE],
+        final_bytes=usage[FINAL],
+    )
+    return before - _total(row)
+
+
+def _disk_used() -> int:
+    try:
+        return shutil.disk_usage(OUTPUT_DIR).used
+    except OSError:
+        # Unknown: keep whole jobs rather than risk deleting them for nothing
+        return 0
+
+
+def apply_policies() -> None:
+    """Shrink finished jobs, oldest first, until every configured policy holds."""
+    candidates = retention_candidates()
+    total = _total(storage_usage()) + shared_bytes()
+    for row in candidates:
+        age = float(row["age_seconds"])
+        if RETENTION_MAX_AGE_DAYS and age > RETENTION_MAX_AGE_DAYS * 86400:
+            total -= _shrink(row, delete=True)
+        elif row["retention"] == "full" and RETENTION_FINAL_ONLY_HOURS and age > RETENTION_FINAL_ONLY_HOURS * 3600:
+            total -= _shrink(row, delete=False)
+
+    if not STORAGE_MAX_BYTES:
+        return
+    # Uploads and intermediates of every finished job go before any final artifact
+    for delete in (False, True):
+        for row in candidates:
+            if total <= STORAGE_MAX_BYTES:
+                return
+            if delete and _disk_used() <= STORAGE_MAX_BYTES:
+                return
+            if row["retention"] != "deleted" and (delete or row["retention"] == "full"):
+                total -= _shrink(row, delete)
+
+
+def run_once() -> None:
+    """One janitor pass; skipped if another replica holds the lock."""
+    with advisory_lock(JANITOR_LOCK_KEY) as acquired:
+        if not acquired:
+            return
+        prune_expired()
+        prune_incoming()
+        for job_id in unindexed_jobs():
+            account(job_id)
+        if time.time() - measured_at() >= SHARED_RECONCILE_SECONDS:
+            save_shared(measure_shared())
+        apply_policies()
+
+
+def run_janitor(stop: threading.Event, interval: float = RETENTION_INTERVAL_SECONDS) -> None:
+    while not stop.is_set():
+        try:
+            run_once()
+        except Exception:
+            logger.exception("Storage janitor pass failed")
+        stop.wait(interval)
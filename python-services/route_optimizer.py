@@ -0,0 +1,289 @@
+"""Visiting order for targeted re-inspection flights.
+
+Targets (the ``Latitude``/``Longitude`` columns of a findings spreadsheet) are
+projected to a local metric plane and bucketed into a uniform grid. The grid
+provides each target's nearest neighbours, which seed a nearest-neighbour tour
+and bound the 2-opt and Or-opt improvement passes to moves between nearby
+points, so a few thousand targets are ordered in well under a second and tens
+of thousands in a few seconds.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from coverage_planner import LocalFrame
+
+NEIGHBOURS = int(os.getenv("ROUTE_NEIGHBOURS", "8"))
+OR_OPT_MAX_SEGMENT = 3
+LATITUDE_COLUMN = os.getenv("COLUMN_LATITUDE", "Latitude")
+LONGITUDE_COLUMN = os.getenv("COLUMN_LONGITUDE", "Longitude")
+
+EPSILON = 1e-9
+
+
+def load_targets(path: Path) -> np.ndarray:
+    """Read target coordinates from a CSV, Excel or Parquet findings file as ``(N, 2)`` lon/lat."""
+    suffix = path.suffix.lower()
+    columns = [LONGITUDE_COLUMN, LATITUDE_COLUMN]
+    if suffix == ".parquet":
+        frame = pd.read_parquet(path, columns=columns)
+    elif suffix in (".xlsx", ".xls"):
+        frame = pd.read_excel(path, usecols=columns)
+    else:
+        frame = pd.read_csv(path, usecols=columns, encoding=os.getenv("CSV_ENCODING", "utf-8"))
+    coords = frame[columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    return coords[np.isfinite(coords).all(axis=1)]
+
+
+class _Grid:
+    """Uniform bucket grid over planar points."""
+
+    def __init__(self, xy: np.ndarray, per_cell: float = 2.0) -> None:
+        lo = xy.min(axis=0)
+        extent = np.maximum(xy.max(axis=0) - lo, EPSILON)
+        self.size = max(math.sqrt(float(extent[0] * extent[1]) * per_cell / len(xy)), float(extent.max()) / 4096, EPSILON)
+        self.lo = lo
+        self.cells = np.floor((xy - lo) / self.size).astype(np.int64)
+        self.buckets: Dict[Tuple[int, int], List[int]] = {}
+        for index, (cx, cy) in enumerate(self.cells.tolist()):
+            self.buckets.setdefault((cx, cy), []).append(index)
+        self.max_ring = int(self.cells.max()) + 1
+
+    def ring(self, cx: int, cy: int, r: int) -> List[Tuple[int, int]]:
+        if r == 0:
+            return [(cx, cy)]
+        keys = [(cx + dx, cy + dy) for dx in range(-r, r + 1) for dy in (-r, r)]
+        keys += [(cx + dx, cy + dy) for dx in (-r, r) for dy in range(-r + 1, r)]
+        return keys
+
+
+def neighbour_lists(xy: np.ndarray, k: int = NEIGHBOURS) -> np.ndarray:
+    """Return the ``k`` nearest other points of every point, nearest first."""
+    n = len(xy)
+    k = min(k, n - 1)
+    grid = _Grid(xy)
+    result = np.empty((n, k), dtype=np.int64)
+    for (cx, cy), members in grid.buckets.items():
+        members_arr = np.array(members)
+        candidates = list(members)
+        r = 0
+        # Widen until the surrounding rings hold enough candidates; the lists only
+        # steer the improvement moves, so they need not be exact
+        while len(candidates) <= k or r == 0:
+            r += 1
+            if r > grid.max_ring:
+                break
+            for key in grid.ring(cx, cy, r):
+                candidates.extend(grid.buckets.get(key, ()))
+        cand = np.array(candidates)
+        d = np.hypot(xy[members_arr, None, 0] - xy[None, cand, 0], xy[members_arr, None, 1] - xy[None, cand, 1])
+        d[cand[None, :] == members_arr[:, None]] = np.inf
+        if len(cand) - 1 > k:
+            nearest = np.argpartition(d, k, axis=1)[:, :k]
+        else:
+            nearest = np.argsort(d, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(d, nearest, axis=1), axis=1)
+        result[members_arr] = cand[np.take_along_axis(nearest, order, axis=1)]
+    return result
+
+
+def nearest_neighbour_tour(xy: np.ndarray, neighbours: np.ndarray, start: int = 0) -> List[int]:
+    """Greedy tour: always fly to the closest unvisited target."""
+    n = len(xy)
+    grid = _Grid(xy)
+    remaining = {key: set(members) for key, members in grid.buckets.items()}
+    cells = grid.cells.tolist()
+    xs, ys = xy[:, 0].tolist(), xy[:, 1].tolist()
+    visited = [False] * n
+
+    tour = [start]
+    visited[start] = True
+    remaining[tuple(cells[start])].discard(start)
+    current = start
+    for _ in range(n - 1):
+        nxt = next((int(j) for j in neighbours[current] if not visited[j]), -1)
+        if nxt < 0:
+            # All listed neighbours are taken: widen the search over the grid
+            cx, cy = cells[current]
+            best, best_d = -1, math.inf
+            for r in range(grid.max_ring + 1):
+                if best >= 0 and best_d <= (r - 1) * grid.size:
+                    break
+                for key in grid.ring(cx, cy, r):
+                    for j in remaining.get(key, ()):
+                        d = math.hypot(xs[j] - xs[current], ys[j] - ys[current])
+                        if d < best_d:
+                            best, best_d = j, d
+            nxt = best
+        visited[nxt] = True
+        remaining[tuple(cells[nxt])].discard(nxt)
+        tour.append(nxt)
+        current = nxt
+    return tour
+
+
+class _Tour:
+    """Closed tour stored as an array with an inverse position index."""
+
+    def __init__(self, order: Sequence[int]) -> None:
+        self.order = np.asarray(order, dtype=np.int64)
+        self.n = len(self.order)
+        self.pos = np.empty(self.n, dtype=np.int64)
+        self.pos[self.order] = np.arange(self.n)
+
+    def succ(self, city: int) -> int:
+        return int(self.order[(self.pos[city] + 1) % self.n])
+
+    def pred(self, city: int) -> int:
+        return int(self.order[self.pos[city] - 1])
+
+    def reverse(self, first: int, last: int) -> None:
+        """Reverse the tour from city ``first`` forward to city ``last``."""
+        i, j = int(self.pos[first]), int(self.pos[last])
+        length = (j - i) % self.n + 1
+        if 2 * length > self.n:
+            # Reversing the complement gives the same cycle and touches fewer cities
+            i, j = (j + 1) % self.n, (i - 1) % self.n
+            length = self.n - length
+        if length < 2:
+            return
+        idx = (i + np.arange(length)) % self.n
+        cities = self.order[idx][::-1]
+        self.order[idx] = cities
+        self.pos[cities] = idx
+
+    def move_segment(self, first: int, last: int, after: int, flip: bool) -> None:
+        """Move the segment ``first``..``last`` to follow ``after``, optionally reversed."""
+        i, j = int(self.pos[first]), int(self.pos[last])
+        length = (j - i) % self.n + 1
+        rotated = np.roll(self.order, -i)
+        segment, rest = rotated[:length], rotated[length:]
+        if flip:
+            segment = segment[::-1]
+        k = int(np.flatnonzero(rest == after)[0]) + 1
+        self.order = np.concatenate((rest[:k], segment, rest[k:]))
+        self.pos[self.order] = np.arange(self.n)
+
+
+def improve_tour(xy: np.ndarray, order: Sequence[int], neighbours: np.ndarray, max_passes: int = 50) -> List[int]:
+    """Apply neighbour-list 2-opt and Or-opt moves until no improving move remains."""
+    n = len(order)
+    if n < 5:
+        return list(order)
+    xs, ys = xy[:, 0].tolist(), xy[:, 1].tolist()
+    neigh = neighbours.tolist()
+    tour = _Tour(order)
+
+    def dist(a: int, b: int) -> float:
+        return math.hypot(xs[a] - xs[b], ys[a] - ys[b])
+
+    def two_opt(a: int) -> Optional[Tuple[int, ...]]:
+        for forward in (True, False):
+            b = tour.succ(a) if forward else tour.pred(a)
+            d_ab = dist(a, b)
+            for c in neigh[a]:
+                d_ac = dist(a, c)
+                if d_ac >= d_ab:
+                    break
+                d = tour.succ(c) if forward else tour.pred(c)
+                if c == b or d == a:
+                    continue
+                if d_ac + dist(b, d) - d_ab - dist(c, d) < -EPSILON:
+                    if forward:
+                        tour.reverse(b, c)
+                    else:
+                        tour.reverse(a, d)
+                    return a, b, c, d
+        return None
+
+    def or_opt(a: int) -> Optional[Tuple[int, ...]]:
+        for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+            first, last = a, a
+            for _ in range(length - 1):
+                last = tour.succ(last)
+            p, q = tour.pred(first), tour.succ(last)
+            if q == first or p == last or p == q:
+                return None
+            segment = {first, last}
+            node = first
+            while node != last:
+                node = tour.succ(node)
+                segment.add(node)
+            removal_gain = dist(p, first) + dist(last, q) - dist(p, q)
+            if removal_gain <= EPSILON:
+                continue
+            for end, other in ((first, last), (last, first)):
+                for c in neigh[end]:
+                    if c in segment:
+                        continue
+                    for e in (tour.succ(c), tour.pred(c)):
+                        if e in segment:
+                            continue
+                        # Insert between c and e with ``end`` joined to c
+                        added = dist(c, end) + dist(other, e) - dist(c, e)
+                        if added - removal_gain < -EPSILON:
+                            after = c if e == tour.succ(c) else e
+                            # Orientation after insertion must read after -> ... -> succ(after)
+                            flip = (after == c) != (end == first)
+                            tour.move_segment(first, last, after, flip)
+                            return p, q, first, last, c, e
+        return None
+
+    queue = deque(range(n))
+    queued = [True] * n
+    budget = max_passes * n
+    while queue and budget > 0:
+        budget -= 1
+        a = queue.popleft()
+        queued[a] = False
+        touched = two_opt(a) or or_opt(a)
+        if touched:
+            for city in touched:
+                if not queued[city]:
+                    queued[city] = True
+                    queue.append(city)
+    return tour.order.tolist()
+
+
+def tour_length(xy: np.ndarray, order: Sequence[int], closed: bool = False) -> float:
+    path = xy[list(order)]
+    if closed:
+        path = np.vstack((path, path[:1]))
+    return float(np.hypot(*np.diff(path, axis=0).T).sum())
+
+
+def order_targets(
+    targets: np.ndarray, start: Optional[Tuple[float, float]] = None
+) -> np.ndarray:
+    """Return the indices of ``targets`` (lon/lat) in a short visiting order.
+
+    The tour is optimised as a closed loop and then opened: at the target
+    nearest ``start`` when a launch point is given, otherwise across its
+    longest leg.
+    """
+    n = len(targets)
+    if n < 3:
+        return np.arange(n)
+    frame = LocalFrame(float(targets[:, 0].mean()), float(targets[:, 1].mean()))
+    xy = frame.to_xy(targets)
+    neighbours = neighbour_lists(xy)
+    order = np.array(improve_tour(xy, nearest_neighbour_tour(xy, neighbours), neighbours))
+
+    if start is not None:
+        home = frame.to_xy(np.array([start], dtype=np.float64))[0]
+        first = int(np.argmin(np.hypot(*(xy - home).T)))
+        order = np.roll(order, -int(np.flatnonzero(order == first)[0]))
+        # Fly the direction whose final leg ends closer to home
+        if np.hypot(*(xy[order[1]] - home)) < np.hypot(*(xy[order[-1]] - home)):
+            order = np.concatenate((order[:1], order[:0:-1]))
+        return order
+    legs = np.hypot(*(xy[np.roll(order, -1)] - xy[order]).T)
+    return np.roll(order, -(int(np.argmax(legs)) + 1))
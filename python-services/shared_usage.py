@@ -0,0 +1,83 @@
+"""Running total of the bytes held only by the dedupe store and flight cache.
+
+Files still linked into a job are counted in that job's usage, so this total
+covers the rest: cached analyses, cache manifests, and cached artifacts whose
+jobs are gone. It is adjusted wherever those files are added, linked into a
+job, orphaned or removed, and kept in ``OUTPUT_ROOT/.storage.json`` under a
+file lock so every worker and replica updates the same figure. The janitor
+re-walks the store and cache only every ``SHARED_RECONCILE_SECONDS`` to
+correct any drift.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator
+
+USAGE_PATH = Path(os.getenv("OUTPUT_ROOT", "/app/outputs")) / ".storage.json"
+LOCK_PATH = USAGE_PATH.with_name(f"{USAGE_PATH.name}.lock")
+
+
+@contextmanager
+def _locked() -> Iterator[None]:
+    with LOCK_PATH.open("a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _load() -> Dict[str, float]:
+    try:
+        state = json.loads(USAGE_PATH.read_text())
+        return {"shared_bytes": int(state["shared_bytes"]), "measured_at": float(state["measured_at"])}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {"shared_bytes": 0, "measured_at": 0.0}
+
+
+def _save(state: Dict[str, float]) -> None:
+    tmp = USAGE_PATH.with_name(f"{USAGE_PATH.name}.{os.getpid()}")
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, USAGE_PATH)
+
+
+def shared_bytes() -> int:
+    return int(_load()["shared_bytes"])
+
+
+def measured_at() -> float:
+    """When the total was last reconciled against the disk; 0 if never."""
+    return _load()["measured_at"]
+
+
+def adjust_shared(delta: int) -> None:
+    """Add ``delta`` bytes to the total; errors are ignored, reconciling fixes them."""
+    if not delta:
+        return
+    try:
+        USAGE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with _locked():
+            state = _load()
+            state["shared_bytes"] = max(0, int(state["shared_bytes"]) + delta)
+            _save(state)
+    except OSError:
+        pass
+
+
+def save_shared(total: int) -> None:
+    """Replace the total with a fresh measurement."""
+    USAGE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with _locked():
+        _save({"shared_bytes": total, "measured_at": time.time()})
+
+
+def unlinked_size(path: Path) -> int:
+    """Size of ``path`` if nothing but the store or cache links to it, else 0."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return 0
+    return stat.st_size if stat.st_nlink == 1 else 0
@@ -0,0 +1,67 @@
+"""Serialized job status payloads with ETags, cached once a job is finished.
+
+Completed and failed jobs never change again, so their status body is kept in
+a small in-process LRU (``JOB_STATUS_CACHE_SIZE`` entries) and repeat polls
+for them are answered without touching Postgres. Every payload carries a
+strong ETag derived from its bytes so clients can revalidate with
+``If-None-Match`` and receive ``304 Not Modified``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+JOB_STATUS_CACHE_SIZE = int(os.getenv("JOB_STATUS_CACHE_SIZE", "4096"))
+FINISHED_STATUSES = ("completed", "failed")
+
+
+class StatusPayload(NamedTuple):
+    body: bytes
+    etag: str
+    finished: bool
+
+
+def build_payload(status: Dict[str, object]) -> StatusPayload:
+    body = json.dumps(jsonable_encoder(status), separators=(",", ":")).encode("utf-8")
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    finished = status["job"]["status"] in FINISHED_STATUSES
+    return StatusPayload(body, etag, finished)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    # If-None-Match uses weak comparison
+    return "*" in candidates or etag in (value[2:] if value.startswith("W/") else value for value in candidates)
+
+
+class StatusCache:
+    """LRU of finished jobs' status payloads, keyed by job id."""
+
+    def __init__(self, max_entries: int = JOB_STATUS_CACHE_SIZE) -> None:
+        self._entries: "OrderedDict[str, StatusPayload]" = OrderedDict()
+        self._max_entries = max_entries
+
+    def get(self, job_id: str) -> Optional[StatusPayload]:
+        payload = self._entries.get(job_id)
+        if payload is not None:
+            self._entries.move_to_end(job_id)
+        return payload
+
+    def put(self, job_id: str, payload: StatusPayload) -> None:
+        if not payload.finished or self._max_entries <= 0:
+            return
+        self._entries[job_id] = payload
+        self._entries.move_to_end(job_id)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, job_id: str) -> None:
+        self._entries.pop(job_id, None)
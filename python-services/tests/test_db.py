@@ -0,0 +1,121 @@
+"""Connection pool tests against a real Postgres.
+
+Run with ``DATABASE_URL`` pointing at a disposable database, e.g.
+``DATABASE_URL=postgresql://postgres@localhost/postgres pytest tests``.
+Skipped when it is unset.
+"""
+
+import os
+import time
+import uuid
+
+import pytest
+
+if not os.getenv("DATABASE_URL"):
+    pytest.skip("DATABASE_URL is not set", allow_module_level=True)
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.pool import PoolError
+
+import db
+
+
+@pytest.fixture
+def pool():
+    pool = db.ConnectionPool(db.DATABASE_URL, 1, 2)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def table():
+    name = f"pool_test_{uuid.uuid4().hex[:8]}"
+    with db.transaction() as cur:
+        cur.execute(sql.SQL("CREATE TABLE {} (value integer)").format(sql.Identifier(name)))
+    yield name
+    with db.transaction() as cur:
+        cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(name)))
+    db.close_pool()
+
+
+def _backend_pid(conn) -> int:
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_backend_pid() AS pid")
+        pid = cur.fetchone()["pid"]
+    conn.rollback()
+    return pid
+
+
+def _terminate(pid: int) -> None:
+    admin = psycopg2.connect(db.DATABASE_URL)
+    try:
+        admin.autocommit = True
+        with admin.cursor() as cur:
+            cur.execute("SELECT pg_terminate_backend(%s)", (pid,))
+    finally:
+        admin.close()
+
+
+def _values(table: str):
+    with db.transaction() as cur:
+        cur.execute(sql.SQL("SELECT value FROM {} ORDER BY value").format(sql.Identifier(table)))
+        return [row["value"] for row in cur.fetchall()]
+
+
+def test_exhausted_pool_waits_then_times_out(pool):
+    first = pool.getconn()
+    second = pool.getconn()
+    assert pool.in_use == 2
+
+    started = time.monotonic()
+    with pytest.raises(PoolError):
+        pool.getconn(timeout=0.2)
+    assert time.monotonic() - started >= 0.2
+
+    pool.putconn(second)
+    third = pool.getconn(timeout=0.2)
+    assert pool.in_use == 2
+    pool.putconn(first)
+    pool.putconn(third)
+    assert pool.in_use == 0
+
+
+def test_dead_connection_is_replaced(pool, monkeypatch):
+    conn = pool.getconn()
+    pid = _backend_pid(conn)
+    pool.putconn(conn)
+    _terminate(pid)
+
+    # Probe every connection, however recently it was used
+    monkeypatch.setattr(db, "DB_HEALTHCHECK_SECONDS", 0)
+    conn = pool.getconn()
+    try:
+        assert not conn.closed
+        assert _backend_pid(conn) != pid
+    finally:
+        pool.putconn(conn)
+
+
+def test_transaction_commits(table):
+    with db.transaction() as cur:
+        cur.execute(sql.SQL("INSERT INTO {} VALUES (1), (2)").format(sql.Identifier(table)))
+    assert _values(table) == [1, 2]
+
+
+def test_transaction_rolls_back_on_error(table):
+    with pytest.raises(RuntimeError):
+        with db.transaction() as cur:
+            cur.execute(sql.SQL("INSERT INTO {} VALUES (1)").format(sql.Identifier(table)))
+            raise RuntimeError("boom")
+    assert _values(table) == []
+    assert db.get_pool().in_use == 0
+
+
+def test_transaction_discards_broken_connection(table):
+    with pytest.raises(psycopg2.OperationalError):
+        with db.transaction() as cur:
+            cur.execute("SELECT pg_terminate_backend(pg_backend_pid())")
+    assert db.get_pool().in_use == 0
+    # The next transaction gets a working connection
+    assert _values(table) == []
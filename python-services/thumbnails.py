@@ -0,0 +1,93 @@
+"""Thumbnail generation for the report gallery.
+
+Thumbnails are decoded at reduced size (``Image.draft`` lets the JPEG decoder
+skip most of the work), outlined with the detected hotspot box, saved as small
+JPEGs and cached on disk so re-rendering a report does not decode the images
+again. Generation runs on the shared process pool.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageDraw
+
+import process_pool
+
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "160"))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "60"))
+CACHE_DIR_NAME = ".thumbnails"
+
+Box = Tuple[int, int, int, int]
+
+
+def parse_bbox(value: object) -> Optional[Box]:
+    """Parse the ``hotspot_bbox`` record column ("x0,y0,x1,y1") into a tuple."""
+    try:
+        x0, y0, x1, y1 = (int(float(part)) for part in str(value).split(","))
+    except ValueError:
+        return None
+    return x0, y0, x1, y1
+
+
+def _cache_path(source: Path, cache_dir: Path, bbox: Optional[Box]) -> Path:
+    stat = source.stat()
+    key = f"{source.name}:{stat.st_size}:{stat.st_mtime_ns}:{bbox}:{THUMBNAIL_SIZE}:{THUMBNAIL_QUALITY}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return cache_dir / f"{source.stem}-{digest}.jpg"
+
+
+def make_thumbnail(source: Path, cache_dir: Path, bbox: Optional[Box] = None) -> Optional[Path]:
+    """Return a cached JPEG thumbnail of ``source``, creating it if needed."""
+    try:
+        target = _cache_path(source, cache_dir, bbox)
+        if target.exists():
+            return target
+
+        with Image.open(source) as img:
+            original_width, original_height = img.size
+            img.draft("RGB", (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            thumb = img.convert("RGB")
+        thumb.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+
+        if bbox:
+            sx = thumb.width / original_width
+            sy = thumb.height / original_height
+            x0, y0, x1, y1 = bbox
+            ImageDraw.Draw(thumb).rectangle(
+                (x0 * sx - 2, y0 * sy - 2, x1 * sx + 2, y1 * sy + 2), outline=(0, 255, 255), width=2
+            )
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{os.getpid()}")
+        thumb.save(tmp, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+        os.replace(tmp, target)
+        return target
+    except Exception:
+        return None
+
+
+def _make_thumbnails(jobs: List[Tuple[Path, Path, Optional[Box]]]) -> List[Optional[Path]]:
+    return [make_thumbnail(*job) for job in jobs]
+
+
+def build_thumbnails(
+    items: Sequence[Tuple[Path, Optional[Box]]], cache_dir: Path
+) -> List[Optional[Path]]:
+    """Create thumbnails for ``(source, bbox)`` pairs, in input order.
+
+    Entries that cannot be decoded come back as ``None``.
+    """
+    jobs = [(source, cache_dir, bbox) for source, bbox in items]
+    if not process_pool.parallel() or len(jobs) < 2:
+        return _make_thumbnails(jobs)
+    chunk = max(1, len(jobs) // (process_pool.PROCESS_WORKERS * 4))
+    futures = [process_pool.submit(_make_thumbnails, jobs[start:start + chunk]) for start in range(0, len(jobs), chunk)]
+    try:
+        return [path for future in futures for path in future.result()]
+    finally:
+        for future in futures:
+            future.cancel()
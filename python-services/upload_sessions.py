@@ -0,0 +1,357 @@
+"""Resumable upload sessions for large flight datasets.
+
+A session is created with the list of files to upload. Each file is
+preallocated under ``OUTPUT_ROOT/.sessions/<upload_id>/`` and chunks are
+written in place at their offsets with ``os.pwrite``, so they can arrive in
+any order, in parallel, and be retried after a dropped connection. A chunk's
+range is appended to a per-file log of received byte ranges only once the
+whole chunk has arrived and verified; the log survives restarts and clients
+query it to send only what is missing. Bytes inside a logged range are never
+written again, and chunks overlapping one still in flight wait for it, so a
+failed or corrupt retry cannot damage data already received. Finalizing
+hashes each file once and hands it over to be renamed into a job directory,
+so the data is never copied.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+
+from dedupe import hash_file
+from metrics import BYTES_UPLOADED
+from uploads import (
+    UPLOAD_MAX_FILE_BYTES,
+    UPLOAD_MAX_FILES,
+    UPLOAD_MAX_JOB_BYTES,
+    WRITE_BUFFER_BYTES,
+    StagedUpload,
+    safe_filename,
+    unique_name,
+)
+
+SESSIONS_DIR = Path(os.getenv("OUTPUT_ROOT", "/app/outputs")) / ".sessions"
+UPLOAD_SESSION_TTL_SECONDS = float(os.getenv("UPLOAD_SESSION_TTL_HOURS", "72")) * 3600
+UPLOAD_MAX_CHUNK_BYTES = int(os.getenv("UPLOAD_MAX_CHUNK_BYTES", str(256 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(32 * 1024 * 1024)))
+MANIFEST_NAME = "session.json"
+FINALIZING_NAME = "finalizing"
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+Range = Tuple[int, int]
+
+# Byte ranges being written right now, per (upload_id, file index)
+_in_flight: Dict[Tuple[str, int], List[Range]] = {}
+_in_flight_changed = asyncio.Condition()
+
+
+class UploadFileSpec(BaseModel):
+    name: str
+    size: int = Field(ge=0)
+    sha256: Optional[str] = Field(default=None, pattern=r"^[0-9a-fA-F]{64}$")
+
+
+class UploadSessionRequest(BaseModel):
+    pilot_id: str = Field(min_length=1)
+    location: str = Field(min_length=1)
+    files: List[UploadFileSpec] = Field(min_length=1)
+
+
+def _session_dir(upload_id: str) -> Path:
+    session_dir = SESSIONS_DIR / upload_id
+    if not _UPLOAD_ID.match(upload_id) or not (session_dir / MANIFEST_NAME).is_file():
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session_dir
+
+
+def _data_path(session_dir: Path, index: int) -> Path:
+    return session_dir / f"file-{index}"
+
+
+def _log_path(session_dir: Path, index: int) -> Path:
+    return session_dir / f"file-{index}.ranges"
+
+
+def _load_manifest(session_dir: Path) -> Dict[str, object]:
+    return json.loads((session_dir / MANIFEST_NAME).read_text())
+
+
+def _merge(ranges: List[Range]) -> List[Range]:
+    merged: List[Range] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def received_ranges(session_dir: Path, index: int) -> List[Range]:
+    try:
+        lines = _log_path(session_dir, index).read_text().split()
+    except FileNotFoundError:
+        return []
+    # A torn final entry (crash mid-append) has an odd number of fields; drop it
+    values = [int(value) for value in lines[: len(lines) // 2 * 2]]
+    return _merge(list(zip(values[::2], values[1::2])))
+
+
+def _covered(ranges: List[Range], start: int, end: int) -> bool:
+    return any(first <= start and end <= last for first, last in ranges)
+
+
+def prune_expired(now: Optional[float] = None) -> None:
+    """Remove sessions that have seen no activity for the TTL."""
+    now = time.time() if now is None else now
+    try:
+        entries = list(os.scandir(SESSIONS_DIR))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir() and now - entry.stat().st_mtime > UPLOAD_SESSION_TTL_SECONDS:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except OSError:
+            continue
+
+
+def create_session(spec: UploadSessionRequest) -> Dict[str, object]:
+    if len(spec.files) > UPLOAD_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {UPLOAD_MAX_FILES} files can be uploaded at once")
+    too_big = [item.name for item in spec.files if item.size > UPLOAD_MAX_FILE_BYTES]
+    if too_big:
+        raise HTTPException(status_code=413, detail=f"{too_big[0]!r} exceeds the {UPLOAD_MAX_FILE_BYTES} byte file limit")
+    if sum(item.size for item in spec.files) > UPLOAD_MAX_JOB_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the {UPLOAD_MAX_JOB_BYTES} byte limit")
+
+    prune_expired()
+    upload_id = uuid.uuid4().hex
+    session_dir = SESSIONS_DIR / upload_id
+    session_dir.mkdir(parents=True)
+    taken: set = set()
+    files = []
+    try:
+        for index, item in enumerate(spec.files):
+            with _data_path(session_dir, index).open("wb") as handle:
+                # Reserve the space now so a full disk fails here, not at 90%
+                if item.size and hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(handle.fileno(), 0, item.size)
+                else:
+                    handle.truncate(item.size)
+            files.append({
+                "name": unique_name(safe_filename(item.name), taken),
+                "size": item.size,
+                "sha256": item.sha256.lower() if item.sha256 else None,
+            })
+    except OSError as exc:
+        shutil.rmtree(session_dir, ignore_errors=True)
+        raise HTTPException(status_code=507, detail="Not enough storage for this upload") from exc
+
+    manifest = {"pilot_id": spec.pilot_id, "location": spec.location, "files": files}
+    (session_dir / MANIFEST_NAME).write_text(json.dumps(manifest))
+    return session_status(upload_id)
+
+
+def session_status(upload_id: str) -> Dict[str, object]:
+    session_dir = _session_dir(upload_id)
+    manifest = _load_manifest(session_dir)
+    files = []
+    received_total = 0
+    for index, item in enumerate(manifest["files"]):
+        ranges = received_ranges(session_dir, index)
+        received = sum(end - start for start, end in ranges)
+        received_total += received
+        files.append({
+            "index": index,
+            "name": item["name"],
+            "size": item["size"],
+            "received": [list(span) for span in ranges],
+            "complete": received == item["size"],
+        })
+    return {
+        "upload_id": upload_id,
+        "status": "finalizing" if (session_dir / FINALIZING_NAME).exists() else "open",
+        "chunk_size": UPLOAD_CHUNK_BYTES,
+        "max_chunk_size": UPLOAD_MAX_CHUNK_BYTES,
+        "bytes_total": sum(item["size"] for item in manifest["files"]),
+        "bytes_received": received_total,
+        "expires_at": session_dir.stat().st_mtime + UPLOAD_SESSION_TTL_SECONDS,
+        "files": files,
+    }
+
+
+def _write_at(fd: int, data: bytes, position: int) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, position)
+        view = view[written:]
+        position += written
+
+
+def _gaps(ranges: List[Range], start: int, end: int) -> List[Range]:
+    """Parts of ``[start, end)`` not covered by the merged ``ranges``."""
+    gaps = []
+    for first, last in ranges:
+        if last <= start or first >= end:
+            continue
+        if first > start:
+            gaps.append((start, first))
+        start = max(start, last)
+    if start < end:
+        gaps.append((start, end))
+    return gaps
+
+
+def _write_missing(fd: int, digest, data: bytes, position: int, received: List[Range]) -> None:
+    """Hash ``data`` and write only the parts of it outside ``received``."""
+    digest.update(data)
+    for start, end in _gaps(received, position, position + len(data)):
+        _write_at(fd, data[start - position:end - position], start)
+
+
+@contextlib.asynccontextmanager
+async def _claim(key: Tuple[str, int], start: int, end: int) -> AsyncIterator[None]:
+    """Hold ``[start, end)`` of a file, waiting for overlapping chunks to finish."""
+    async with _in_flight_changed:
+        await _in_flight_changed.wait_for(
+            lambda: not any(first < end and start < last for first, last in _in_flight.get(key, ()))
+        )
+        _in_flight.setdefault(key, []).append((start, end))
+    try:
+        yield
+    finally:
+        async with _in_flight_changed:
+            _in_flight[key].remove((start, end))
+            if not _in_flight[key]:
+                del _in_flight[key]
+            _in_flight_changed.notify_all()
+
+
+async def write_chunk(
+    request: Request, upload_id: str, index: int, offset: int, checksum: Optional[str] = None
+) -> Dict[str, object]:
+    """Store the request body at ``offset`` of file ``index``.
+
+    Only bytes outside the ranges already received are written, and the
+    range is only recorded once the whole chunk has arrived and matched
+    ``checksum`` (hex sha256) when one is given, so a failed chunk is simply
+    sent again.
+    """
+    session_dir = _session_dir(upload_id)
+    if (session_dir / FINALIZING_NAME).exists():
+        raise HTTPException(status_code=409, detail="Upload session is being finalized")
+    files = (await run_in_threadpool(_load_manifest, session_dir))["files"]
+    if not 0 <= index < len(files):
+        raise HTTPException(status_code=404, detail="File not part of this upload")
+    declared = request.headers.get("content-length", "")
+    if not declared.isdigit():
+        raise HTTPException(status_code=411, detail="Chunks must be sent with a Content-Length")
+    length = int(declared)
+    if length > UPLOAD_MAX_CHUNK_BYTES:
+        raise HTTPException(status_code=413, detail=f"Chunks are limited to {UPLOAD_MAX_CHUNK_BYTES} bytes")
+    size = files[index]["size"]
+    if offset < 0 or offset + length > size:
+        raise HTTPException(status_code=416, detail=f"Chunk does not fit in the file's {size} bytes")
+
+    async with _claim((upload_id, index), offset, offset + length):
+        received_before = received_ranges(session_dir, index)
+        if not _covered(received_before, offset, offset + length):
+            digest = hashlib.sha256()
+            received = 0
+            position = offset
+            buffer = bytearray()
+            fd = await run_in_threadpool(os.open, _data_path(session_dir, index), os.O_WRONLY)
+            try:
+                async for data in request.stream():
+                    received += len(data)
+                    if received > length:
+                        raise HTTPException(status_code=400, detail="Chunk is longer than its Content-Length")
+                    buffer += data
+                    if len(buffer) >= WRITE_BUFFER_BYTES:
+                        chunk, buffer = bytes(buffer), bytearray()
+                        await run_in_threadpool(_write_missing, fd, digest, chunk, position, received_before)
+                        position += len(chunk)
+                if buffer:
+                    await run_in_threadpool(_write_missing, fd, digest, bytes(buffer), position, received_before)
+            finally:
+                os.close(fd)
+            if received != length:
+                raise HTTPException(status_code=400, detail="Chunk ended before its Content-Length")
+            if checksum and digest.hexdigest() != checksum.lower():
+                raise HTTPException(status_code=422, detail="Chunk checksum mismatch")
+            with _log_path(session_dir, index).open("a") as log:
+                log.write(f"{offset} {offset + length}\n")
+            os.utime(session_dir)
+            BYTES_UPLOADED.inc(length)
+
+    return await run_in_threadpool(session_status, upload_id)
+
+
+def session_pilot(upload_id: str) -> str:
+    return _load_manifest(_session_dir(upload_id))["pilot_id"]
+
+
+def begin_finalize(upload_id: str) -> Tuple[Dict[str, object], List[StagedUpload]]:
+    """Claim a complete session for finalizing and hash its files.
+
+    Returns the manifest and the files as staged uploads ready to be moved
+    into a job. Call ``release`` if the job cannot be created and
+    ``delete_session`` once it has.
+    """
+    session_dir = _session_dir(upload_id)
+    manifest = _load_manifest(session_dir)
+    incomplete = [
+        item["name"]
+        for index, item in enumerate(manifest["files"])
+        if sum(end - start for start, end in received_ranges(session_dir, index)) != item["size"]
+    ]
+    if incomplete:
+        raise HTTPException(status_code=409, detail={"message": "Upload is incomplete", "files": incomplete})
+    try:
+        os.close(os.open(session_dir / FINALIZING_NAME, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        raise HTTPException(status_code=409, detail="Upload session is already being finalized")
+
+    staged = []
+    corrupt = []
+    try:
+        for index, item in enumerate(manifest["files"]):
+            path = _data_path(session_dir, index)
+            digest = hash_file(path)
+            if item["sha256"] and digest != item["sha256"]:
+                corrupt.append(index)
+            staged.append(StagedUpload("files", item["name"], path, digest, item["size"]))
+        if corrupt:
+            # Make the client send those files again
+            for index in corrupt:
+                _log_path(session_dir, index).unlink(missing_ok=True)
+            raise HTTPException(
+                status_code=422,
+                detail={"message": "Checksum mismatch", "files": [manifest["files"][index]["name"] for index in corrupt]},
+            )
+    except BaseException:
+        release(upload_id)
+        raise
+    return manifest, staged
+
+
+def release(upload_id: str) -> None:
+    (SESSIONS_DIR / upload_id / FINALIZING_NAME).unlink(missing_ok=True)
+
+
+def delete_session(upload_id: str) -> None:
+    shutil.rmtree(_session_dir(upload_id), ignore_errors=True)
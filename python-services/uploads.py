@@ -0,0 +1,272 @@
+"""Streaming multipart uploads for the API service.
+
+Starlette's form parser spools every file part to a temporary file before the
+handler runs, so a multi-GB upload is written twice and can only be rejected
+once it has fully arrived. ``receive_multipart`` parses the request body as it
+streams in instead: file parts are hashed and written straight to a staging
+file in large chunks, with the disk writes handed to the threadpool, and the
+per-file and per-request limits are enforced the moment they are exceeded.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import unicodedata
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from metrics import BYTES_UPLOADED
+
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(8 * 1024 ** 3)))
+UPLOAD_MAX_JOB_BYTES = int(os.getenv("UPLOAD_MAX_JOB_BYTES", str(64 * 1024 ** 3)))
+UPLOAD_MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", "20000"))
+WRITE_BUFFER_BYTES = int(os.getenv("UPLOAD_WRITE_BUFFER_BYTES", str(8 * 1024 * 1024)))
+MAX_FIELD_BYTES = 64 * 1024
+MAX_NAME_BYTES = 255
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9._ -]+")
+
+
+class StagedUpload(NamedTuple):
+    field: str
+    name: str
+    path: Path
+    digest: str
+    size: int
+
+
+def safe_filename(name: str) -> str:
+    """Reduce a client-supplied filename to a safe relative path.
+
+    Directory components are kept (folder uploads send them) but anything that
+    could escape the target directory or hide the file is dropped.
+    """
+    parts = []
+    for part in re.split(r"[\\/]+", unicodedata.normalize("NFKC", name)):
+        part = _UNSAFE_CHARS.sub("_", part).strip().lstrip(".")
+        if not part:
+            continue
+        if len(part.encode("utf-8")) > MAX_NAME_BYTES:
+            stem, suffix = os.path.splitext(part)
+            part = stem[: MAX_NAME_BYTES - len(suffix)] + suffix
+        parts.append(part)
+    return "/".join(parts) or "upload"
+
+
+def unique_name(name: str, taken: Set[str]) -> str:
+    """Return ``name`` or a numbered variant of it that is not in ``taken``.
+
+    ``taken`` holds file names plus directory names with a trailing slash; a
+    name that would need an existing file as its directory is flattened.
+    """
+    parents = _parents(name)
+    if any(parent in taken for parent in parents):
+        name, parents = name.replace("/", "_"), []
+    candidate = name
+    stem, suffix = os.path.splitext(name)
+    counter = 1
+    while candidate in taken or f"{candidate}/" in taken:
+        candidate = f"{stem}-{counter}{suffix}"
+        counter += 1
+    taken.add(candidate)
+    taken.update(f"{parent}/" for parent in parents)
+    return candidate
+
+
+def _parents(name: str) -> List[str]:
+    parts = name.split("/")[:-1]
+    return ["/".join(parts[: depth + 1]) for depth in range(len(parts))]
+
+
+def _too_large(detail: str) -> HTTPException:
+    return HTTPException(status_code=413, detail=detail)
+
+
+class _FileSink:
+    """Hashes and writes one file part, buffering writes into large chunks."""
+
+    def __init__(self, field: str, filename: str, path: Path) -> None:
+        self.field = field
+        self.name = safe_filename(filename)
+        self.path = path
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._buffer = bytearray()
+        self._handle = None
+
+    async def open(self) -> None:
+        self._handle = await run_in_threadpool(self.path.open, "wb")
+
+    async def write(self, data: bytes) -> None:
+        self.size += len(data)
+        self._buffer += data
+        if len(self._buffer) >= WRITE_BUFFER_BYTES:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if self._buffer:
+            chunk, self._buffer = bytes(self._buffer), bytearray()
+            await run_in_threadpool(self._write_chunk, chunk)
+
+    def _write_chunk(self, chunk: bytes) -> None:
+        self._digest.update(chunk)
+        self._handle.write(chunk)
+        BYTES_UPLOADED.inc(len(chunk))
+
+    async def close(self) -> StagedUpload:
+        await self.flush()
+        await run_in_threadpool(self._handle.close)
+        return StagedUpload(self.field, self.name, self.path, self._digest.hexdigest(), self.size)
+
+    def discard(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+        self.path.unlink(missing_ok=True)
+
+
+class _MultipartReceiver:
+    def __init__(
+        self,
+        boundary: bytes,
+        staging_dir: Path,
+        max_file_bytes: int,
+        max_files: int,
+        on_first_file: Optional[Callable[[Dict[str, str]], None]] = None,
+    ) -> None:
+        self._staging_dir = staging_dir
+        self._on_first_file = on_first_file
+        self._max_file_bytes = max_file_bytes
+        self._max_files = max_files
+        self._events: List[Tuple[str, bytes]] = []
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": lambda: self._events.append(("part_begin", b"")),
+            "on_header_field": lambda data, start, end: self._events.append(("header_field", data[start:end])),
+            "on_header_value": lambda data, start, end: self._events.append(("header_value", data[start:end])),
+            "on_header_end": lambda: self._events.append(("header_end", b"")),
+            "on_headers_finished": lambda: self._events.append(("headers_finished", b"")),
+            "on_part_data": lambda data, start, end: self._events.append(("part_data", data[start:end])),
+            "on_part_end": lambda: self._events.append(("part_end", b"")),
+        })
+        self._header_field = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._field_name = ""
+        self._field_value = bytearray()
+        self._sink: Optional[_FileSink] = None
+        self.fields: Dict[str, str] = {}
+        self.files: List[StagedUpload] = []
+
+    async def feed(self, chunk: bytes) -> None:
+        try:
+            self._parser.write(chunk)
+        except MultipartParseError as exc:
+            raise HTTPException(status_code=400, detail="Malformed multipart body") from exc
+        events, self._events = self._events, []
+        for kind, data in events:
+            if kind == "part_begin":
+                self._header_field = self._header_value = self._disposition = b""
+            elif kind == "header_field":
+                self._header_field += data
+            elif kind == "header_value":
+                self._header_value += data
+            elif kind == "header_end":
+                if self._header_field.lower() == b"content-disposition":
+                    self._disposition = self._header_value
+                self._header_field = self._header_value = b""
+            elif kind == "headers_finished":
+                await self._begin_part()
+            elif kind == "part_data":
+                await self._part_data(data)
+            elif kind == "part_end":
+                await self._end_part()
+
+    async def _begin_part(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        self._field_name = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" not in options:
+            self._field_value = bytearray()
+            return
+        if self._on_first_file is not None:
+            on_first_file, self._on_first_file = self._on_first_file, None
+            on_first_file(self.fields)
+        if len(self.files) >= self._max_files:
+            raise _too_large(f"At most {self._max_files} files can be uploaded at once")
+        filename = options[b"filename"].decode("utf-8", "replace")
+        self._sink = _FileSink(self._field_name, filename, self._staging_dir / f".upload-{uuid.uuid4().hex}")
+        await self._sink.open()
+
+    async def _part_data(self, data: bytes) -> None:
+        if self._sink is None:
+            self._field_value += data
+            if len(self._field_value) > MAX_FIELD_BYTES:
+                raise _too_large(f"Form field '{self._field_name}' is too large")
+            return
+        if self._sink.size + len(data) > self._max_file_bytes:
+            raise _too_large(f"'{self._sink.name}' exceeds the {self._max_file_bytes} byte file limit")
+        await self._sink.write(data)
+
+    async def _end_part(self) -> None:
+        if self._sink is None:
+            self.fields[self._field_name] = self._field_value.decode("utf-8", "replace")
+            return
+        sink, self._sink = self._sink, None
+        self.files.append(await sink.close())
+
+    def finish(self) -> None:
+        self._parser.finalize()
+        if self._sink is not None:
+            raise HTTPException(status_code=400, detail="Upload ended before the last file was complete")
+
+    def discard(self) -> None:
+        if self._sink is not None:
+            self._sink.discard()
+        for staged in self.files:
+            staged.path.unlink(missing_ok=True)
+
+
+async def receive_multipart(
+    request: Request,
+    staging_dir: Path,
+    max_file_bytes: int = UPLOAD_MAX_FILE_BYTES,
+    max_request_bytes: int = UPLOAD_MAX_JOB_BYTES,
+    max_files: int = UPLOAD_MAX_FILES,
+    on_first_file: Optional[Callable[[Dict[str, str]], None]] = None,
+) -> Tuple[Dict[str, str], List[StagedUpload]]:
+    """Stream a ``multipart/form-data`` body into ``staging_dir``.
+
+    Returns the plain form fields and the staged file parts (hidden
+    ``.upload-*`` files the caller moves into place). Raises 413 as soon as a
+    limit is crossed, removing anything already staged. ``on_first_file`` is
+    called with the fields received so far before any file data is read, so
+    the caller can refuse the upload early by raising.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=415, detail="Expected a multipart/form-data upload")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_request_bytes:
+        raise _too_large(f"Upload exceeds the {max_request_bytes} byte limit")
+
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    receiver = _MultipartReceiver(options[b"boundary"], staging_dir, max_file_bytes, max_files, on_first_file)
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_request_bytes:
+                raise _too_large(f"Upload exceeds the {max_request_bytes} byte limit")
+            await receiver.feed(chunk)
+        receiver.finish()
+    except BaseException:
+        # Also covers the client disconnecting mid-upload
+        receiver.discard()
+        raise
+    return receiver.fields, receiver.files
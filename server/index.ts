@@ -77,23 +77,32 @@ export async function createApp(): Promise<express.Express> {
         console.error('Failed to parse Python response:', err);
       }
 
+      if (pythonRes.status === 429) {
+        // Queue is saturated; let the client retry after the advertised delay
+        res.set('Retry-After', pythonRes.headers.get('retry-after') ?? '60');
+        return res.status(429).json({ message: payload?.detail || 'Processing queue is full, try again later' });
+      }
+
       if (!pythonRes.ok || !payload) {
         throw new Error(payload?.detail || 'Python service failed to process job');
       }
 
+      // Jobs are processed in the background; results arrive via the status endpoint
       await storage.upsertProcessingJob({
         jobId: payload.job_id,
         pilotId: pilotId ?? null,
         location: location || null,
-        status: 'completed',
+        status: payload.status ?? 'queued',
       });
 
-      await storage.saveProcessingResult({
-        jobId: payload.job_id,
-        anomaliesFound: payload.anomalies_found ?? 0,
-        excelUrl: payload.excel_url,
-        pdfUrl: payload.pdf_url,
-      });
+      if (payload.excel_url) {
+        await storage.saveProcessingResult({
+          jobId: payload.job_id,
+          anomaliesFound: payload.anomalies_found ?? 0,
+          excelUrl: payload.excel_url,
+          pdfUrl: payload.pdf_url,
+        });
+      }
 
       res.json(payload);
     } catch (error) {
@@ -112,6 +121,37 @@ export async function createApp(): Promise<express.Express> {
     }
   });
 
+  app.get('/api/job/:jobId/events', isAuthenticated, async (req: any, res) => {
+    const controller = new AbortController();
+    req.on('close', () => controller.abort());
+    try {
+      const pythonRes = await fetch(`${pythonApi}/jobs/${encodeURIComponent(req.params.jobId)}/events`, {
+        signal: controller.signal,
+      });
+      if (!pythonRes.ok || !pythonRes.body) {
+        return res.status(pythonRes.status === 404 ? 404 : 502).json({ message: 'Job events unavailable' });
+      }
+      res.writeHead(200, {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        Connection: 'keep-alive',
+        'X-Accel-Buffering': 'no',
+      });
+      for await (const chunk of pythonRes.body as any) {
+        res.write(chunk);
+      }
+      res.end();
+    } catch (error) {
+      if (controller.signal.aborted) return;
+      console.error('Job events error:', error);
+      if (!res.headersSent) {
+        res.status(502).json({ message: 'Job events unavailable' });
+      } else {
+        res.end();
+      }
+    }
+  });
+
   app.get('/api/job/:jobId/status', isAuthenticated, async (req: any, res) => {
     try {
       const jobId = req.params.jobId;
@@ -214,10 +214,10 @@ export class DatabaseStorage implements IStorage {
       .values(job)
       .onConflictDoUpdate({
         target: processingJobs.jobId,
+        // The Python service owns the status once it has created the job
         set: {
           pilotId: job.pilotId ?? null,
           location: job.location ?? null,
-          status: job.status ?? null,
         },
       })
       .returning();
@@ -3,6 +3,7 @@
 
 import { sql } from 'drizzle-orm';
 import {
+  bigint,
   boolean,
   index,
   integer,
@@ -191,6 +192,17 @@ export const flightPaths = pgTable("flight_paths", {
   jobUnique: uniqueIndex("flight_paths_job_id_unique").on(table.jobId),
 }));
 
+// Disk usage of each job's output directory, kept by the Python janitor
+export const jobStorage = pgTable("job_storage", {
+  jobId: text("job_id").primaryKey().references(() => processingJobs.jobId, { onDelete: 'cascade' }),
+  uploadBytes: bigint("upload_bytes", { mode: "number" }).notNull().default(0),
+  intermediateBytes: bigint("intermediate_bytes", { mode: "number" }).notNull().default(0),
+  finalBytes: bigint("final_bytes", { mode: "number" }).notNull().default(0),
+  // 'full', 'final' (uploads and intermediates pruned) or 'deleted'
+  retention: text("retention").notNull().default('full'),
+  updatedAt: timestamp("updated_at").defaultNow(),
+});
+
 // Relations
 export const usersRelations = relations(users, ({ one }) => ({
   pilotProfile: one(pilotProfiles, {
@@ -252,6 +264,7 @@ export type ProcessingResult = typeof processingResults.$inferSelect;
 export type ProcessingResultInsert = typeof processingResults.$inferInsert;
 export type FlightPath = typeof flightPaths.$inferSelect;
 export type FlightPathInsert = typeof flightPaths.$inferInsert;
+export type JobStorage = typeof jobStorage.$inferSelect;
 
 // Combined types for API responses
 export type UserWithPilotProfile = User & {
@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+"""
+Spatial Index for Report Findings
+
+Joins every finding (the Latitude/Longitude columns of the report spreadsheet)
+to the flight path leg that passed closest to it and to the georeferenced map
+image that covers it. Both joins run over the whole spreadsheet at once with
+NumPy: path segments are bucketed into a uniform grid, each finding is checked
+against the segments in its own and neighbouring cells, and only findings
+with no nearby segment fall back to a brute-force scan.
+
+Map extents come from world files next to the map images (.pgw, .jgw, .tfw,
+.wld) or from a JSON file mapping image names to
+[min_lon, min_lat, max_lon, max_lat].
+"""
+
+import gzip
+import json
+import math
+import os
+from xml.etree import ElementTree as ET
+
+import numpy as np
+from PIL import Image
+
+EARTH_RADIUS_M = 6371008.8
+WORLD_FILE_SUFFIXES = {".png": ".pgw", ".jpg": ".jgw", ".jpeg": ".jgw", ".tif": ".tfw", ".tiff": ".tfw", ".gif": ".gfw"}
+# Upper bound on array elements per block when comparing every pair
+BLOCK_ELEMENTS = 1 << 20
+
+
+def to_metres(lonlat, origin):
+    """Project lon/lat pairs to a local equirectangular plane around ``origin``."""
+    lon0, lat0 = origin
+    kx = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(lat0))
+    ky = math.radians(1) * EARTH_RADIUS_M
+    return np.column_stack(((lonlat[:, 0] - lon0) * kx, (lonlat[:, 1] - lat0) * ky))
+
+
+def load_flight_path(path):
+    """
+    Read the flight path LineString from a GeoJSON or KML file.
+
+    Returns:
+        (N, 2) array of lon/lat vertices in flight order
+    """
+    if path.lower().endswith((".geojson", ".json", ".geojson.gz")):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as handle:
+            payload = json.load(handle)
+        features = payload.get("features", [payload])
+        for feature in features:
+            geometry = feature.get("geometry", feature)
+            if geometry.get("type") == "LineString":
+                return np.asarray(geometry["coordinates"], dtype=np.float64)[:, :2]
+        return np.empty((0, 2))
+
+    for _, elem in ET.iterparse(path):
+        if elem.tag.rsplit("}", 1)[-1] == "coordinates":
+            values = [float(v) for t in (elem.text or "").split() for v in t.split(",")[:2]]
+            if len(values) >= 4:
+                return np.asarray(values, dtype=np.float64).reshape(-1, 2)
+    return np.empty((0, 2))
+
+
+def _world_file_extent(image_path, world_path):
+    """Compute the lon/lat bounding box of an image from its world file."""
+    with open(world_path) as handle:
+        a, d, b, e, c, f = (float(line) for line in handle.read().split()[:6])
+    with Image.open(image_path) as img:
+        width, height = img.size
+    # World files reference pixel centres; corners sit half a pixel outside them
+    cols = np.array([-0.5, width - 0.5, -0.5, width - 0.5])
+    rows = np.array([-0.5, -0.5, height - 0.5, height - 0.5])
+    xs = a * cols + b * rows + c
+    ys = d * cols + e * rows + f
+    return [xs.min(), ys.min(), xs.max(), ys.max()]
+
+
+def load_map_extents(image_dir, extents_file=None):
+    """
+    Collect the geographic extents of the map images.
+
+    Args:
+        image_dir: Directory searched (recursively) for images with world files
+        extents_file: Optional JSON file of {image name: [min_lon, min_lat, max_lon, max_lat]}
+
+    Returns:
+        (paths, extents) with extents as an (M, 4) array
+    """
+    paths, extents = [], []
+    if extents_file and os.path.exists(extents_file):
+        with open(extents_file) as handle:
+            for name, box in json.load(handle).items():
+                path = name if os.path.isabs(name) else os.path.join(image_dir, name)
+                paths.append(path)
+                extents.append([float(v) for v in box])
+
+    known = set(paths)
+    for root, _, files in os.walk(image_dir):
+        names = set(files)
+        for file in files:
+            stem, ext = os.path.splitext(file)
+            path = os.path.join(root, file)
+            if path in known:
+                continue
+            suffix = WORLD_FILE_SUFFIXES.get(ext.lower())
+            if suffix is None:
+                continue
+            world = next((c for c in (stem + suffix, stem + suffix.upper(), stem + ".wld") if c in names), None)
+            if world is None:
+                continue
+            try:
+                extents.append(_world_file_extent(path, os.path.join(root, world)))
+                paths.append(path)
+            except (OSError, ValueError):
+                print(f"Could not read world file for map image: {path}")
+    return paths, np.asarray(extents, dtype=np.float64).reshape(-1, 4)
+
+
+def _point_segment_distance(px, py, x1, y1, x2, y2):
+    dx, dy = x2 - x1, y2 - y1
+    length_sq = dx * dx + dy * dy
+    t = np.where(length_sq > 0, ((px - x1) * dx + (py - y1) * dy) / np.where(length_sq > 0, length_sq, 1), 0)
+    t = np.clip(t, 0, 1)
+    return np.hypot(px - (x1 + t * dx), py - (y1 + t * dy))
+
+
+def _bucket_segments(seg, lengths, cell):
+    """
+    Split segments into pieces no longer than ``cell`` and bucket each piece
+    into the (at most 2x2) grid cells its bounding box touches.
+
+    Returns:
+        (keys, segment ids) sorted by cell key
+    """
+    pieces = np.maximum(np.ceil(lengths / cell), 1).astype(np.int64)
+    piece_seg = np.repeat(np.arange(len(seg)), pieces)
+    step = np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    direction = seg[piece_seg, 2:] - seg[piece_seg, :2]
+    a = seg[piece_seg, :2] + (step / pieces[piece_seg])[:, None] * direction
+    b = seg[piece_seg, :2] + ((step + 1) / pieces[piece_seg])[:, None] * direction
+    lo = np.floor(np.minimum(a, b) / cell).astype(np.int64)
+    hi = np.floor(np.maximum(a, b) / cell).astype(np.int64)
+    keys = np.concatenate([
+        _cell_keys(lo[:, 0], lo[:, 1]), _cell_keys(hi[:, 0], lo[:, 1]),
+        _cell_keys(lo[:, 0], hi[:, 1]), _cell_keys(hi[:, 0], hi[:, 1]),
+    ])
+    seg_ids = np.tile(piece_seg, 4)
+    order = np.lexsort((seg_ids, keys))
+    keys, seg_ids = keys[order], seg_ids[order]
+    unique = np.r_[True, (keys[1:] != keys[:-1]) | (seg_ids[1:] != seg_ids[:-1])]
+    return keys[unique], seg_ids[unique]
+
+
+def _group_argmin(owner, d, cand):
+    """
+    Index of the smallest ``d`` for each run of equal ``owner`` values.
+
+    ``owner`` must be grouped (non-decreasing); ties go to the lowest ``cand``.
+    """
+    group_start = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+    group_min = np.minimum.reduceat(d, group_start)
+    at_min = np.flatnonzero(d == np.repeat(group_min, np.diff(np.r_[group_start, len(d)])))
+    order = np.lexsort((cand[at_min], owner[at_min]))
+    tied_owner = owner[at_min][order]
+    return at_min[order[np.r_[True, tied_owner[1:] != tied_owner[:-1]]]]
+
+
+def _grid_nearest(pts, seg, lengths, cell):
+    """Nearest segment per point among those bucketed in its 3x3 block of cells."""
+    n = len(pts)
+    best = np.full(n, -1, dtype=np.int64)
+    best_d = np.full(n, np.inf)
+    keys, seg_ids = _bucket_segments(seg, lengths, cell)
+
+    pcell = np.floor(pts / cell).astype(np.int64)
+    shifts = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+    query = _cell_keys((pcell[:, None, 0] + shifts[:, 0]).ravel(), (pcell[:, None, 1] + shifts[:, 1]).ravel())
+    starts = np.searchsorted(keys, query, side="left").reshape(n, len(shifts))
+    sizes = np.searchsorted(keys, query, side="right").reshape(n, len(shifts)) - starts
+
+    # Evaluate candidate pairs in batches of points to bound memory
+    batch_of = np.cumsum(sizes.sum(axis=1)) // BLOCK_ELEMENTS
+    bounds = np.flatnonzero(np.r_[True, batch_of[1:] != batch_of[:-1], True])
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        start, size = starts[lo:hi].ravel(), sizes[lo:hi].ravel()
+        # Candidate pairs come out grouped by point, in point order
+        point_ids = np.repeat(np.repeat(np.arange(lo, hi), len(shifts)), size)
+        if not len(point_ids):
+            continue
+        pos = np.repeat(start, size) + np.arange(size.sum()) - np.repeat(np.cumsum(size) - size, size)
+        cand = seg_ids[pos]
+        s = seg[cand]
+        d = _point_segment_distance(pts[point_ids, 0], pts[point_ids, 1], s[:, 0], s[:, 1], s[:, 2], s[:, 3])
+        winners = _group_argmin(point_ids, d, cand)
+        best[point_ids[winners]] = cand[winners]
+        best_d[point_ids[winners]] = d[winners]
+    return best, best_d
+
+
+def nearest_segments(points, path):
+    """
+    Find the nearest path segment to each point.
+
+    Args:
+        points: (N, 2) lon/lat findings
+        path: (S + 1, 2) lon/lat flight path vertices
+
+    Returns:
+        (segment_index, distance_m) arrays; index -1 where there is no path
+    """
+    n = len(points)
+    best = np.full(n, -1, dtype=np.int64)
+    best_d = np.full(n, np.inf)
+    if n == 0 or len(path) < 2:
+        return best, best_d
+
+    origin = (float(path[:, 0].mean()), float(path[:, 1].mean()))
+    pts = to_metres(points, origin)
+    xy = to_metres(path, origin)
+    seg = np.hstack((xy[:-1], xy[1:]))
+    lengths = np.hypot(seg[:, 2] - seg[:, 0], seg[:, 3] - seg[:, 1])
+    extent = xy.max(axis=0) - xy.min(axis=0)
+    # Start near the spacing between passes (twice the area per metre of path),
+    # or the typical leg length for paths that do not fill their bounding box,
+    # so a 3x3 block holds a handful of segments
+    spacing = 2 * float(extent[0] * extent[1]) / max(float(lengths.sum()), 1.0)
+    cell = max(min(spacing, float(np.median(lengths))), 1.0)
+
+    found, distance = _grid_nearest(pts, seg, lengths, cell)
+    # Any segment within one cell of a point is bucketed in its 3x3 block, so
+    # those answers are exact; points further from the path are resolved by
+    # pruning whole runs of legs by their bounding boxes
+    done = distance <= cell
+    best[done] = found[done]
+    best_d[done] = distance[done]
+    far = np.flatnonzero(~done)
+    if len(far):
+        best[far], best_d[far] = _run_nearest(pts[far], seg)
+    return best, best_d
+
+
+def _run_nearest(pts, seg):
+    """Exact nearest segment, checking only runs of legs that could hold it."""
+    # Runs of about sqrt(S) consecutive legs balance the box tests per point
+    # against the legs checked inside the surviving runs
+    run = max(16, math.ceil(math.sqrt(len(seg))))
+    runs = math.ceil(len(seg) / run)
+    padded = np.full((runs * run, 4), np.nan)
+    padded[:len(seg)] = seg
+    grouped = padded.reshape(runs, run, 4)
+    xs = np.concatenate((grouped[:, :, 0], grouped[:, :, 2]), axis=1)
+    ys = np.concatenate((grouped[:, :, 1], grouped[:, :, 3]), axis=1)
+    box = np.column_stack((np.nanmin(xs, axis=1), np.nanmin(ys, axis=1), np.nanmax(xs, axis=1), np.nanmax(ys, axis=1)))
+
+    best = np.full(len(pts), -1, dtype=np.int64)
+    best_d = np.full(len(pts), np.inf)
+
+    def check(p, offset, owner, run_ids):
+        # Evaluate every leg of the given (point, run) pairs and keep improvements
+        owner = np.repeat(owner, run)
+        cand = (run_ids[:, None] * run + np.arange(run)).ravel()
+        keep = cand < len(seg)
+        owner, cand = owner[keep], cand[keep]
+        s = seg[cand]
+        d = _point_segment_distance(p[owner, 0], p[owner, 1], s[:, 0], s[:, 1], s[:, 2], s[:, 3])
+        winners = _group_argmin(owner, d, cand)
+        target = offset + owner[winners]
+        better = (d[winners] < best_d[target]) | ((d[winners] == best_d[target]) & (cand[winners] < best[target]))
+        best[target[better]] = cand[winners][better]
+        best_d[target[better]] = d[winners][better]
+
+    rows = max(1, BLOCK_ELEMENTS // max(runs, run))
+    per_block = max(1, BLOCK_ELEMENTS // run)
+    for lo in range(0, len(pts), rows):
+        p = pts[lo:lo + rows]
+        gap_x = np.maximum(np.maximum(box[None, :, 0] - p[:, None, 0], p[:, None, 0] - box[None, :, 2]), 0)
+        gap_y = np.maximum(np.maximum(box[None, :, 1] - p[:, None, 1], p[:, None, 1] - box[None, :, 3]), 0)
+        lower = np.hypot(gap_x, gap_y)
+        # The run with the closest box usually holds the answer; its distance
+        # then rules out every run whose box is further away
+        nearest_run = np.argmin(lower, axis=1)
+        check(p, lo, np.arange(len(p)), nearest_run)
+        lower[np.arange(len(p)), nearest_run] = np.inf
+        point_ids, run_ids = np.nonzero(lower <= best_d[lo:lo + len(p), None])
+        for start in range(0, len(point_ids), per_block):
+            check(p, lo, point_ids[start:start + per_block], run_ids[start:start + per_block])
+    return best, best_d
+
+
+def _cell_keys(cx, cy):
+    return (cx.astype(np.int64) << 32) ^ (cy.astype(np.int64) & 0xFFFFFFFF)
+
+
+def covering_maps(points, extents):
+    """
+    Pick the map covering each point, preferring the smallest (most detailed) extent.
+
+    Returns:
+        Array of map indices, -1 where no map covers the point
+    """
+    result = np.full(len(points), -1, dtype=np.int64)
+    if not len(points) or not len(extents):
+        return result
+    area = (extents[:, 2] - extents[:, 0]) * (extents[:, 3] - extents[:, 1])
+    rank = np.argsort(area)
+    ordered = extents[rank]
+    rows = max(1, BLOCK_ELEMENTS // len(extents))
+    for start in range(0, len(points), rows):
+        p = points[start:start + rows]
+        inside = (
+            (p[:, None, 0] >= ordered[None, :, 0]) & (p[:, None, 0] <= ordered[None, :, 2])
+            & (p[:, None, 1] >= ordered[None, :, 1]) & (p[:, None, 1] <= ordered[None, :, 3])
+        )
+        hit = inside.any(axis=1)
+        first = np.argmax(inside, axis=1)
+        result[start:start + rows] = np.where(hit, rank[first], -1)
+    return result
+
+
+def join_findings(lonlat, path=None, map_paths=(), map_extents=None):
+    """
+    Join findings to flight legs and map images in one pass.
+
+    Args:
+        lonlat: (N, 2) finding coordinates; rows with NaN are left unmatched
+        path: Optional (S + 1, 2) flight path vertices
+        map_paths: Map image paths matching ``map_extents``
+        map_extents: Optional (M, 4) lon/lat bounding boxes
+
+    Returns:
+        dict with "leg" (1-based, 0 when unmatched), "leg_distance_m" and
+        "map_image" (path or None) lists, one entry per finding
+    """
+    n = len(lonlat)
+    valid = np.isfinite(lonlat).all(axis=1)
+    points = lonlat[valid]
+
+    legs = np.zeros(n, dtype=np.int64)
+    distances = np.full(n, np.nan)
+    if path is not None and len(path) >= 2:
+        segment, distance = nearest_segments(points, path)
+        legs[valid] = segment + 1
+        distances[valid] = distance
+
+    maps = [None] * n
+    if map_extents is not None and len(map_extents):
+        covering = covering_maps(points, map_extents)
+        for row, index in zip(np.flatnonzero(valid), covering):
+            if index >= 0:
+                maps[row] = map_paths[index]
+
+    return {"leg": legs.tolist(), "leg_distance_m": distances.tolist(), "map_image": maps}
@@ -25,6 +25,14 @@ interface JobStatusResponse {
   } | null;
 }
 
+interface JobEvent {
+  job_id: string;
+  status?: string;
+  stage?: string;
+  progress?: Record<string, number>;
+  result?: JobStatusResponse["result"];
+}
+
 interface FlightPathResult {
   job_id: string;
   kmz_url: string;
@@ -38,6 +46,7 @@ export default function PilotUploadPage() {
   const [jobId, setJobId] = useState<string | null>(null);
   const [jobStatus, setJobStatus] = useState<string>("idle");
   const [result, setResult] = useState<JobResult | null>(null);
+  const [progress, setProgress] = useState<Record<string, number>>({});
   const [kmzFile, setKmzFile] = useState<File | null>(null);
   const [flightResult, setFlightResult] = useState<FlightPathResult | null>(null);
   const [error, setError] = useState<string | null>(null);
@@ -75,6 +84,7 @@ export default function PilotUploadPage() {
     setError(null);
     setIsSubmitting(true);
     setJobStatus("processing");
+    setProgress({});
 
     try {
       const formData = new FormData();
@@ -93,10 +103,12 @@ export default function PilotUploadPage() {
         throw new Error(message?.message ?? "Failed to process job");
       }
 
-      const payload: JobResult = await response.json();
-      setResult(payload);
+      const payload: JobResult & { status?: string } = await response.json();
+      if (payload.excel_url) {
+        setResult(payload);
+      }
       setJobId(payload.job_id);
-      setJobStatus("completed");
+      setJobStatus(payload.status ?? "completed");
     } catch (err) {
       console.error(err);
       setError(err instanceof Error ? err.message : "Failed to process job");
@@ -110,6 +122,20 @@ export default function PilotUploadPage() {
     if (!jobId) return;
 
     let active = true;
+    let interval: number | undefined;
+    const applyResult = (data: JobStatusResponse["result"]) => {
+      if (!data) return;
+      setResult((prev) =>
+        prev
+          ? { ...prev, ...data, job_id: prev.job_id }
+          : {
+              job_id: jobId,
+              anomalies_found: data.anomalies_found ?? 0,
+              excel_url: data.excel_url ?? "",
+              pdf_url: data.pdf_url ?? "",
+            },
+      );
+    };
     const poll = async () => {
       try {
         const res = await fetch(`/api/job/${jobId}/status`);
@@ -118,29 +144,48 @@ export default function PilotUploadPage() {
         if (!active) return;
         if (data.job?.status) {
           setJobStatus(data.job.status);
+          // Finished jobs never change again
+          if (data.job.status === "completed" || data.job.status === "failed") {
+            window.clearInterval(interval);
+          }
         }
-        if (data.result) {
-          setResult((prev) =>
-            prev
-              ? { ...prev, ...data.result, job_id: prev.job_id }
-              : {
-                  job_id: data.job.job_id,
-                  anomalies_found: data.result.anomalies_found ?? 0,
-                  excel_url: data.result.excel_url ?? "",
-                  pdf_url: data.result.pdf_url ?? "",
-                },
-          );
-        }
+        applyResult(data.result);
       } catch (err) {
         console.warn("Polling error", err);
       }
     };
+    const startPolling = () => {
+      if (interval !== undefined) return;
+      interval = window.setInterval(poll, 5000);
+      poll();
+    };
 
-    const interval = window.setInterval(poll, 5000);
-    poll();
+    // Live updates when the browser supports them; polling otherwise or if the stream drops
+    const events = typeof EventSource !== "undefined" ? new EventSource(`/api/job/${jobId}/events`) : null;
+    if (events) {
+      events.onmessage = (message) => {
+        const data: JobEvent = JSON.parse(message.data);
+        if (!active) return;
+        if (data.status) setJobStatus(data.status);
+        if (data.progress) setProgress(data.progress);
+        applyResult(data.result);
+        if (data.status === "completed" || data.status === "failed") {
+          events.close();
+          // The final event may come from the live snapshot, without the stored result
+          if (!data.result) poll();
+        }
+      };
+      events.onerror = () => {
+        events.close();
+        if (active) startPolling();
+      };
+    } else {
+      startPolling();
+    }
 
     return () => {
       active = false;
+      events?.close();
       window.clearInterval(interval);
     };
   }, [jobId]);
@@ -180,8 +225,16 @@ export default function PilotUploadPage() {
 
   const statusLabel = useMemo(() => {
     switch (jobStatus) {
-      case "processing":
-        return "Processing…";
+      case "queued":
+        return "Queued…";
+      case "processing": {
+        const details = [
+          progress.files_processed ? `${progress.files_processed} files processed` : null,
+          progress.images_analyzed ? `${progress.images_analyzed} images analyzed` : null,
+          progress.pages_rendered ? `${progress.pages_rendered} report pages` : null,
+        ].filter(Boolean);
+        return details.length ? `Processing… (${details.join(", ")})` : "Processing…";
+      }
       case "completed":
         return "Completed";
       case "failed":
@@ -189,7 +242,7 @@ export default function PilotUploadPage() {
       default:
         return "Idle";
     }
-  }, [jobStatus]);
+  }, [jobStatus, progress]);
 
   return (
     <div className="mx-auto flex max-w-4xl flex-col gap-8 px-4 py-12">